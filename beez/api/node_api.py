@@ -13,7 +13,7 @@ from beez.beez_utils import BeezUtils
 from beez.index.index_engine import (
     TxIndexEngine,
     TxpIndexEngine,
-    BlockIndexEngine,
+    index_metrics,
 )
 
 load_dotenv()  # load .env
@@ -134,30 +134,20 @@ class NodeAPI(BaseNodeAPI):
     @route("/blockindex", methods=["GET"])
     def blockindex(self):
         """Returns the current state of the blocks."""
-        logger.info("Checking indexed blocks")
-        fields_to_search = ["id", "type", "block_serialized"]
-
-        for query in ["BL"]:
-            print(f"Query:: {query}")
-            print(
-                "\t",
-                BlockIndexEngine.get_engine(
-                    Schema(
-                        id=ID(stored=True),
-                        type=KEYWORD(stored=True),
-                        block_encoded=TEXT(stored=True),
-                    )
-                ).query(query, fields_to_search, highlight=True),
-            )
-            print("-" * 70)
-
-            resultsset = []
-            blocks = BEEZ_NODE.blockchain.blocks_from_index()
-            for block in blocks:
-                resultsset.append(block.serialize())
+        logger.info("Checking persisted blocks")
+        resultsset = []
+        blocks = BEEZ_NODE.blockchain.blocks_from_index()
+        for block in blocks:
+            resultsset.append(block.serialize())
 
         return str(resultsset), 200
 
+    @route("/indexmetrics", methods=["GET"])
+    def index_metrics(self):
+        """Returns the latency and volume metrics of the node's index engines,
+        empty unless the node runs with INDEX_METRICS=1."""
+        return {"index_metrics": index_metrics()}, 200
+
     @route("/info", methods=["GET"])
     def info(self):
         """Returns general information about the Beez blockchain."""
@@ -181,6 +171,85 @@ class NodeAPI(BaseNodeAPI):
 
         return jsonify(response), 201
 
+    @route("/transaction/<transaction_id>", methods=["GET"])
+    def transaction_status(self, transaction_id: str):
+        """Returns whether a transaction is in a block, in the pool or unknown."""
+        block_store = BEEZ_NODE.blockchain.block_store
+        with block_store.lock:
+            location = block_store.locate_transaction(transaction_id)
+            pruned = block_store.has_transaction(transaction_id) and location is None
+        if location is not None:
+            block_count, position = location
+            return {
+                "id": transaction_id,
+                "status": "confirmed",
+                "blockCount": block_count,
+                "position": position,
+            }, 200
+        if pruned:
+            # the transaction is in a block whose body was pruned
+            return {
+                "id": transaction_id,
+                "status": "confirmed",
+                "prunedHeight": block_store.pruned_height,
+            }, 200
+        if transaction_id in BEEZ_NODE.transaction_pool.transaction_ids:
+            return {"id": transaction_id, "status": "pending"}, 200
+        return {"id": transaction_id, "status": "unknown"}, 404
+
+    @route("/proof/<transaction_id>", methods=["GET"])
+    def proof(self, transaction_id: str):
+        """Returns the Merkle inclusion proof of a confirmed transaction."""
+        proof = BEEZ_NODE.blockchain.block_store.transaction_proof(transaction_id)
+        if proof is None:
+            return {"id": transaction_id, "error": "Transaction not in a stored block"}, 404
+        return proof, 200
+
+    @route("/balance/<address>/<int:height>", methods=["GET"])
+    def balance(self, address: str, height: int):
+        """Returns the balance of an address after the block at the given height."""
+        balance = BEEZ_NODE.blockchain.block_store.balance_at(address, height)
+        if balance is None:
+            return {"error": f"Unknown block {height}"}, 404
+        return {"address": address, "height": height, "balance": balance}, 200
+
+    @route("/block/<int:block_count>", methods=["GET"])
+    def block(self, block_count: int):
+        """Returns the block with the given block count, 410 if its body was pruned."""
+        block_store = BEEZ_NODE.blockchain.block_store
+        with block_store.lock:
+            block = block_store.get_by_height(block_count)
+            if block is None:
+                return {"error": f"Unknown block {block_count}"}, 404
+            if block.pruned:
+                return {
+                    "error": f"Transactions of block {block_count} were pruned",
+                    "prunedHeight": block_store.pruned_height,
+                    "hash": block.hash(),
+                }, 410
+            return block.to_json(), 200
+
+    @route("/blocks/<int:start>/<int:end>", methods=["GET"])
+    def block_range(self, start: int, end: int):
+        """Returns the blocks from start to end included, 410 if the range reaches
+        into pruned block bodies."""
+        if start > end:
+            return {"error": "The range start is above its end"}, 400
+        block_store = BEEZ_NODE.blockchain.block_store
+        with block_store.lock:
+            pruned_height = block_store.pruned_height
+            if start <= pruned_height:
+                return {
+                    "error": f"Transactions of blocks up to {pruned_height} were pruned",
+                    "prunedHeight": pruned_height,
+                }, 410
+            blocks = []
+            for block_count in range(start, min(end, block_store.height()) + 1):
+                block = block_store.get_by_height(block_count)
+                if block is not None:
+                    blocks.append(block.to_json())
+        return {"blocks": blocks}, 200
+
     @route("/challenge", methods=["POST"])
     def challenge(self):
         """Post a challenge to the blockchain."""
@@ -15,6 +15,8 @@ def clear_indices():
     shutil.rmtree("pos_indices", ignore_errors=True)
     shutil.rmtree("txp_indices", ignore_errors=True)
     shutil.rmtree("address_indices", ignore_errors=True)
+    shutil.rmtree("state_indices", ignore_errors=True)
+    shutil.rmtree("snapshots_indices", ignore_errors=True)
 
 def get_ip():
     """Return IP of node."""
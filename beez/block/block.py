@@ -1,23 +1,29 @@
 """Beez Blockchain - Block."""
 
 from __future__ import annotations
-from typing import TYPE_CHECKING, List, Optional, cast
+from typing import List, Optional, cast
 import time
-import copy
 import json
 
-from beez.transaction.transaction_type import TransactionType
 from beez.transaction.transaction import Transaction
 from beez.block.header import Header
+from beez.block.merkle_tree import merkle_root, transaction_hash
+from beez.beez_utils import BeezUtils
 
-if TYPE_CHECKING:
-    from beez.transaction.challenge_tx import ChallengeTX
 
+# attributes making up the payload, changing one of them invalidates the hash
+PAYLOAD_ATTRIBUTES = frozenset(
+    ["header", "transactions", "last_hash", "forger_address", "block_count", "timestamp"]
+)
 
 
-class Block:
+class Block:  # pylint: disable=too-many-instance-attributes
     """
     A Block contain a list of Transaction that are validated from a Forger into the Network.
+
+    A deserialized block keeps its serialized header and transactions and decodes
+    them on first access, so callers needing only the block count, the hashes or
+    the serialized form never build the Header and Transaction objects.
     """
 
     def __init__(   # pylint: disable=too-many-arguments
@@ -28,6 +34,16 @@ class Block:
         forger_address: str,
         block_count: int,
     ):
+        self.block_hash: Optional[str] = None
+        # serialized forms not decoded yet, None once decoded or set
+        self.raw_header: Optional[dict] = None
+        self.raw_transactions: Optional[List[dict]] = None
+        # Merkle root over the transaction hashes, computed once
+        self.transactions_root: Optional[str] = None
+        # a pruned block keeps its header, Merkle root and transaction ids but not
+        # its transactions
+        self.pruned = False
+        self.pruned_transaction_ids: List[str] = []
         self.header = header
         self.transactions = transactions
         self.last_hash = last_hash
@@ -36,6 +52,114 @@ class Block:
         self.timestamp = time.time()
         self.signature = ""
 
+    def __setattr__(self, name, value):
+        if name in PAYLOAD_ATTRIBUTES:
+            super().__setattr__("block_hash", None)
+        super().__setattr__(name, value)
+
+    def __getstate__(self):
+        # a hash received from a peer is never trusted, the receiver recomputes it;
+        # only the Merkle root of a pruned block can't be recomputed
+        state = self.__dict__.copy()
+        state["block_hash"] = None
+        if not self.pruned:
+            state["transactions_root"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+    @property
+    def header(self) -> Optional[Header]:
+        """Returns the header, decoding it on first access."""
+        if self.raw_header is not None:
+            self._header = Header.deserialize(self.raw_header)
+            self.raw_header = None
+        return self._header
+
+    @header.setter
+    def header(self, header: Optional[Header]) -> None:
+        self.raw_header = None
+        self._header = header
+
+    @property
+    def transactions(self) -> List[Transaction]:
+        """Returns the transactions, decoding them on first access."""
+        if self.raw_transactions is not None:
+            self._transactions = [
+                Transaction.from_json(tx_json) for tx_json in self.raw_transactions
+            ]
+            self.raw_transactions = None
+        return self._transactions
+
+    @transactions.setter
+    def transactions(self, transactions: List[Transaction]) -> None:
+        self.raw_transactions = None
+        self.transactions_root = None
+        self._transactions = transactions
+
+    def transactions_json(self) -> List[dict]:
+        """Returns the transactions in json form without decoding them."""
+        if self.raw_transactions is not None:
+            return self.raw_transactions
+        return [tx.to_json() for tx in self._transactions]
+
+    def transaction_ids(self) -> List[str]:
+        """Returns the ids of the transactions without decoding them, also after
+        the transactions were pruned."""
+        if self.pruned:
+            return self.pruned_transaction_ids
+        if self.raw_transactions is not None:
+            return [tx_json["id"] for tx_json in self.raw_transactions]
+        return [tx.identifier for tx in self._transactions]
+
+    def transaction_hashes(self) -> List[str]:
+        """Returns the leaf hashes of the transactions."""
+        return [transaction_hash(tx_json) for tx_json in self.transactions_json()]
+
+    def header_digest(self) -> str:
+        """Returns the hex digest of the serialized header, empty without a header.
+        A serialized header is hashed without decoding it."""
+        if self.raw_header is not None and "stateRoot" in self.raw_header:
+            serialized_header = {
+                "stateRoot": self.raw_header["stateRoot"],
+                "balanceDeltas": self.raw_header["balanceDeltas"],
+            }
+        elif self.header is not None:
+            serialized_header = self.header.serialize()
+        else:
+            return ""
+        return BeezUtils.hash(serialized_header).hexdigest()
+
+    def merkle_root(self) -> str:
+        """Returns the Merkle root over the transactions, computed once."""
+        if self.transactions_root is None:
+            self.transactions_root = merkle_root(self.transaction_hashes())
+        return self.transactions_root
+
+    def hash(self) -> str:
+        """Returns the hex digest of the payload, computed once and cached."""
+        if self.block_hash is None:
+            self.block_hash = BeezUtils.hash(self.payload()).hexdigest()
+        return self.block_hash
+
+    def prune(self) -> Block:
+        """Drops the transactions, keeping the header and the Merkle root, which
+        the hash of the block is computed from, and the transaction ids, which
+        replayed transactions are checked against."""
+        self.merkle_root()
+        if not self.pruned:
+            self.pruned_transaction_ids = self.transaction_ids()
+        self.raw_transactions = None
+        self._transactions = []
+        self.pruned = True
+        return self
+
+    def seal(self) -> Block:
+        """Computes the hash of the finished block and returns the block."""
+        self.hash()
+        return self
+
     @staticmethod
     def genesis() -> Block:
         """Returning a predefined genesis block."""
@@ -53,40 +177,50 @@ class Block:
 
     def serialize(self):
         """Serializing the block to json."""
+        if self.raw_header is not None:
+            serialized_header = self.raw_header
+        else:
+            serialized_header = self._header.serialize() if self._header else ""
         block_serialized = {
-            "header": self.header.serialize() if self.header else "",
-            "transactions": [tx.to_json() for tx in self.transactions],
+            "header": serialized_header,
+            "transactions": self.transactions_json(),
+            "merkleRoot": self.merkle_root(),
             "lastHash": self.last_hash,
             "forger": self.forger_address,
             "blockCount": self.block_count,
             "timestamp": self.timestamp,
             "signature": self.signature,
         }
+        if self.pruned:
+            block_serialized["pruned"] = True
+            block_serialized["transactionIds"] = self.pruned_transaction_ids
         return block_serialized
 
     @staticmethod
-    def deserialize(serialized_block, index=True):
-        """Recreating a block object from a serialized blockchain json."""
-        serialized_block = json.loads(str(serialized_block).replace("'", '"'))
+    def deserialize(serialized_block, index=True):  # pylint: disable=unused-argument
+        """Recreating a block object from a serialized blockchain json. The header
+        and the transactions are decoded when first accessed."""
+        if not isinstance(serialized_block, dict):
+            serialized_block = json.loads(str(serialized_block).replace("'", '"'))
         block = Block(
-            header=Header.deserialize(
-                serialized_block["header"]["beezKeeper"],
-                serialized_block["header"]["accountStateModel"],
-                index,
-            )
-            if serialized_block["header"] != ""
-            else None,
-            transactions=[
-                Transaction.from_json(tx_json)
-                for tx_json in serialized_block["transactions"]
-            ],
+            header=None,
+            transactions=[],
             last_hash=serialized_block["lastHash"],
             forger_address=serialized_block["forger"],
             block_count=serialized_block["blockCount"],
         )
+        if serialized_block["header"] != "":
+            block.raw_header = serialized_block["header"]
+        block.raw_transactions = serialized_block["transactions"]
         block.timestamp = serialized_block["timestamp"]
         block.signature = serialized_block["signature"]
-        return block
+        if serialized_block.get("pruned"):
+            # the transactions are gone, their root can only be taken over
+            block.raw_transactions = None
+            block.transactions_root = serialized_block["merkleRoot"]
+            block.pruned = True
+            block.pruned_transaction_ids = serialized_block.get("transactionIds", [])
+        return block.seal()
 
     def to_json(self):
         """Converting the block to json."""
@@ -96,25 +230,26 @@ class Block:
         json_block["blockCount"] = self.block_count
         json_block["timestamp"] = self.timestamp
         json_block["signature"] = self.signature
-        transactions = []
-
-        for transaction in self.transactions:
-            if transaction.transaction_type == TransactionType.CHALLENGE:
-                challenge_tx: ChallengeTX = transaction
-                transactions.append(challenge_tx.to_json())
-            else:
-                transactions.append(transaction.to_json())
-
-        json_block["transactions"] = transactions
+        json_block["transactions"] = self.transactions_json()
+        json_block["merkleRoot"] = self.merkle_root()
+        if self.pruned:
+            json_block["pruned"] = True
 
         return json_block
 
     def payload(self):
-        """Returning the payload of the block only without the signature."""
-        json_representation = copy.deepcopy(self.to_json())
-        json_representation["signature"] = ""
-
-        return json_representation
+        """Returning the payload of the block only without the signature. The
+        header and the transactions are committed to by their digest and Merkle
+        root, so neither can be changed without breaking the signature."""
+        return {
+            "headerDigest": self.header_digest(),
+            "merkleRoot": self.merkle_root(),
+            "lastHash": self.last_hash,
+            "forger": self.forger_address,
+            "blockCount": self.block_count,
+            "timestamp": self.timestamp,
+            "signature": "",
+        }
 
     def sign(self, signature):
         """Signing the block by setting the block's signature."""
@@ -0,0 +1,240 @@
+"""Beez Blockchain - append-only block log."""
+
+from __future__ import annotations
+from typing import Callable, Iterator, Optional
+import os
+import json
+import zlib
+import struct
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()  # load .env
+LOCAL_BLOCK_LOG_DIRECTORY = "blocks_indices"
+BLOCK_LOG_DIRECTORY = os.getenv("BLOCK_LOG_DIRECTORY", LOCAL_BLOCK_LOG_DIRECTORY)
+# "always" fsyncs every appended block, "never" leaves flushing to the OS
+LOCAL_BLOCK_LOG_FSYNC = "always"
+BLOCK_LOG_FSYNC = os.getenv("BLOCK_LOG_FSYNC", LOCAL_BLOCK_LOG_FSYNC)
+# size after which appends go to a new segment file
+LOCAL_BLOCK_LOG_SEGMENT_BYTES = 64 * 1024 * 1024
+BLOCK_LOG_SEGMENT_BYTES = int(
+    os.getenv("BLOCK_LOG_SEGMENT_BYTES", str(LOCAL_BLOCK_LOG_SEGMENT_BYTES))
+)
+
+# record header: payload length and crc32 of the payload
+RECORD_HEADER = struct.Struct(">II")
+SEGMENT_PREFIX = "blocks-"
+SEGMENT_SUFFIX = ".log"
+
+
+class BlockLog:
+    """
+    Durable append-only log of serialized blocks.
+
+    Blocks are written as length-prefixed, checksummed json records into segment
+    files. The offset index maps the position of every record to its segment and
+    offset; it is rebuilt from the record headers when the log is opened, which
+    also cuts off a record torn by a crash. An append is visible to reads as soon
+    as it returns.
+    """
+
+    logs: dict[str, BlockLog] = {}
+    logs_lock = threading.Lock()
+
+    def __init__(
+        self,
+        directory: str,
+        fsync: Optional[str] = None,
+        segment_bytes: Optional[int] = None,
+    ) -> None:
+        if (fsync or BLOCK_LOG_FSYNC) not in ("always", "never"):
+            raise ValueError(f"Unknown block log fsync policy: {fsync or BLOCK_LOG_FSYNC}")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.fsync = fsync or BLOCK_LOG_FSYNC
+        self.segment_bytes = segment_bytes or BLOCK_LOG_SEGMENT_BYTES
+        self.lock = threading.RLock()
+        self.segments: list[str] = []
+        # position -> (segment number, offset of the record header, payload length)
+        self.offsets: list[tuple[int, int, int]] = []
+        self.writer = None
+        self._load()
+
+    # Singleton
+    @staticmethod
+    def open(directory: Optional[str] = None) -> BlockLog:
+        """Returns the log of directory, reopening it if it was removed."""
+        path = os.path.abspath(directory or BLOCK_LOG_DIRECTORY)
+        with BlockLog.logs_lock:
+            log = BlockLog.logs.get(path)
+            if log is None or not log.exists():
+                log = BlockLog(path)
+                BlockLog.logs[path] = log
+            return log
+
+    def exists(self) -> bool:
+        """Returns whether the directory and the segments of the log still exist."""
+        return os.path.isdir(self.directory) and all(
+            os.path.isfile(self._segment_path(segment)) for segment in self.segments
+        )
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def _segment_path(self, segment: str) -> str:
+        return os.path.join(self.directory, segment)
+
+    def _load(self) -> None:
+        """Rebuilds the offset index from the segment files."""
+        self.segments = sorted(
+            name
+            for name in os.listdir(self.directory)
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)
+        )
+        self.offsets = []
+        for number, segment in enumerate(self.segments):
+            path = self._segment_path(segment)
+            size = os.path.getsize(path)
+            offset = 0
+            with open(path, "rb") as segment_file:
+                while offset + RECORD_HEADER.size <= size:
+                    length, checksum = RECORD_HEADER.unpack(
+                        segment_file.read(RECORD_HEADER.size)
+                    )
+                    payload = segment_file.read(length)
+                    if len(payload) < length or zlib.crc32(payload) != checksum:
+                        break
+                    self.offsets.append((number, offset, length))
+                    offset += RECORD_HEADER.size + length
+            if offset < size:
+                # torn write at the tail, drop it so appends continue cleanly
+                with open(path, "r+b") as segment_file:
+                    segment_file.truncate(offset)
+
+    def _writer(self, record_size: int):
+        """Returns the append handle of the active segment, starting a new segment
+        when the active one would grow beyond the segment size."""
+        if self.segments:
+            active = self._segment_path(self.segments[-1])
+            size = os.path.getsize(active)
+            if size == 0 or size + record_size <= self.segment_bytes:
+                if self.writer is None:
+                    self.writer = open(active, "ab")  # pylint: disable=consider-using-with
+                return self.writer
+        if self.writer is not None:
+            self.writer.close()
+        self.segments.append(f"{SEGMENT_PREFIX}{len(self.offsets):012d}{SEGMENT_SUFFIX}")
+        self.writer = open(  # pylint: disable=consider-using-with
+            self._segment_path(self.segments[-1]), "ab"
+        )
+        return self.writer
+
+    def append(self, serialized_block: dict) -> int:
+        """Durably appends the serialized block and returns its position."""
+        payload = json.dumps(serialized_block).encode("utf-8")
+        record = RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        with self.lock:
+            writer = self._writer(len(record))
+            offset = writer.tell()
+            writer.write(record)
+            writer.flush()
+            if self.fsync == "always":
+                os.fsync(writer.fileno())
+            self.offsets.append((len(self.segments) - 1, offset, len(payload)))
+            return len(self.offsets) - 1
+
+    def read(self, position: int) -> dict:
+        """Returns the serialized block stored at position."""
+        with self.lock:
+            number, offset, length = self.offsets[position]
+            with open(self._segment_path(self.segments[number]), "rb") as segment_file:
+                segment_file.seek(offset + RECORD_HEADER.size)
+                return json.loads(segment_file.read(length))
+
+    def __iter__(self) -> Iterator[dict]:
+        """Yields the serialized blocks in append order."""
+        position = 0
+        while True:
+            with self.lock:
+                if position >= len(self.offsets):
+                    return
+                # the open handle keeps the records readable if the segment is
+                # rewritten meanwhile
+                number = self.offsets[position][0]
+                segment_file = open(  # pylint: disable=consider-using-with
+                    self._segment_path(self.segments[number]), "rb"
+                )
+                records = []
+                for record_number, offset, length in self.offsets[position:]:
+                    if record_number != number:
+                        break
+                    records.append((offset, length))
+            with segment_file:
+                for offset, length in records:
+                    segment_file.seek(offset + RECORD_HEADER.size)
+                    yield json.loads(segment_file.read(length))
+            position += len(records)
+
+    def rewrite_segments(
+        self, last_position: int, transform: Callable[[dict], Optional[dict]]
+    ) -> int:
+        """Rewrites the closed segments holding only records up to last_position,
+        replacing every record by transform(record) unless that returns None.
+        Segments whose last record is kept as is are assumed done and skipped.
+        Returns the number of rewritten segments."""
+        rewritten = 0
+        with self.lock:
+            segment_positions: dict[int, list[int]] = {}
+            for position, (number, _, _) in enumerate(self.offsets):
+                segment_positions.setdefault(number, []).append(position)
+            # the active segment is still appended to and never rewritten
+            for number in range(len(self.segments) - 1):
+                positions = segment_positions.get(number)
+                if not positions or positions[-1] > last_position:
+                    continue
+                if transform(self.read(positions[-1])) is None:
+                    continue
+                self._rewrite_segment(number, positions, transform)
+                rewritten += 1
+        return rewritten
+
+    def _rewrite_segment(
+        self,
+        number: int,
+        positions: list[int],
+        transform: Callable[[dict], Optional[dict]],
+    ) -> None:
+        """Atomically replaces segment number by its transformed records."""
+        path = self._segment_path(self.segments[number])
+        temporary_path = f"{path}.tmp"
+        offsets = []
+        with open(temporary_path, "wb") as segment_file:
+            for position in positions:
+                serialized_block = self.read(position)
+                serialized_block = transform(serialized_block) or serialized_block
+                payload = json.dumps(serialized_block).encode("utf-8")
+                offsets.append((number, segment_file.tell(), len(payload)))
+                segment_file.write(
+                    RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+                )
+            segment_file.flush()
+            os.fsync(segment_file.fileno())
+        os.replace(temporary_path, path)
+        for position, record in zip(positions, offsets):
+            self.offsets[position] = record
+
+    def clear(self) -> None:
+        """Removes all blocks from the log."""
+        with self.lock:
+            self.close()
+            for segment in self.segments:
+                os.remove(self._segment_path(segment))
+            self.segments = []
+            self.offsets = []
+
+    def close(self) -> None:
+        """Closes the append handle."""
+        with self.lock:
+            if self.writer is not None:
+                self.writer.close()
+                self.writer = None
@@ -0,0 +1,164 @@
+"""Beez Blockchain - block store."""
+
+from __future__ import annotations
+from typing import TYPE_CHECKING, Iterable, Iterator, Optional
+from itertools import islice
+import threading
+
+from beez.block.block import Block
+from beez.block.merkle_tree import merkle_proof
+from beez.state.balance_history import BalanceHistory
+
+if TYPE_CHECKING:
+    from beez.block.block_log import BlockLog
+
+
+class BlockStore:
+    """
+    Keeps the blocks of a chain ordered by height.
+
+    Blocks are appended with increasing block counts, so the list stays sorted
+    without re-sorting. The height, hash and transaction maps answer lookups in
+    constant time; they are rebuilt from the block log when a chain is loaded,
+    together with the balance history. Pruning holds the lock, so readers of
+    block bodies take it as well.
+    """
+
+    def __init__(self, blocks: Iterable[Block] = ()) -> None:
+        self.blocks: list[Block] = []
+        self.positions_by_height: dict[int, int] = {}
+        self.positions_by_hash: dict[str, int] = {}
+        # transaction id -> (block count, position inside the block), None once the
+        # block was pruned; the ids are kept to reject replayed transactions
+        self.transaction_locations: dict[str, Optional[tuple[int, int]]] = {}
+        self.balance_history = BalanceHistory()
+        self.lock = threading.RLock()
+        # block count of the highest block whose transactions were pruned
+        self.pruned_height = -1
+        for block in sorted(blocks, key=lambda block: block.block_count):
+            self.append(block)
+
+    def __len__(self) -> int:
+        return len(self.blocks)
+
+    def __iter__(self) -> Iterator[Block]:
+        return iter(self.blocks)
+
+    def append(
+        self, block: Block, balance_deltas: Optional[dict[str, int]] = None
+    ) -> None:
+        """Appends a block higher than the current tip. The balance history records
+        balance_deltas, the changes computed while executing the block, or else
+        the deltas of its header on the first lookup."""
+        if self.blocks and block.block_count <= self.blocks[-1].block_count:
+            raise ValueError(
+                f"Block {block.block_count} is not above the tip "
+                f"{self.blocks[-1].block_count}"
+            )
+        self.positions_by_height[block.block_count] = len(self.blocks)
+        self.positions_by_hash[block.hash()] = len(self.blocks)
+        self.blocks.append(block)
+        if balance_deltas is None:
+            self.balance_history.defer([block])
+        else:
+            self.balance_history.record(block.block_count, balance_deltas)
+        if block.pruned:
+            self.pruned_height = block.block_count
+        for position, transaction_id in enumerate(block.transaction_ids()):
+            self.transaction_locations.setdefault(
+                transaction_id, None if block.pruned else (block.block_count, position)
+            )
+
+    def tip(self) -> Optional[Block]:
+        """Returns the highest block."""
+        return self.blocks[-1] if self.blocks else None
+
+    def tip_hash(self) -> Optional[str]:
+        """Returns the hash of the highest block."""
+        return self.blocks[-1].hash() if self.blocks else None
+
+    def height(self) -> int:
+        """Returns the block count of the tip, -1 for an empty store."""
+        return self.blocks[-1].block_count if self.blocks else -1
+
+    def get_by_height(self, height: int) -> Optional[Block]:
+        """Returns the block with the given block count."""
+        position = self.positions_by_height.get(height)
+        return self.blocks[position] if position is not None else None
+
+    def get_by_hash(self, block_hash: str) -> Optional[Block]:
+        """Returns the block whose payload hashes to block_hash."""
+        position = self.positions_by_hash.get(block_hash)
+        return self.blocks[position] if position is not None else None
+
+    def locate_transaction(self, transaction_id: str) -> Optional[tuple[int, int]]:
+        """Returns the block count and the position inside the block of the
+        transaction with the given id."""
+        return self.transaction_locations.get(transaction_id)
+
+    def has_transaction(self, transaction_id: str) -> bool:
+        """Returns whether a stored or a pruned block contains the transaction."""
+        return transaction_id in self.transaction_locations
+
+    def transaction_proof(self, transaction_id: str) -> Optional[dict]:
+        """Returns the Merkle inclusion proof of the transaction with the given id,
+        None if it is not in a stored block body."""
+        with self.lock:
+            location = self.locate_transaction(transaction_id)
+            if location is None:
+                return None
+            block_count, position = location
+            block = self.blocks[self.positions_by_height[block_count]]
+            leaves = block.transaction_hashes()
+        return {
+            "id": transaction_id,
+            "blockCount": block_count,
+            "blockHash": block.hash(),
+            "merkleRoot": block.merkle_root(),
+            "position": position,
+            "leaf": leaves[position],
+            "path": merkle_proof(leaves, position),
+        }
+
+    def balance_at(self, address: str, height: int) -> Optional[int]:
+        """Returns the balance of address after the block at height, None if the
+        chain is not that high yet."""
+        if height > self.height():
+            return None
+        return self.balance_history.balance(address, height)
+
+    def prune_bodies(self, height: int, block_log: Optional[BlockLog] = None) -> int:
+        """Prunes the transactions of the blocks up to height, keeping headers,
+        hashes and transaction ids, in memory and in the closed segments of
+        block_log. Returns the block count of the highest pruned block."""
+        with self.lock:
+            start = self.positions_by_height.get(self.pruned_height, -1) + 1
+            for block in islice(self.blocks, start, None):
+                if block.block_count > height:
+                    break
+                for transaction_id in block.transaction_ids():
+                    location = self.transaction_locations.get(transaction_id)
+                    if location is not None and location[0] == block.block_count:
+                        self.transaction_locations[transaction_id] = None
+                block.prune()
+                self.pruned_height = block.block_count
+            last_position = self.positions_by_height.get(self.pruned_height, -1)
+            if block_log is not None and last_position >= 0:
+                block_log.rewrite_segments(last_position, BlockStore._pruned_record)
+            return self.pruned_height
+
+    @staticmethod
+    def _pruned_record(serialized_block: dict) -> Optional[dict]:
+        """Returns the pruned form of a serialized block, None if already pruned."""
+        if serialized_block.get("pruned"):
+            return None
+        return Block.deserialize(serialized_block, index=False).prune().serialize()
+
+    def clear(self) -> None:
+        """Removes all blocks."""
+        self.blocks = []
+        self.positions_by_height = {}
+        self.positions_by_hash = {}
+        self.transaction_locations = {}
+        self.balance_history = BalanceHistory()
+        self.pruned_height = -1
@@ -1,27 +1,30 @@
 """Beez Blockchain - blockchain."""
 
 from __future__ import annotations
-from typing import TYPE_CHECKING, List, cast, Optional
+from typing import TYPE_CHECKING, Iterable, List, cast, Optional
+import json
 
 from loguru import logger
 
-from whoosh.fields import Schema, TEXT, KEYWORD, ID  # type: ignore
 from beez.block.block import Block
+from beez.block.block_store import BlockStore
+from beez.block.chain_storage import ChainStorage
 from beez.beez_utils import BeezUtils
 from beez.state.account_state_model import AccountStateModel
+from beez.state.state_store import state_root
+from beez.state.ledger_replay import LedgerReplay
 from beez.consensus.proof_of_stake import ProofOfStake
 from beez.transaction.transaction_type import TransactionType
 from beez.transaction.challenge_tx import ChallengeTX
 from beez.keys.genesis_public_key import GenesisPublicKey
 from beez.block.header import Header
 from beez.challenge.beez_keeper import BeezKeeper
-from beez.index.index_engine import BlockIndexEngine
+from beez.challenge.challenge import Challenge
 
 
 if TYPE_CHECKING:
     from beez.transaction.transaction import Transaction
     from beez.wallet.wallet import Wallet
-    from beez.challenge.challenge import Challenge
 
 
 class Blockchain:
@@ -30,22 +33,19 @@ class Blockchain:
     """
 
     def __init__(self, index=True):
-        self.blocks_index = BlockIndexEngine.get_engine(
-            Schema(
-                id=ID(stored=True),
-                type=KEYWORD(stored=True),
-                block_serialized=TEXT(stored=True),
-            )
-        )
+        # chains received from peers are throwaway, keep them off the disk
+        self.storage = ChainStorage.open() if index else ChainStorage()
 
         self.account_state_model = AccountStateModel()
-        self.pos = ProofOfStake()
+        self.pos = ProofOfStake(index=index)
         self.beez_keeper = BeezKeeper()
         self.genesis_public_key = GenesisPublicKey().pub_key
         self.block_count = -1
-        self.in_memory_blocks: List[Block] = []
+        self.block_store = BlockStore()
 
-        self.append_genesis(Block.genesis(), index)
+        if index:
+            self.storage.import_block_index()
+        self._append_genesis(Block.genesis(), index)
 
         # for testing...
         # self.accountStateModel.start()
@@ -65,7 +65,9 @@ class Blockchain:
         """Deserialize the blockchain and return a blockchain object."""
         # delete all blocks
         if index:
-            self.blocks_index.delete_document("type", "BL")
+            self.storage.clear()
+        self.block_store = BlockStore()
+        self.block_count = -1
         # add the blocks
         for block in serialized_blockchain["blocks"]:
             if block["blockCount"] == 0:
@@ -82,6 +84,8 @@ class Blockchain:
         self.pos = ProofOfStake.deserialize(serialized_blockchain["pos"], index)
         self.beez_keeper = BeezKeeper.deserialize(serialized_blockchain["beezKeeper"])
         self.genesis_public_key = serialized_blockchain["genesisPublicKey"]
+        if index:
+            self._save_state()
         return self
 
     @staticmethod
@@ -92,66 +96,261 @@ class Blockchain:
         )
 
     def blocks_from_index(self):
-        """Returning all the blocks from the current state."""
-        blocks = []
-        block_docs = self.blocks_index.query(query="BL", fields=["type"], highlight=True)
-        for doc in block_docs:
-            blocks.append(Block.deserialize(doc["block_serialized"], index=False))
-        blocks = sorted(blocks, key=lambda block: block.block_count)
-        return blocks
+        """Returning all the blocks persisted in the block log."""
+        if self.storage.block_log is None:
+            return self.blocks()
+        return self.storage.load_blocks()
 
     def blocks(self):
         """Returning all the blocks from the current state."""
-        blocks = self.in_memory_blocks
-        blocks = sorted(blocks, key=lambda block: block.block_count)
-        return blocks
+        return list(self.block_store)
 
     def to_json(self):
         """Returning the blockchain in json format."""
         json_blockchain = {}
         json_blocks = []
-        for block in self.blocks():
+        for block in self.block_store:
             json_blocks.append(block.to_json())
         json_blockchain["blocks"] = json_blocks
 
         return json_blockchain
 
-    def append_genesis(self, block: Block, index=True):
+    def _append_genesis(self, block: Block, index=True):
         """Append the first block, genesis, to the blockchain."""
-        if len(self.blocks_index.query("BL", ["type"])) == 0:
-            header = Header(self.beez_keeper, self.account_state_model)
+        if self.storage.block_log is None or len(self.storage.block_log) == 0:
+            header = Header.from_state(self.beez_keeper, self.account_state_model)
             block.header = header
-            self._append_block(block, genesis=True, index=index)
+            self._append_block(block, genesis=True, index=index, balance_deltas={})
+            if index:
+                self.pos.flush()
+                self._save_state()
 
-    def _append_block(self, block: Block, genesis=False, index=True):
-        """Append a block to the blockchain state. Should only be used internally."""
+    def _append_block(
+        self,
+        block: Block,
+        genesis=False,
+        index=True,
+        balance_deltas: Optional[dict[str, int]] = None,
+    ):
+        """Append a block to the blockchain state. Should only be used internally.
+        The balance history records balance_deltas, the changes computed while
+        executing the block, or else the deltas of its header."""
         if genesis or (
-            len(self.blocks()) > 0 and block.block_count > self.blocks()[-1].block_count
+            len(self.block_store) > 0 and block.block_count > self.block_store.height()
         ):
             self.block_count += 1
-            if index:
-                before_index_block_count = len(self.blocks_from_index())
-                while len(self.blocks_from_index()) == before_index_block_count:
-                    self.blocks_index.index_documents(
-                        [
-                            {
-                                "id": str(block.block_count),
-                                "type": "BL",
-                                "block_serialized": str(block.serialize()),
-                            }
-                        ]
-                    )
-            self.in_memory_blocks.append(block)
+            if index and self.storage.block_log is not None:
+                self.storage.block_log.append(block.serialize())
+            self.block_store.append(block, balance_deltas)
+
+    def load_from_index(self):
+        """Loads the persisted blocks and restores the state of their tip."""
+        # the headers are decoded when the balance history is first looked up
+        self.block_store = BlockStore(self.blocks_from_index())
+        tip = self.block_store.tip()
+        if tip is not None:
+            self.block_count = tip.block_count
+            self._restore_state()
+
+    def _save_state(
+        self,
+        root: Optional[str] = None,
+        balance_deltas: Optional[dict[str, int]] = None,
+    ):
+        """Stores the state reached at the tip in the state store and takes a
+        snapshot every snapshot interval blocks. Given the balance deltas of the
+        tip block only these are stored, except on snapshots, which also write the
+        full state. The state root is computed unless given."""
+        height = self.block_store.height()
+        state_store = self.storage.state_store
+        snapshot_store = self.storage.snapshot_store
+        if state_store is not None:
+            root = root or state_root(self.account_state_model, self.beez_keeper)
+            snapshot_due = snapshot_store is not None and snapshot_store.due(height)
+            if balance_deltas is None or snapshot_due:
+                state_store.save(
+                    height, self.account_state_model, self.beez_keeper, root
+                )
+            else:
+                state_store.append(
+                    height,
+                    balance_deltas,
+                    self.account_state_model,
+                    self.beez_keeper,
+                    root,
+                )
+            if snapshot_store is not None and snapshot_due:
+                snapshot_store.save(
+                    {
+                        "height": height,
+                        "tipHash": self.block_store.tip_hash(),
+                        "stateRoot": root,
+                        "balances": self.account_state_model.balances(),
+                        "beezKeeper": self.beez_keeper.serialize(),
+                        "pos": self.pos.serialize(),
+                    }
+                )
+
+    def _restore_state(self) -> bool:
+        """Restores the state of the tip from the state store when it matches the
+        tip, otherwise from the newest snapshot of this chain by replaying only the
+        blocks after it. Returns whether the stored tip state was used."""
+        tip = self.block_store.tip()
+        state_store = self.storage.state_store
+        saved_state = state_store.load() if state_store is not None else None
+        if (
+            saved_state is not None
+            and tip is not None
+            and saved_state["height"] == tip.block_count
+            and (tip.header is None or saved_state["stateRoot"] == tip.header.state_root)
+        ):
+            self.account_state_model = AccountStateModel.deserialize(
+                saved_state["balances"]
+            )
+            self.beez_keeper = BeezKeeper.deserialize(saved_state["beezKeeper"])
+            return True
+
+        snapshot = self.storage.latest_snapshot(self.block_store)
+        if snapshot is None:
+            logger.warning("No snapshot matches the chain, replaying it from genesis")
+            snapshot = {
+                "height": 0,
+                "balances": {},
+                "beezKeeper": {},
+                "pos": {self.genesis_public_key: 1},
+            }
+        self.account_state_model = AccountStateModel.deserialize(snapshot["balances"])
+        self.beez_keeper = BeezKeeper.deserialize(snapshot["beezKeeper"])
+        self.pos.restore(snapshot["pos"])
+        uncovered = self._replay_blocks(
+            block for block in self.block_store if block.block_count > snapshot["height"]
+        )
+        if uncovered:
+            logger.warning(f"{len(uncovered)} replayed transactions were not covered")
+        self.account_state_model.take_deltas()
+        self.pos.flush()
+        self._save_state()
+        return False
 
-    def add_block(self, block: Block):
-        """Prepare the appending of a new block by executing its corresponding transactions."""
-        latest_block = self.blocks()[-1]
+    def _begin(self):
+        """Starts a speculative change of the account state, stakes and challenges."""
+        self.account_state_model.begin()
+        self.pos.begin()
+        self.beez_keeper.begin()
+
+    def _commit(self):
+        """Keeps the changes made since the matching begin()."""
+        self.account_state_model.commit()
+        self.pos.commit()
+        self.beez_keeper.commit()
+
+    def _rollback(self):
+        """Undoes the changes made since the matching begin()."""
+        self.account_state_model.rollback()
+        self.pos.rollback()
+        self.beez_keeper.rollback()
+
+    def add_block(self, block: Block) -> bool:
+        """Executes the transactions of a new block and appends it if the reached
+        state matches its header, returns whether the block was appended."""
         if (
-            latest_block.block_count < block.block_count
-            and BeezUtils.hash(latest_block.payload()).hexdigest() == block.last_hash
+            self.block_store.height() >= block.block_count
+            or self.block_store.tip_hash() != block.last_hash
         ):
+            return False
+        # drop changes not made by the transactions of this block
+        self.account_state_model.take_deltas()
+        self._begin()
+        try:
             self.execute_transactions(block.transactions)
-            self._append_block(block)
+            balance_deltas = self.account_state_model.take_deltas()
+            root = state_root(self.account_state_model, self.beez_keeper)
+            if block.header is not None and (
+                block.header.balance_deltas != balance_deltas
+                or block.header.state_root != root
+            ):
+                logger.warning(
+                    f"State of block {block.block_count} differs from its header"
+                )
+                self._rollback()
+                return False
+        except Exception:
+            self._rollback()
+            raise
+        self._store_blocks([block], [balance_deltas])
+        self._save_state(root, balance_deltas)
+        return True
+
+    def _store_blocks(
+        self, blocks: List[Block], block_deltas: List[dict[str, int]]
+    ) -> None:
+        """Appends executed blocks and keeps the changes made since begin().
+
+        The block log, the stakes and the state store are written one after the
+        other, not atomically. The blocks are written first and the stakes once
+        they are durable, with one commit; save_state follows. After a crash the
+        stored state is thus at most behind the block log, and restore_state
+        replays the missing blocks on top of the newest snapshot, stakes included.
+        """
+        for block, balance_deltas in zip(blocks, block_deltas):
+            self._append_block(block, balance_deltas=balance_deltas)
+        with self.pos.batch():
+            self._commit()
+            self.pos.flush()
+
+    def append_blocks(self, blocks: List[Block]) -> bool:
+        """Appends blocks received from a peer on top of the tip, rebuilding the
+        state from their transactions block by block. Returns False and leaves the
+        chain and its state untouched if a block has no header, a transaction is not
+        covered, the blocks don't link up or the state reached after a block
+        differs from its header."""
+        if not blocks:
+            return False
+        # drop changes not made by the transactions of these blocks
+        self.account_state_model.take_deltas()
+        self._begin()
+        try:
+            last_hash = self.block_store.tip_hash()
+            block_deltas = []
+            for block in blocks:
+                uncovered = self._replay_blocks([block])
+                balance_deltas = self.account_state_model.take_deltas()
+                root = state_root(self.account_state_model, self.beez_keeper)
+                header = block.header
+                if (
+                    block.last_hash != last_hash
+                    or uncovered
+                    or header is None
+                    or header.balance_deltas != balance_deltas
+                    or header.state_root != root
+                ):
+                    logger.warning(
+                        f"State of block {block.block_count} differs from its header"
+                    )
+                    self._rollback()
+                    return False
+                last_hash = block.hash()
+                block_deltas.append(balance_deltas)
+        except Exception:
+            self._rollback()
+            raise
+        self._store_blocks(blocks, block_deltas)
+        self._save_state(root)
+        return True
+
+    def _replay_blocks(self, blocks: Iterable[Block]) -> list[tuple[int, int]]:
+        """Applies the transactions of blocks in bulk, like executing them one by
+        one, and returns the block count and position of every transaction whose
+        sender could not cover it."""
+        replay = LedgerReplay(self.account_state_model).load(blocks)
+        uncovered = replay.run()
+        for public_key, stake in replay.stakes:
+            self.pos.update(public_key, stake)
+        for serialized_challenge in replay.challenges:
+            challenge = Challenge.from_pickle(json.dumps(serialized_challenge))
+            if not self.beez_keeper.challege_exists(challenge.identifier):
+                self.beez_keeper.set(challenge)
+        return uncovered
 
     def execute_transactions(self, transactions: List[Transaction]):
         """Executes a list of transactions."""
@@ -210,18 +409,11 @@ class Blockchain:
 
     def transaction_exist(self, transaction: Transaction):
         """Check if a given transaction exists in the current blockchain state."""
-        # TODO: Find a better solution to check if a transaction already exist into the blockchain!
-        response = []
-        for block in self.blocks():
-            all_tx_hash = list(map(lambda x: x.identifier, block.transactions))
-            response.append(BeezUtils.tx_binary_search(all_tx_hash, transaction.identifier))
-        return any(response)
-
+        return self.block_store.has_transaction(transaction.identifier)
 
     def next_forger(self) -> Optional[str]:
         """Returns the forger for of the next block."""
-        latest_blockhash = BeezUtils.hash(self.blocks()[-1].payload()).hexdigest()
-        next_forger = self.pos.forger(latest_blockhash)
+        next_forger = self.pos.forger(self.block_store.tip_hash())
 
         return next_forger
 
@@ -233,22 +425,32 @@ class Blockchain:
         covered_transactions = self.get_covered_transactionset(transction_from_pool)
 
         # check the type of transactions and do the right action
-        self.execute_transactions(covered_transactions)
-
-        # Get the updated version of the in-memory objects and create the Block Header
-        header = Header(self.beez_keeper, self.account_state_model)
-
-        logger.info(f"Header: {len(header.beez_keeper.challanges().items())}")
+        self.account_state_model.take_deltas()
+        self._begin()
+        try:
+            self.execute_transactions(covered_transactions)
+
+            # Commit to the updated version of the in-memory objects in the Block Header
+            header = Header.from_state(
+                self.beez_keeper,
+                self.account_state_model,
+                self.account_state_model.take_deltas(),
+            )
 
-        # create the Block
-        new_block = forger_wallet.create_block(
-            header,
-            covered_transactions,
-            BeezUtils.hash(self.blocks()[-1].payload()).hexdigest(),
-            self.block_count + 1,
-        )
+            logger.info(f"Header: {header.state_root}")
 
-        self._append_block(new_block)
+            # create the Block
+            new_block = forger_wallet.create_block(
+                header,
+                covered_transactions,
+                self.block_store.tip_hash(),
+                self.block_count + 1,
+            )
+        except Exception:
+            self._rollback()
+            raise
+        self._store_blocks([new_block], [header.balance_deltas])
+        self._save_state(header.state_root, header.balance_deltas)
 
         return new_block
 
@@ -257,24 +459,39 @@ class Blockchain:
     ) -> List[Transaction]:
         """Returns the subset of covered transactions from all transactions in
         the current transaction pool state."""
-        covered_transactions: list[Transaction] = []
-        added_transaction_ids: list[str] = []
-        for transaction in transactions_from_pool:
-            if (
-                self.transaction_covered(transaction)
-                and transaction.identifier not in added_transaction_ids
-            ):
-                covered_transactions.append(transaction)
-                # to make sure duplicates will be not added to the block twice
-                added_transaction_ids.append(transaction.identifier)
-            else:
-                logger.info(
-                    f"""This transaction {transaction.identifier} is not covered
-                    [no enogh tokes ({transaction.amount})] or already added to covered
-                    transactions."""
+        verdicts = self._validate_transactions(transactions_from_pool)
+        return [
+            transaction
+            for transaction, verdict in zip(transactions_from_pool, verdicts)
+            if verdict
+        ]
+
+    def _validate_transactions(self, transactions: List[Transaction]) -> list[bool]:
+        """Returns for every transaction whether it is valid after the ones before
+        it. Valid transactions are executed on a journal that is rolled back at
+        the end, so a sender can't spend the same tokens twice in one block."""
+        verdicts: list[bool] = []
+        seen_transaction_ids: set[str] = set()
+        self._begin()
+        try:
+            for transaction in transactions:
+                verdict = (
+                    transaction.identifier not in seen_transaction_ids
+                    and self.transaction_covered(transaction)
                 )
-
-        return covered_transactions
+                if verdict:
+                    seen_transaction_ids.add(transaction.identifier)
+                    self.execute_transaction(transaction)
+                else:
+                    logger.info(
+                        f"""This transaction {transaction.identifier} is not covered
+                        [no enogh tokes ({transaction.amount})] or already added to covered
+                        transactions."""
+                    )
+                verdicts.append(verdict)
+        finally:
+            self._rollback()
+        return verdicts
 
     def transaction_covered(self, transaction: Transaction):
         """
@@ -326,15 +543,14 @@ class Blockchain:
 
     def blockcount_valid(self, block: Block):
         """Returns wheter a given block could be the next block based on its block count."""
-        if self.blocks()[-1].block_count == block.block_count - 1:
+        if self.block_store.height() == block.block_count - 1:
             return True
         return False
 
     def last_blockhash_valid(self, block: Block):
         """Returns whether the last block hash of a given block is valid in respect to
         its current blockchain state."""
-        latest_blockchain_hash = BeezUtils.hash(self.blocks()[-1].payload()).hexdigest()
-        if latest_blockchain_hash == block.last_hash:
+        if self.block_store.tip_hash() == block.last_hash:
             return True
         return False
 
@@ -348,9 +564,5 @@ class Blockchain:
         return False
 
     def transaction_valid(self, transactions: List[Transaction]):
-        """Checks if a the covered transactions of a list of transactions are valid."""
-        covered_transactions = self.get_covered_transactionset(transactions)
-        # if the lenght are equal than nodes are not cheating
-        if len(covered_transactions) == len(transactions):
-            return True
-        return False
+        """Checks if all transactions of a list of transactions are valid."""
+        return all(self._validate_transactions(transactions))
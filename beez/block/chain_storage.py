@@ -0,0 +1,120 @@
+"""Beez Blockchain - durable storage of a chain."""
+
+from __future__ import annotations
+from typing import TYPE_CHECKING, Optional
+import os
+
+from loguru import logger
+from whoosh import index as whoosh_index  # type: ignore
+from whoosh.fields import Schema, TEXT, KEYWORD, ID  # type: ignore
+
+from beez.block.block import Block
+from beez.block.block_log import BlockLog
+from beez.state.state_store import StateStore
+from beez.state.snapshot_store import SnapshotStore
+from beez.index.index_engine import BlockIndexEngine
+from beez.index.node_store import NodeStore, NODE_DATA_ROOT
+from beez.index.sqlite_backend import SqliteBackend
+from beez.index.store_backend import StoreBackend
+from beez.index.whoosh_backend import WhooshBackend
+from beez.index.query import Term
+
+if TYPE_CHECKING:
+    from beez.block.block_store import BlockStore
+
+
+def legacy_block_index() -> Optional[BlockIndexEngine]:
+    """Returns the block index the blocks were kept in before the block log, None
+    if the node never wrote one."""
+    directory = BlockIndexEngine.directory
+    index_name = BlockIndexEngine.index_name
+    if whoosh_index.exists_in(directory, indexname=index_name):
+        backend = WhooshBackend.name
+    elif os.path.isfile(os.path.join(directory, f"{index_name}.sqlite3")):
+        backend = SqliteBackend.name
+    elif os.path.isfile(
+        os.path.join(NODE_DATA_ROOT, "node.sqlite3")
+    ) and NodeStore.open().has_family(index_name):
+        backend = StoreBackend.name
+    else:
+        return None
+    schema = Schema(
+        id=ID(stored=True),
+        type=KEYWORD(stored=True),
+        block_serialized=TEXT(stored=True),
+    )
+    return BlockIndexEngine(schema, backend=backend, buffer_size=0)
+
+
+class ChainStorage:
+    """
+    Block log, state store and snapshot store of a chain.
+
+    Chains received from peers are throwaway and get a storage without stores,
+    every write to it is skipped.
+    """
+
+    def __init__(
+        self,
+        block_log: Optional[BlockLog] = None,
+        state_store: Optional[StateStore] = None,
+        snapshot_store: Optional[SnapshotStore] = None,
+    ) -> None:
+        self.block_log = block_log
+        self.state_store = state_store
+        self.snapshot_store = snapshot_store
+
+    @staticmethod
+    def open() -> ChainStorage:
+        """Returns the storage of the node's stores."""
+        return ChainStorage(BlockLog.open(), StateStore.open(), SnapshotStore.open())
+
+    def import_block_index(self) -> int:
+        """Copies the blocks of the block index used before the block log into the
+        still empty log, so a node upgraded in place keeps its chain. Returns the
+        number of imported blocks."""
+        if self.block_log is None or len(self.block_log) > 0:
+            return 0
+        blocks_index = legacy_block_index()
+        if blocks_index is None:
+            return 0
+        blocks = sorted(
+            (
+                Block.deserialize(doc["block_serialized"], index=False)
+                for doc in blocks_index.iter_query(Term("type", "BL"))
+            ),
+            key=lambda block: block.block_count,
+        )
+        blocks_index.close()
+        for block in blocks:
+            self.block_log.append(block.serialize())
+        if blocks:
+            logger.info(f"Imported {len(blocks)} blocks of the block index into the block log")
+        return len(blocks)
+
+    def load_blocks(self) -> list[Block]:
+        """Returns the blocks of the block log ordered by height."""
+        if self.block_log is None:
+            return []
+        blocks = [
+            Block.deserialize(serialized_block, index=False)
+            for serialized_block in self.block_log
+        ]
+        return sorted(blocks, key=lambda block: block.block_count)
+
+    def latest_snapshot(self, block_store: BlockStore) -> Optional[dict]:
+        """Returns the newest snapshot taken on a block of block_store."""
+        if self.snapshot_store is None:
+            return None
+        for snapshot in self.snapshot_store.newest_first():
+            block = block_store.get_by_height(snapshot["height"])
+            if block is not None and block.hash() == snapshot["tipHash"]:
+                return snapshot
+        return None
+
+    def clear(self) -> None:
+        """Removes the blocks and the snapshots."""
+        if self.block_log is not None:
+            self.block_log.clear()
+        if self.snapshot_store is not None:
+            self.snapshot_store.clear()
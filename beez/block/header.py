@@ -1,51 +1,59 @@
 """Beez blockchain - block header."""
 
 from __future__ import annotations
+from typing import Optional
 
 from beez.challenge.beez_keeper import BeezKeeper
 from beez.state.account_state_model import AccountStateModel
+from beez.state.state_store import state_root
 
 
 class Header:
     """
-    The Header of the block contains the updated data of the in memory objects:
+    The Header of the block commits to the state reached after the block:
 
-    AccountStateModel : Wallet balances
-    BeezKeeper: Challenges
+    stateRoot: hash of the wallet balances and the kept challenges
+    balanceDeltas: balance changes made by the transactions of the block
 
-    that must be shared between peers
+    The full AccountStateModel and BeezKeeper are kept once in the StateStore,
+    so a header grows with the transactions of its block, not with the accounts.
     """
 
-    def __init__(self, beez_keeper: BeezKeeper, account_state_model: AccountStateModel) -> None:
-        self.beez_keeper = beez_keeper
-        self.account_state_model = account_state_model
+    def __init__(
+        self, state_root_hash: str, balance_deltas: Optional[dict[str, int]] = None
+    ) -> None:
+        self.state_root = state_root_hash
+        self.balance_deltas = balance_deltas or {}
+
+    @staticmethod
+    def from_state(
+        beez_keeper: BeezKeeper,
+        account_state_model: AccountStateModel,
+        balance_deltas: Optional[dict[str, int]] = None,
+    ) -> Header:
+        """Returns the header committing to the given state."""
+        return Header(state_root(account_state_model, beez_keeper), balance_deltas)
 
     def serialize(self):
         """Returns the header in serialized form."""
-        return {
-            "beezKeeper": self.beez_keeper.serialize() if self.beez_keeper else {},
-            "accountStateModel": self.account_state_model.serialize()
-            if self.account_state_model
-            else {},
-        }
+        return {"stateRoot": self.state_root, "balanceDeltas": self.balance_deltas}
 
     @staticmethod
-    def deserialize(serialized_beez_keeper, serialized_account_state_model, index=True) -> Header:
+    def deserialize(serialized_header, index=True) -> Header:
         """Returns a header object based on serialized header."""
+        if "stateRoot" not in serialized_header:
+            # header written before state roots, it embeds the full state
+            return Header.from_state(
+                BeezKeeper.deserialize(serialized_header["beezKeeper"], index),
+                AccountStateModel.deserialize(
+                    serialized_header["accountStateModel"].get("balances", {}), index
+                ),
+            )
         return Header(
-            BeezKeeper.deserialize(serialized_beez_keeper, index),
-            AccountStateModel.deserialize(serialized_account_state_model["balances"], index),
+            serialized_header["stateRoot"], dict(serialized_header["balanceDeltas"])
         )
 
-    def _deserialize(self, serialized_beez_keeper, serialized_account_state_model):
-        """Deserializes the header."""
-        self.beez_keeper.deserialize(serialized_beez_keeper)  # need Real Challenge objects here
-        self.account_state_model.deserialize(serialized_account_state_model)
-
-    def get_beez_keeper(self) -> BeezKeeper:
-        """Returns the beez keeper."""
-        return self.beez_keeper
-
-    def get_account_state_model(self) -> AccountStateModel:
-        """Returns the account state model."""
-        return self.account_state_model
+    def apply(self, account_state_model: AccountStateModel) -> None:
+        """Applies the balance deltas of the block to account_state_model."""
+        for address, amount in self.balance_deltas.items():
+            account_state_model.update_balance(address, amount)
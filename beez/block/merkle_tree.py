@@ -0,0 +1,67 @@
+"""Beez Blockchain - Merkle tree over block transactions."""
+
+from __future__ import annotations
+from typing import Sequence
+
+from beez.beez_utils import BeezUtils
+
+# root of a block without transactions
+EMPTY_MERKLE_ROOT = BeezUtils.hash([]).hexdigest()
+
+
+def transaction_hash(transaction_json: dict) -> str:
+    """Returns the leaf hash of a transaction in json form."""
+    return BeezUtils.hash(transaction_json).hexdigest()
+
+
+def parent_hash(left: str, right: str) -> str:
+    """Returns the hash of an inner node. Inner nodes hash a list and leaves a
+    dict, so an inner node can't be passed off as a transaction."""
+    return BeezUtils.hash([left, right]).hexdigest()
+
+
+def merkle_levels(leaves: Sequence[str]) -> list[list[str]]:
+    """Returns the levels of the tree from the leaves up to the root. The last
+    node of a level with an odd number of nodes is promoted unchanged."""
+    levels = [list(leaves)]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        parents = [
+            parent_hash(level[position], level[position + 1])
+            for position in range(0, len(level) - 1, 2)
+        ]
+        if len(level) % 2:
+            parents.append(level[-1])
+        levels.append(parents)
+    return levels
+
+
+def merkle_root(leaves: Sequence[str]) -> str:
+    """Returns the root over the leaf hashes."""
+    if not leaves:
+        return EMPTY_MERKLE_ROOT
+    return merkle_levels(leaves)[-1][0]
+
+
+def merkle_proof(leaves: Sequence[str], position: int) -> list[dict[str, str]]:
+    """Returns the sibling hashes on the path from the leaf at position to the
+    root, each with the side it is hashed in from."""
+    proof = []
+    for level in merkle_levels(leaves)[:-1]:
+        sibling = position ^ 1
+        if sibling < len(level):
+            side = "left" if sibling < position else "right"
+            proof.append({"side": side, "hash": level[sibling]})
+        position //= 2
+    return proof
+
+
+def verify_proof(leaf: str, proof: Sequence[dict[str, str]], root: str) -> bool:
+    """Returns whether proof leads from leaf to root."""
+    node = leaf
+    for step in proof:
+        if step["side"] == "left":
+            node = parent_hash(step["hash"], node)
+        else:
+            node = parent_hash(node, step["hash"])
+    return node == root
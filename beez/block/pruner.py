@@ -0,0 +1,90 @@
+"""Beez Blockchain - background block body pruning."""
+
+from __future__ import annotations
+from typing import TYPE_CHECKING, Optional
+import os
+import time
+from itertools import islice
+from dotenv import load_dotenv
+from loguru import logger
+
+from beez.periodic_worker import PeriodicWorker
+
+if TYPE_CHECKING:
+    from beez.block.blockchain import Blockchain
+
+load_dotenv()  # load .env
+# number of newest blocks whose transactions are kept, 0 keeps them by age only
+LOCAL_PRUNE_KEEP_BLOCKS = 0
+PRUNE_KEEP_BLOCKS = int(os.getenv("PRUNE_KEEP_BLOCKS", str(LOCAL_PRUNE_KEEP_BLOCKS)))
+# age in days up to which the transactions of a block are kept, 0 keeps them by count only
+LOCAL_PRUNE_KEEP_DAYS = 0.0
+PRUNE_KEEP_DAYS = float(os.getenv("PRUNE_KEEP_DAYS", str(LOCAL_PRUNE_KEEP_DAYS)))
+# seconds between two pruning runs
+LOCAL_PRUNE_SECONDS = 300.0
+PRUNE_SECONDS = float(os.getenv("PRUNE_SECONDS", str(LOCAL_PRUNE_SECONDS)))
+
+
+class Pruner(PeriodicWorker):
+    """
+    Background pruning of block bodies.
+
+    Pruning is enabled by setting a number of blocks or days to keep; a block
+    body is kept while the block is among the newest keep_blocks blocks or
+    younger than keep_days. Older bodies are dropped from memory and from the
+    block log, headers and hashes are kept for the whole chain. Bodies after the
+    newest snapshot are never pruned, since a restarting node replays them.
+    """
+
+    def __init__(
+        self,
+        blockchain: Blockchain,
+        keep_blocks: Optional[int] = None,
+        keep_days: Optional[float] = None,
+        interval: Optional[float] = None,
+    ) -> None:
+        super().__init__(PRUNE_SECONDS if interval is None else interval)
+        self.blockchain = blockchain
+        self.keep_blocks = PRUNE_KEEP_BLOCKS if keep_blocks is None else keep_blocks
+        self.keep_days = PRUNE_KEEP_DAYS if keep_days is None else keep_days
+        self.runs = 0
+
+    def enabled(self) -> bool:
+        """Returns whether a number of blocks or days to keep is configured."""
+        return self.keep_blocks > 0 or self.keep_days > 0
+
+    def prune_height(self) -> int:
+        """Returns the block count up to which bodies can be pruned, -1 for none."""
+        if not self.enabled():
+            return -1
+        block_store = self.blockchain.block_store
+        snapshot = self.blockchain.storage.latest_snapshot(block_store)
+        if snapshot is None:
+            return -1
+        height = snapshot["height"]
+        if self.keep_blocks > 0:
+            height = min(height, block_store.height() - self.keep_blocks)
+        if self.keep_days > 0:
+            oldest_kept = time.time() - self.keep_days * 24 * 60 * 60
+            # bodies up to the pruned height are older still, start after them
+            aged_height = block_store.pruned_height
+            start = block_store.positions_by_height.get(aged_height, -1) + 1
+            for block in islice(block_store, start, None):
+                if block.block_count > height or block.timestamp >= oldest_kept:
+                    break
+                aged_height = block.block_count
+            height = aged_height
+        return height
+
+    def run_once(self) -> int:
+        """Prunes the bodies that may go and returns the highest pruned block count."""
+        height = self.prune_height()
+        block_store = self.blockchain.block_store
+        if height > block_store.pruned_height:
+            try:
+                block_store.prune_bodies(height, self.blockchain.storage.block_log)
+            except OSError as error:
+                # a block log removed meanwhile is retried on the next run
+                logger.warning(f"Pruning up to block {height} failed: {error}")
+        self.runs += 1
+        return block_store.pruned_height
@@ -0,0 +1,95 @@
+# pylint: skip-file
+import os
+import shutil
+import pytest
+from beez.block.block_log import BlockLog
+
+
+@pytest.fixture
+def log_directory():
+    shutil.rmtree("block_log_test", ignore_errors=True)
+    yield "block_log_test"
+    shutil.rmtree("block_log_test", ignore_errors=True)
+
+
+def test_append_and_read(log_directory):
+    log = BlockLog(log_directory)
+    assert len(log) == 0
+    assert log.append({"blockCount": 0}) == 0
+    assert log.append({"blockCount": 1, "lastHash": "abc"}) == 1
+    assert log.read(1) == {"blockCount": 1, "lastHash": "abc"}
+    assert [block["blockCount"] for block in log] == [0, 1]
+    log.close()
+
+
+def test_reopen_rebuilds_offsets(log_directory):
+    log = BlockLog(log_directory, segment_bytes=64)
+    for block_count in range(10):
+        log.append({"blockCount": block_count})
+    log.close()
+    assert len(log.segments) > 1
+    reopened = BlockLog(log_directory)
+    assert len(reopened) == 10
+    assert reopened.read(7) == {"blockCount": 7}
+    assert reopened.append({"blockCount": 10}) == 10
+    assert [block["blockCount"] for block in reopened] == list(range(11))
+    reopened.close()
+
+
+def test_torn_record_is_dropped(log_directory):
+    log = BlockLog(log_directory, fsync="never")
+    log.append({"blockCount": 0})
+    log.append({"blockCount": 1})
+    log.close()
+    path = os.path.join(log_directory, log.segments[-1])
+    with open(path, "r+b") as segment_file:
+        segment_file.truncate(os.path.getsize(path) - 3)
+    reopened = BlockLog(log_directory)
+    assert len(reopened) == 1
+    assert reopened.append({"blockCount": 1}) == 1
+    assert [block["blockCount"] for block in reopened] == [0, 1]
+    reopened.close()
+
+
+def test_clear(log_directory):
+    log = BlockLog(log_directory)
+    log.append({"blockCount": 0})
+    log.clear()
+    assert len(log) == 0
+    assert os.listdir(log_directory) == []
+
+
+def test_unknown_fsync_policy(log_directory):
+    with pytest.raises(ValueError):
+        BlockLog(log_directory, fsync="sometimes")
+
+
+def test_open_reopens_removed_log(log_directory):
+    log = BlockLog.open(log_directory)
+    assert BlockLog.open(log_directory) is log
+    shutil.rmtree(log_directory)
+    assert BlockLog.open(log_directory) is not log
+
+
+def test_rewrite_segments(log_directory):
+    log = BlockLog(log_directory, segment_bytes=64)
+    for block_count in range(10):
+        log.append({"blockCount": block_count, "body": "x" * 10})
+    segments = len(log.segments)
+
+    def prune(record):
+        return None if "pruned" in record else {"blockCount": record["blockCount"], "pruned": True}
+
+    # records of the active segment and beyond the position are left alone
+    rewritten = log.rewrite_segments(5, prune)
+    assert 0 < rewritten < segments
+    records = list(log)
+    assert [record["blockCount"] for record in records] == list(range(10))
+    assert records[0] == {"blockCount": 0, "pruned": True}
+    assert records[9]["body"] == "x" * 10
+    assert log.rewrite_segments(5, prune) == 0
+    log.close()
+
+    reopened = BlockLog(log_directory)
+    assert list(reopened) == records
+    reopened.close()
@@ -0,0 +1,85 @@
+# pylint: skip-file
+import pytest
+from beez.block.block import Block
+from beez.block.block_store import BlockStore
+from beez.beez_utils import BeezUtils
+from beez.transaction.transaction import Transaction
+from beez.transaction.transaction_type import TransactionType
+
+
+def make_block(block_count, last_hash="Testhash"):
+    block = Block(None, [], last_hash, "Forger", block_count)
+    block.timestamp = block_count
+    return block
+
+
+def test_empty_store():
+    store = BlockStore()
+    assert len(store) == 0
+    assert store.tip() is None
+    assert store.tip_hash() is None
+    assert store.height() == -1
+    assert store.get_by_height(0) is None
+
+
+def test_lookups():
+    genesis = Block.genesis()
+    store = BlockStore()
+    store.append(genesis)
+    genesis_hash = BeezUtils.hash(genesis.payload()).hexdigest()
+    block = make_block(1, genesis_hash)
+    store.append(block)
+    assert store.tip() is block
+    assert store.height() == 1
+    assert store.tip_hash() == BeezUtils.hash(block.payload()).hexdigest()
+    assert store.get_by_height(0) is genesis
+    assert store.get_by_hash(genesis_hash) is genesis
+    assert store.get_by_hash("unknown") is None
+    assert list(store) == [genesis, block]
+
+
+def test_blocks_are_kept_ordered():
+    blocks = [make_block(2), make_block(0), make_block(1)]
+    store = BlockStore(blocks)
+    assert [block.block_count for block in store] == [0, 1, 2]
+    with pytest.raises(ValueError):
+        store.append(make_block(2))
+    store.clear()
+    assert len(store) == 0
+
+
+def test_locate_transaction():
+    transactions = [
+        Transaction("alice", "bob", 1, TransactionType.TRANSFER.name),
+        Transaction("alice", "bob", 2, TransactionType.TRANSFER.name),
+    ]
+    block = make_block(1)
+    block.transactions = transactions
+    store = BlockStore([make_block(0), block])
+    assert store.locate_transaction(transactions[1].identifier) == (1, 1)
+    assert store.locate_transaction("unknown") is None
+    store.clear()
+    assert store.locate_transaction(transactions[0].identifier) is None
+
+
+def test_prune_bodies():
+    transaction = Transaction("alice", "bob", 1, TransactionType.TRANSFER.name)
+    block = make_block(1)
+    block.transactions = [transaction]
+    block_hash = block.hash()
+    store = BlockStore([make_block(0), block, make_block(2)])
+    assert store.prune_bodies(1) == 1
+    assert store.pruned_height == 1
+    assert block.pruned and block.transactions == []
+    assert block.hash() == block_hash
+    assert store.get_by_hash(block_hash) is block
+    assert store.locate_transaction(transaction.identifier) is None
+    assert store.has_transaction(transaction.identifier)
+    assert not store.has_transaction("unknown")
+    assert not store.get_by_height(2).pruned
+    assert store.prune_bodies(0) == 1
+
+    # the ids of a pruned block survive serialization
+    reloaded = BlockStore([Block.deserialize(block.serialize())])
+    assert reloaded.has_transaction(transaction.identifier)
+    assert reloaded.locate_transaction(transaction.identifier) is None
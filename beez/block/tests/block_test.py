@@ -1,8 +1,13 @@
 # pylint: skip-file
 import pytest
 from beez.block.block import Block
+from beez.beez_utils import BeezUtils
 from typing import cast
 from beez.types import PublicKeyString
+from beez.block.merkle_tree import EMPTY_MERKLE_ROOT
+from beez.block.header import Header
+from beez.transaction.transaction import Transaction
+from beez.transaction.transaction_type import TransactionType
 
 
 @pytest.fixture
@@ -39,6 +44,7 @@ def test_serialize(testblock):
     assert serialization == {
         "header": "",
         "transactions": [],
+        "merkleRoot": EMPTY_MERKLE_ROOT,
         "lastHash": "Hello Beezkeepers! 🐝",
         "forger": "BeezAuthors: Enrico Zanardo 🤙🏽 & ⭐",
         "blockCount": 0,
@@ -67,6 +73,7 @@ def test_to_json(testblock):
     json_block = testblock.to_json()
     assert json_block == {
         "transactions": [],
+        "merkleRoot": EMPTY_MERKLE_ROOT,
         "lastHash": "Hello Beezkeepers! 🐝",
         "forger": "BeezAuthors: Enrico Zanardo 🤙🏽 & ⭐",
         "blockCount": 0,
@@ -77,7 +84,8 @@ def test_to_json(testblock):
 def test_payload(testblock):
     payload = testblock.payload()
     assert payload == {
-        "transactions": [],
+        "headerDigest": "",
+        "merkleRoot": EMPTY_MERKLE_ROOT,
         "lastHash": "Hello Beezkeepers! 🐝",
         "forger": "BeezAuthors: Enrico Zanardo 🤙🏽 & ⭐",
         "blockCount": 0,
@@ -90,3 +98,84 @@ def test_sign(testblock):
     assert testblock.signature == "test signature"
 
 
+def test_block_hash_is_cached():
+    block = Block.genesis()
+    block_hash = block.hash()
+    assert block_hash == BeezUtils.hash(block.payload()).hexdigest()
+    assert block.block_hash == block_hash
+    block.signature = "signed"
+    assert block.hash() == block_hash
+    block.timestamp = 1
+    assert block.block_hash is None
+    assert block.hash() == BeezUtils.hash(block.payload()).hexdigest()
+
+
+def test_decoded_block_recomputes_hash():
+    block = Block.genesis().seal()
+    block.block_hash = "forged"
+    decoded = BeezUtils.decode(BeezUtils.encode(block))
+    assert decoded.block_hash is None
+    assert decoded.hash() == Block.genesis().hash()
+
+
+def test_deserialize_is_lazy():
+    block = Block(
+        Header("root", {"bob": 1, "alice": -1}),
+        [Transaction("alice", "bob", 1, TransactionType.TRANSFER.name)],
+        "last",
+        cast(PublicKeyString, "forger"),
+        1,
+    )
+    serialized = block.serialize()
+    decoded = Block.deserialize(serialized)
+    assert decoded.raw_header is not None
+    assert decoded.raw_transactions is not None
+    assert decoded.hash() == block.hash()
+    assert decoded.transaction_ids() == [block.transactions[0].identifier]
+    assert decoded.serialize() == serialized
+    assert decoded.raw_transactions is not None
+
+    assert decoded.header.state_root == "root"
+    assert decoded.raw_header is None
+    assert decoded.transactions[0].receiver_address == "bob"
+    assert decoded.raw_transactions is None
+    assert decoded.serialize() == serialized
+    assert decoded.hash() == block.hash()
+
+
+def test_merkle_root_commits_to_transactions():
+    block = Block(None, [], "last", cast(PublicKeyString, "forger"), 1)
+    block_hash = block.hash()
+    assert block.merkle_root() == EMPTY_MERKLE_ROOT
+    block.transactions = [Transaction("alice", "bob", 1, TransactionType.TRANSFER.name)]
+    assert block.merkle_root() != EMPTY_MERKLE_ROOT
+    assert block.hash() != block_hash
+
+
+def test_pruned_block_keeps_hash():
+    block = Block(
+        None,
+        [Transaction("alice", "bob", 1, TransactionType.TRANSFER.name)],
+        "last",
+        cast(PublicKeyString, "forger"),
+        1,
+    )
+    block_hash = block.hash()
+    serialized = block.prune().serialize()
+    assert serialized["transactions"] == [] and serialized["pruned"]
+    restored = Block.deserialize(serialized)
+    assert restored.pruned
+    assert restored.hash() == block_hash
+    decoded = BeezUtils.decode(BeezUtils.encode(block))
+    assert decoded.hash() == block_hash
+
+
+def test_header_is_part_of_the_payload():
+    block = Block(Header("root", {"alice": 1}), [], "last", cast(PublicKeyString, "forger"), 1)
+    block_hash = block.hash()
+    decoded = Block.deserialize(block.serialize())
+    assert decoded.hash() == block_hash
+    assert decoded.raw_header is not None
+    # a relayed block can't carry a different header under the same hash
+    decoded.header = Header("root", {"alice": 1, "mallory": 10**6})
+    assert decoded.hash() != block_hash
@@ -2,6 +2,7 @@
 import pathlib
 import shutil
 import pytest
+from whoosh.fields import Schema, TEXT, KEYWORD, ID
 from beez.node.beez_node import BeezNode
 from beez.block.blockchain import Blockchain
 from beez.block.block import Block
@@ -10,11 +11,22 @@ from beez.transaction.transaction_type import TransactionType
 from typing import cast
 from beez.types import PublicKeyString
 from beez.beez_utils import BeezUtils
+from beez.state.account_state_model import AccountStateModel
+from beez.challenge.beez_keeper import BeezKeeper
+from beez.state.state_store import state_root
+from beez.block.merkle_tree import EMPTY_MERKLE_ROOT, verify_proof
+from beez.block.header import Header
+from beez.index.index_engine import BlockIndexEngine
+
+
+EMPTY_STATE_ROOT = state_root(AccountStateModel(), BeezKeeper())
 
 
 def remove_blockchain():
     shutil.rmtree("blocks_indices")
     shutil.rmtree("pos_indices")
+    shutil.rmtree("state_indices", ignore_errors=True)
+    shutil.rmtree("snapshots_indices", ignore_errors=True)
 
 
 @pytest.fixture(scope="function")
@@ -31,11 +43,9 @@ def test_serialize(blockchain):
     assert blockchain.serialize() == {
         "blocks": [
             {
-                "header": {
-                    "beezKeeper": {},
-                    "accountStateModel": {"accounts": [], "balances": {}},
-                },
+                "header": {"stateRoot": EMPTY_STATE_ROOT, "balanceDeltas": {}},
                 "transactions": [],
+                "merkleRoot": EMPTY_MERKLE_ROOT,
                 "lastHash": "Hello Beezkeepers! 🐝",
                 "forger": "BeezAuthors: Enrico Zanardo 🤙🏽 & ⭐",
                 "blockCount": 0,
@@ -57,10 +67,7 @@ def test_deserialize(blockchain):
         {
             "blocks": [
                 {
-                    "header": {
-                        "beezKeeper": {},
-                        "accountStateModel": {"accounts": [], "balances": {}},
-                    },
+                    "header": {"stateRoot": EMPTY_STATE_ROOT, "balanceDeltas": {}},
                     "transactions": [],
                     "lastHash": "Hello Beezkeepers! 🐝",
                     "forger": "BeezAuthors: Enrico Zanardo 🤙🏽 & ⭐",
@@ -84,11 +91,8 @@ def test_deserialize(blockchain):
 def test_blocks(blockchain):
     blocks = blockchain.blocks()
     assert len(blocks) == 1
-    assert blocks[0].header.beez_keeper.serialize() == {}
-    assert blocks[0].header.account_state_model.serialize() == {
-        "accounts": [],
-        "balances": {},
-    }
+    assert blocks[0].header.state_root == EMPTY_STATE_ROOT
+    assert blocks[0].header.balance_deltas == {}
     assert blocks[0].transactions == []
     assert blocks[0].last_hash == "Hello Beezkeepers! 🐝"
     assert blocks[0].forger_address == "BeezAuthors: Enrico Zanardo 🤙🏽 & ⭐"
@@ -115,6 +119,18 @@ def test_append_genesis():
     remove_blockchain()
 
 
+def test_in_memory_blockchain():
+    blockchain = Blockchain(index=False)
+    assert len(blockchain.blocks()) == 1
+    assert blockchain.pos.get(blockchain.genesis_public_key) == 1
+    assert not pathlib.Path("blocks_indices").exists()
+    assert not pathlib.Path("pos_indices").exists()
+
+    restored = Blockchain.deserialize(blockchain.serialize(), index=False)
+    assert len(restored.blocks()) == 1
+    assert not pathlib.Path("blocks_indices").exists()
+
+
 def test_add_block(blockchain):
     """will not be added and last_hash invalid."""
     new_block = Block(
@@ -142,8 +158,30 @@ def test_add_block(blockchain):
     assert len(blockchain.blocks()) == 2
 
 
+def test_add_block_rejects_header_mismatch(blockchain):
+    currentPath = pathlib.Path().resolve()
+    genesis_wallet = Wallet()
+    genesis_wallet.from_key(f"{currentPath}/beez/keys/genesisPrivateKey.pem")
+    exchange_tx = genesis_wallet.create_transaction(
+        "alice", 100, TransactionType.EXCHANGE.name
+    )
+    new_block = Block(
+        Header(EMPTY_STATE_ROOT, {"alice": 100}),
+        [exchange_tx],
+        blockchain.block_store.tip_hash(),
+        cast(PublicKeyString, "Another fake public key string"),
+        1,
+    )
+
+    assert blockchain.add_block(new_block) is False
+    assert len(blockchain.blocks()) == 1
+    assert blockchain.account_state_model.get_balance("alice") == 0
+    assert blockchain.account_state_model.journal == []
+    assert blockchain.pos.journal == []
+
+
 def test_execute_transactions():
-    node = BeezNode(port=4004)
+    node = BeezNode(port=4010)
     currentPath = pathlib.Path().resolve()
 
     genesis_private_key_path = f"{currentPath}/beez/keys/genesisPrivateKey.pem"
@@ -206,6 +244,14 @@ def test_transaction_exists(blockchain):
     # assert len(blockchain.blocks()) == 2
     assert blockchain.transaction_exist(exchange_tx) == True
     assert blockchain.transaction_exist(new_exchange_tx) == False
+    assert blockchain.block_store.locate_transaction(exchange_tx.identifier) == (2, 0)
+    assert blockchain.block_store.locate_transaction(new_exchange_tx.identifier) is None
+
+    proof = blockchain.block_store.transaction_proof(exchange_tx.identifier)
+    assert proof["blockHash"] == new_block.hash()
+    assert proof["merkleRoot"] == new_block.merkle_root()
+    assert verify_proof(proof["leaf"], proof["path"], proof["merkleRoot"])
+    assert blockchain.block_store.transaction_proof(new_exchange_tx.identifier) is None
 
 
 def test_next_forger(blockchain):
@@ -240,6 +286,60 @@ def test_mint_block(blockchain):
     assert new_block.transactions == [exchange_tx, new_exchange_tx]
     assert new_block.forger_address == BeezUtils.address_from_public_key(genesis_wallet.public_key_string())
     assert new_block.block_count == 1
+    assert new_block.header.balance_deltas == {
+        BeezUtils.address_from_public_key(genesis_wallet.public_key_string()): -300,
+        alice_wallet.public_key_string(): 300,
+    }
+    assert new_block.header.state_root == state_root(
+        blockchain.account_state_model, blockchain.beez_keeper
+    )
+    assert blockchain.storage.state_store.load()["stateRoot"] == new_block.header.state_root
+
+
+def test_restore_state(blockchain):
+    currentPath = pathlib.Path().resolve()
+    genesis_wallet = Wallet()
+    genesis_wallet.from_key(f"{currentPath}/beez/keys/genesisPrivateKey.pem")
+    exchange_tx = genesis_wallet.create_transaction(
+        "alice", 100, TransactionType.EXCHANGE.name
+    )
+    blockchain.mint_block([exchange_tx], genesis_wallet)
+    # only the deltas of the block are written between snapshots
+    assert blockchain.storage.state_store.delta_count == 1
+
+    restarted = Blockchain()
+    restarted.load_from_index()
+    assert restarted.block_count == 1
+    assert restarted.account_state_model.get_balance("alice") == 100
+
+    # without a stored state the chain is replayed from the genesis snapshot
+    restarted.storage.state_store.clear()
+    assert not restarted._restore_state()
+    assert restarted.account_state_model.get_balance("alice") == 100
+    assert restarted.storage.state_store.load()["height"] == 1
+
+
+def test_restore_state_from_snapshot(blockchain):
+    currentPath = pathlib.Path().resolve()
+    genesis_wallet = Wallet()
+    genesis_wallet.from_key(f"{currentPath}/beez/keys/genesisPrivateKey.pem")
+    genesis_address = BeezUtils.address_from_public_key(genesis_wallet.public_key_string())
+    blockchain.storage.snapshot_store.interval = 2
+    for amount in (10, 20, 30):
+        blockchain.mint_block(
+            [genesis_wallet.create_transaction("alice", amount, TransactionType.EXCHANGE.name)],
+            genesis_wallet,
+        )
+    assert blockchain.storage.snapshot_store.heights() == [0, 2]
+    assert blockchain.storage.latest_snapshot(blockchain.block_store)["tipHash"] == blockchain.block_store.get_by_height(2).hash()
+    assert blockchain.storage.latest_snapshot(blockchain.block_store)["balances"]["alice"] == 30
+
+    blockchain.storage.state_store.clear()
+    blockchain.pos.restore({})
+    assert not blockchain._restore_state()
+    assert blockchain.account_state_model.get_balance("alice") == 60
+    assert blockchain.account_state_model.get_balance(genesis_address) == -60
+    assert blockchain.pos.get(blockchain.genesis_public_key) >= 1
 
 
 def test_get_covered_transactionset(blockchain):
@@ -408,3 +508,195 @@ def test_transaction_valid(blockchain):
         blockchain.transaction_valid([exchange_tx, exchange_tx_2, transfer_tx]) == False
     )
     assert blockchain.transaction_valid([exchange_tx, exchange_tx_2]) == True
+
+
+def test_validate_transactions(blockchain):
+    currentPath = pathlib.Path().resolve()
+    genesis_wallet = Wallet()
+    genesis_wallet.from_key(f"{currentPath}/beez/keys/genesisPrivateKey.pem")
+    alice_wallet = Wallet()
+    alice_wallet.from_key(f"{currentPath}/beez/keys/alicePrivateKey.pem")
+    alice_address = BeezUtils.address_from_public_key(alice_wallet.public_key_string())
+
+    exchange_tx = genesis_wallet.create_transaction(
+        alice_address, 100, TransactionType.EXCHANGE.name
+    )
+    transfer_tx = alice_wallet.create_transaction(
+        "bob", 60, TransactionType.TRANSFER.name
+    )
+    double_spend_tx = alice_wallet.create_transaction(
+        "carol", 60, TransactionType.TRANSFER.name
+    )
+
+    assert blockchain._validate_transactions(
+        [exchange_tx, transfer_tx, transfer_tx, double_spend_tx]
+    ) == [True, True, False, False]
+    assert blockchain.transaction_valid([exchange_tx, transfer_tx]) == True
+    assert blockchain.transaction_valid([transfer_tx, exchange_tx]) == False
+    assert blockchain.account_state_model.get_balance(alice_address) == 0
+    assert blockchain.account_state_model.journal == []
+
+
+def test_balance_at(blockchain):
+    currentPath = pathlib.Path().resolve()
+    genesis_wallet = Wallet()
+    genesis_wallet.from_key(f"{currentPath}/beez/keys/genesisPrivateKey.pem")
+    blockchain.mint_block(
+        [genesis_wallet.create_transaction("alice", 100, TransactionType.EXCHANGE.name)],
+        genesis_wallet,
+    )
+    blockchain.mint_block(
+        [genesis_wallet.create_transaction("alice", 50, TransactionType.EXCHANGE.name)],
+        genesis_wallet,
+    )
+
+    assert blockchain.block_store.balance_at("alice", 0) == 0
+    assert blockchain.block_store.balance_at("alice", 1) == 100
+    assert blockchain.block_store.balance_at("alice", 2) == 150
+    assert blockchain.block_store.balance_at("alice", 3) is None
+
+    # the history is rebuilt from the block headers on the first lookup after a restart
+    restarted = Blockchain()
+    restarted.load_from_index()
+    assert restarted.block_store.get_by_height(1).raw_header is not None
+    assert restarted.block_store.balance_at("alice", 1) == 100
+    assert restarted.block_store.get_by_height(1).raw_header is None
+    assert restarted.block_store.balance_at("alice", 2) == 150
+
+
+def test_replay_blocks(blockchain):
+    currentPath = pathlib.Path().resolve()
+    genesis_wallet = Wallet()
+    genesis_wallet.from_key(f"{currentPath}/beez/keys/genesisPrivateKey.pem")
+    alice_wallet = Wallet()
+    alice_wallet.from_key(f"{currentPath}/beez/keys/alicePrivateKey.pem")
+    alice_address = BeezUtils.address_from_public_key(alice_wallet.public_key_string())
+    exchange_tx = genesis_wallet.create_transaction(
+        alice_address, 100, TransactionType.EXCHANGE.name
+    )
+    stake_tx = alice_wallet.create_transaction(
+        alice_address, 60, TransactionType.STAKE.name
+    )
+    new_block = Block(None, [exchange_tx, stake_tx, stake_tx], "last hash", "forger", 1)
+
+    assert blockchain._replay_blocks([new_block]) == [(1, 2)]
+    assert blockchain.account_state_model.get_balance(alice_address) == -20
+    assert blockchain.pos.get(alice_address) == 120
+
+
+def test_append_blocks(blockchain):
+    currentPath = pathlib.Path().resolve()
+    genesis_wallet = Wallet()
+    genesis_wallet.from_key(f"{currentPath}/beez/keys/genesisPrivateKey.pem")
+    peer_blockchain = Blockchain(index=False)
+    new_block = peer_blockchain.mint_block(
+        [genesis_wallet.create_transaction("alice", 100, TransactionType.EXCHANGE.name)],
+        genesis_wallet,
+    )
+    # a peer can't make the chain adopt balances its transactions don't produce
+    peer_blockchain.account_state_model.update_balance("mallory", 1000)
+    forged_block = Block.deserialize(new_block.serialize())
+    forged_block.header = Header(
+        state_root(peer_blockchain.account_state_model, peer_blockchain.beez_keeper),
+        {"alice": 100, "mallory": 1000},
+    )
+
+    assert blockchain.append_blocks([forged_block]) is False
+    assert len(blockchain.blocks()) == 1
+    assert blockchain.account_state_model.balances() == {}
+    assert blockchain.account_state_model.journal == []
+
+    assert blockchain.append_blocks([new_block]) is True
+    assert blockchain.block_count == 1
+    assert blockchain.account_state_model.get_balance("alice") == 100
+    assert blockchain.account_state_model.get_balance("mallory") == 0
+    assert blockchain.storage.state_store.load()["stateRoot"] == new_block.header.state_root
+
+
+def test_import_block_index():
+    currentPath = pathlib.Path().resolve()
+    genesis_wallet = Wallet()
+    genesis_wallet.from_key(f"{currentPath}/beez/keys/genesisPrivateKey.pem")
+    peer_blockchain = Blockchain(index=False)
+    peer_blockchain.mint_block(
+        [genesis_wallet.create_transaction("alice", 100, TransactionType.EXCHANGE.name)],
+        genesis_wallet,
+    )
+    # blocks as the block index kept them before the block log
+    schema = Schema(
+        id=ID(stored=True),
+        type=KEYWORD(stored=True),
+        block_serialized=TEXT(stored=True),
+    )
+    blocks_index = BlockIndexEngine(schema, backend="whoosh", buffer_size=0)
+    blocks_index.index_documents(
+        [
+            {"id": str(block.block_count), "type": "BL", "block_serialized": str(block.serialize())}
+            for block in peer_blockchain.blocks()
+        ]
+    )
+    blocks_index.close()
+
+    blockchain = Blockchain()
+    blockchain.load_from_index()
+    assert blockchain.block_count == 1
+    assert blockchain.block_store.tip_hash() == peer_blockchain.block_store.tip_hash()
+    assert blockchain.account_state_model.get_balance("alice") == 100
+    # the log is not empty anymore, a restart doesn't import again
+    assert Blockchain().storage.import_block_index() == 0
+    assert len(blockchain.storage.block_log) == 2
+    remove_blockchain()
+
+
+def test_append_blocks_checks_every_header(blockchain):
+    currentPath = pathlib.Path().resolve()
+    genesis_wallet = Wallet()
+    genesis_wallet.from_key(f"{currentPath}/beez/keys/genesisPrivateKey.pem")
+    peer_blockchain = Blockchain(index=False)
+    for amount in (10, 20):
+        peer_blockchain.mint_block(
+            [genesis_wallet.create_transaction("alice", amount, TransactionType.EXCHANGE.name)],
+            genesis_wallet,
+        )
+    blocks = [Block.deserialize(block.serialize()) for block in peer_blockchain.blocks()[1:]]
+    # the intermediate header is rewritten in transit, the last one is genuine
+    blocks[0].header = Header(blocks[0].header.state_root, {"alice": 10, "mallory": 10**6})
+    assert blockchain.append_blocks(blocks) is False
+    assert blockchain.block_count == 0
+
+    blocks[0] = Block.deserialize(peer_blockchain.blocks()[1].serialize())
+    blocks[1].header = Header(blocks[1].header.state_root, {"alice": 20, "mallory": 10**6})
+    assert blockchain.append_blocks(blocks) is False
+    assert blockchain.account_state_model.balances() == {}
+
+    assert blockchain.append_blocks(peer_blockchain.blocks()[1:]) is True
+    assert blockchain.block_count == 2
+    assert blockchain.account_state_model.get_balance("alice") == 30
+    assert blockchain.account_state_model.get_balance("mallory") == 0
+
+
+def test_restore_state_after_crash_before_state_write(blockchain, monkeypatch):
+    currentPath = pathlib.Path().resolve()
+    genesis_wallet = Wallet()
+    genesis_wallet.from_key(f"{currentPath}/beez/keys/genesisPrivateKey.pem")
+    alice_wallet = Wallet()
+    alice_wallet.from_key(f"{currentPath}/beez/keys/alicePrivateKey.pem")
+    alice_address = BeezUtils.address_from_public_key(alice_wallet.public_key_string())
+    blockchain.mint_block(
+        [genesis_wallet.create_transaction(alice_address, 100, TransactionType.EXCHANGE.name)],
+        genesis_wallet,
+    )
+    # the block and its stakes are written, the node stops before the state
+    monkeypatch.setattr(blockchain, "_save_state", lambda *args: None)
+    blockchain.mint_block(
+        [alice_wallet.create_transaction(alice_address, 40, TransactionType.STAKE.name)],
+        genesis_wallet,
+    )
+    assert blockchain.storage.state_store.load()["height"] == 1
+
+    restarted = Blockchain()
+    restarted.load_from_index()
+    assert restarted.block_count == 2
+    assert restarted.account_state_model.get_balance(alice_address) == 60
+    assert restarted.pos.get(alice_address) == 40
+    assert restarted.storage.state_store.load()["height"] == 2
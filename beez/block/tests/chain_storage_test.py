@@ -0,0 +1,34 @@
+# pylint: skip-file
+import shutil
+from beez.block.block import Block
+from beez.block.block_store import BlockStore
+from beez.block.chain_storage import ChainStorage
+
+
+def clear_indices():
+    shutil.rmtree("blocks_indices", ignore_errors=True)
+    shutil.rmtree("state_indices", ignore_errors=True)
+    shutil.rmtree("snapshots_indices", ignore_errors=True)
+
+
+def test_storage_without_stores():
+    storage = ChainStorage()
+    assert storage.import_block_index() == 0
+    assert storage.load_blocks() == []
+    assert storage.latest_snapshot(BlockStore([Block.genesis()])) is None
+    storage.clear()
+
+
+def test_latest_snapshot_matches_the_chain():
+    clear_indices()
+    storage = ChainStorage.open()
+    genesis = Block.genesis()
+    storage.block_log.append(genesis.serialize())
+    storage.snapshot_store.save({"height": 0, "tipHash": "other chain"})
+    block_store = BlockStore(storage.load_blocks())
+    assert storage.latest_snapshot(block_store) is None
+    storage.snapshot_store.save({"height": 0, "tipHash": genesis.hash()})
+    assert storage.latest_snapshot(block_store)["tipHash"] == genesis.hash()
+    storage.clear()
+    assert storage.load_blocks() == []
+    clear_indices()
@@ -4,6 +4,7 @@ import shutil
 from beez.block.block import Header
 from beez.challenge.beez_keeper import BeezKeeper
 from beez.state.account_state_model import AccountStateModel
+from beez.state.state_store import state_root
 
 def clear_indices():
     shutil.rmtree("account_indices", ignore_errors=True)
@@ -16,39 +17,48 @@ def clear_indices():
 def header():
     beez_keeper = BeezKeeper()
     account_state_model = AccountStateModel()
-    yield Header(beez_keeper, account_state_model)
+    account_state_model.update_balance("alice", 10)
+    yield Header.from_state(beez_keeper, account_state_model, {"alice": 10})
     clear_indices()
 
 def test_header_creation():
-    beez_keeper = BeezKeeper()
-    account_state_model = AccountStateModel()
-    local_header = Header(beez_keeper, account_state_model)
+    local_header = Header("root", {"alice": 10})
     assert local_header is not None
-    assert local_header.beez_keeper == beez_keeper
-    assert local_header.account_state_model == account_state_model
+    assert local_header.state_root == "root"
+    assert local_header.balance_deltas == {"alice": 10}
+
+def test_from_state(header):
+    account_state_model = AccountStateModel()
+    account_state_model.update_balance("alice", 10)
+    assert header.state_root == state_root(account_state_model, BeezKeeper())
+    assert header.state_root != state_root(AccountStateModel(), BeezKeeper())
+
+def test_state_root_ignores_zero_balances():
+    account_state_model = AccountStateModel()
+    account_state_model.get_balance("unknown")
+    assert state_root(account_state_model, BeezKeeper()) == state_root(
+        AccountStateModel(), BeezKeeper()
+    )
 
 def test_serialize(header):
-    expected_result = {
-        "beezKeeper": {},
-        "accountStateModel": {"accounts": [], "balances": {}}
-    }
+    expected_result = {"stateRoot": header.state_root, "balanceDeltas": {"alice": 10}}
     assert header.serialize() == expected_result
 
-def test_deserialize():
-    header = Header.deserialize({}, {"accounts": [], "balances": {}})
-    assert header.beez_keeper.challanges() == {}
-    assert header.account_state_model.accounts() == []
-    assert header.account_state_model.balances() == {}
+def test_deserialize(header):
+    local_header = Header.deserialize(header.serialize())
+    assert local_header.state_root == header.state_root
+    assert local_header.balance_deltas == {"alice": 10}
 
-def test_get_beez_keeper():
-    beez_keeper = BeezKeeper()
-    account_state_model = AccountStateModel()
-    local_header = Header(beez_keeper, account_state_model)
-    assert local_header.get_beez_keeper() == beez_keeper
+def test_deserialize_embedded_state(header):
+    local_header = Header.deserialize(
+        {"beezKeeper": {}, "accountStateModel": {"accounts": ["alice"], "balances": {"alice": 10}}}
+    )
+    assert local_header.state_root == header.state_root
+    assert local_header.balance_deltas == {}
 
-def test_get_account_state_model():
-    beez_keeper = BeezKeeper()
+def test_apply(header):
     account_state_model = AccountStateModel()
-    local_header = Header(beez_keeper, account_state_model)
-    assert local_header.get_account_state_model() == account_state_model
+    account_state_model.update_balance("alice", 5)
+    header.apply(account_state_model)
+    assert account_state_model.get_balance("alice") == 15
     clear_indices()
@@ -0,0 +1,43 @@
+# pylint: skip-file
+import pytest
+from beez.block.merkle_tree import (
+    EMPTY_MERKLE_ROOT,
+    merkle_proof,
+    merkle_root,
+    parent_hash,
+    transaction_hash,
+    verify_proof,
+)
+
+
+def leaves(count):
+    return [transaction_hash({"id": str(number)}) for number in range(count)]
+
+
+def test_empty_and_single_leaf():
+    assert merkle_root([]) == EMPTY_MERKLE_ROOT
+    assert merkle_root(leaves(1)) == leaves(1)[0]
+    assert merkle_proof(leaves(1), 0) == []
+
+
+def test_root_of_pairs():
+    first, second, third = leaves(3)
+    assert merkle_root([first, second]) == parent_hash(first, second)
+    # the odd node is promoted, not hashed with itself
+    assert merkle_root([first, second, third]) == parent_hash(parent_hash(first, second), third)
+
+
+@pytest.mark.parametrize("count", [1, 2, 3, 5, 8, 13])
+def test_every_proof_verifies(count):
+    tree_leaves = leaves(count)
+    root = merkle_root(tree_leaves)
+    for position, leaf in enumerate(tree_leaves):
+        proof = merkle_proof(tree_leaves, position)
+        assert len(proof) <= count.bit_length()
+        assert verify_proof(leaf, proof, root)
+
+
+def test_proof_rejects_other_leaf():
+    tree_leaves = leaves(4)
+    proof = merkle_proof(tree_leaves, 1)
+    assert not verify_proof(tree_leaves[2], proof, merkle_root(tree_leaves))
@@ -0,0 +1,95 @@
+# pylint: skip-file
+import time
+import shutil
+import pathlib
+import pytest
+from beez.block.block import Block
+from beez.block.blockchain import Blockchain
+from beez.block.pruner import Pruner
+from beez.wallet.wallet import Wallet
+from beez.transaction.transaction_type import TransactionType
+
+
+def clear_indices():
+    shutil.rmtree("blocks_indices", ignore_errors=True)
+    shutil.rmtree("pos_indices", ignore_errors=True)
+    shutil.rmtree("state_indices", ignore_errors=True)
+    shutil.rmtree("snapshots_indices", ignore_errors=True)
+
+
+def mint_blocks(blockchain):
+    blockchain.storage.snapshot_store.interval = 3
+    genesis_wallet = Wallet()
+    genesis_wallet.from_key(f"{pathlib.Path().resolve()}/beez/keys/genesisPrivateKey.pem")
+    for amount in range(1, 7):
+        blockchain.mint_block(
+            [genesis_wallet.create_transaction("alice", amount, TransactionType.EXCHANGE.name)],
+            genesis_wallet,
+        )
+    return blockchain
+
+
+@pytest.fixture
+def blockchain():
+    clear_indices()
+    yield mint_blocks(Blockchain())
+    clear_indices()
+
+
+def test_disabled_by_default(blockchain):
+    pruner = Pruner(blockchain)
+    assert not pruner.enabled()
+    assert pruner.prune_height() == -1
+    pruner.start()
+    assert not pruner.running()
+
+
+def test_keep_blocks_stops_at_snapshot(blockchain):
+    assert blockchain.storage.latest_snapshot(blockchain.block_store)["height"] == 6
+    assert Pruner(blockchain, keep_blocks=2).prune_height() == 4
+    blockchain.storage.snapshot_store.clear()
+    assert Pruner(blockchain, keep_blocks=2).prune_height() == -1
+
+
+def test_keep_days(blockchain):
+    assert Pruner(blockchain, keep_days=1).prune_height() == 0
+    for block in blockchain.blocks()[:4]:
+        block.timestamp = time.time() - 2 * 24 * 60 * 60
+    assert Pruner(blockchain, keep_days=1).prune_height() == 3
+    assert Pruner(blockchain, keep_blocks=5, keep_days=1).prune_height() == 1
+
+
+def test_run_once(blockchain):
+    block_hash = blockchain.block_store.get_by_height(4).hash()
+    transaction = blockchain.block_store.get_by_height(4).transactions[0]
+    transaction_id = transaction.identifier
+    pruner = Pruner(blockchain, keep_blocks=2)
+    assert pruner.run_once() == 4
+    assert blockchain.block_store.pruned_height == 4
+    assert blockchain.block_store.get_by_height(4).pruned
+    assert blockchain.block_store.locate_transaction(transaction_id) is None
+    assert blockchain.transaction_exist(transaction)
+    assert blockchain.block_store.tip_hash() == blockchain.block_store.get_by_height(6).hash()
+
+    # pruned bodies stay pruned across restarts
+    restarted = Blockchain()
+    restarted.load_from_index()
+    assert restarted.block_store.get_by_height(4).hash() == block_hash
+    assert restarted.account_state_model.get_balance("alice") == 21
+    # a replay of a pruned transaction is still recognised
+    assert restarted.transaction_exist(transaction)
+
+
+def test_rewrites_closed_segments():
+    clear_indices()
+    blockchain = Blockchain()
+    blockchain.storage.block_log.segment_bytes = 1
+    mint_blocks(blockchain)
+    assert len(blockchain.storage.block_log.segments) == 7
+    Pruner(blockchain, keep_blocks=2).run_once()
+    records = list(blockchain.storage.block_log)
+    assert records[4]["pruned"] and records[4]["transactions"] == []
+    assert "pruned" not in records[5]
+    restored = Block.deserialize(records[4])
+    assert restored.hash() == blockchain.block_store.get_by_height(4).hash()
+    clear_indices()
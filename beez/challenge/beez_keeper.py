@@ -28,10 +28,15 @@ class BeezKeeper:
     keeps track of each Challenge.
     Every time that a block is added to the Blockchain, the beezKeeper will update
     the challenge basedon the transactions accured.
+
+    Between begin() and commit() or rollback() the challenge replaced by every
+    append is journaled, so a rollback restores the challenges kept before.
     """
 
     def __init__(self):
         self.challenges: dict[str, Challenge] = {}
+        # per begin(): challenge id -> previous challenge, None if it was new
+        self.journal: list[dict[str, Optional[Challenge]]] = []
 
     def start(self):
         """Starting the beez keeper thread."""
@@ -69,8 +74,29 @@ class BeezKeeper:
 
     def append(self, identifier: str, challenge: Challenge):
         """Adds a new challenge."""
+        if self.journal and identifier not in self.journal[-1]:
+            self.journal[-1][identifier] = self.challenges.get(identifier)
         self.challenges[identifier] = challenge
 
+    def begin(self):
+        """Starts journaling the appended challenges."""
+        self.journal.append({})
+
+    def commit(self):
+        """Keeps the challenges appended since the matching begin()."""
+        previous_challenges = self.journal.pop()
+        if self.journal:
+            for identifier, challenge in previous_challenges.items():
+                self.journal[-1].setdefault(identifier, challenge)
+
+    def rollback(self):
+        """Restores the challenges kept at the matching begin()."""
+        for identifier, challenge in self.journal.pop().items():
+            if challenge is None:
+                del self.challenges[identifier]
+            else:
+                self.challenges[identifier] = challenge
+
     def status(self):
         """Logs status of beezkepper."""
         while True:
@@ -66,4 +66,22 @@ def test_update(beez_keeper):
     beez_keeper.append("id", challenge)
     challenge.reward = 100
     beez_keeper.update(challenge)
-    assert beez_keeper.get("id").reward == 100
\ No newline at end of file
+    assert beez_keeper.get("id").reward == 100
+
+
+def test_rollback(beez_keeper):
+    first = Challenge(sum, 100)
+    beez_keeper.append("test", first)
+    beez_keeper.begin()
+    beez_keeper.append("test", Challenge(sum, 200))
+    beez_keeper.append("other", Challenge(sum, 300))
+    beez_keeper.rollback()
+    assert beez_keeper.challanges() == {"test": first}
+
+def test_commit(beez_keeper):
+    beez_keeper.begin()
+    beez_keeper.begin()
+    beez_keeper.append("test", Challenge(sum, 100))
+    beez_keeper.commit()
+    beez_keeper.rollback()
+    assert beez_keeper.challanges() == {}
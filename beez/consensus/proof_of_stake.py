@@ -1,12 +1,15 @@
 """Beez blockchain - proof of stake."""
 from __future__ import annotations
-from typing import TYPE_CHECKING, List, Optional, cast
+from typing import TYPE_CHECKING, Iterator, List, Optional, cast
+from contextlib import contextmanager
 
 from whoosh.fields import Schema, TEXT, KEYWORD, ID, NUMERIC  # type: ignore
 from beez.consensus.lot import Lot
 from beez.beez_utils import BeezUtils
 from beez.keys.genesis_public_key import GenesisPublicKey
 from beez.index.index_engine import PosModelEngine
+from beez.index.memory_backend import MemoryBackend
+from beez.index.query import Term
 
 if TYPE_CHECKING:
     from beez.types import Stake, PublicKeyString
@@ -15,28 +18,38 @@ if TYPE_CHECKING:
 class ProofOfStake:
     """
     keeps track of the stakes of each account
+
+    Between begin() and commit() or rollback() stake updates go to an in-memory
+    overlay on top of the stake index, which is only written on the outermost
+    commit. Overlays nest.
     """
 
-    def __init__(self, add_genesis=True):
-        self.stake_index = PosModelEngine.get_engine(
-            Schema(
-                id=ID(stored=True),
-                type=KEYWORD(stored=True),
-                account_id=TEXT(stored=True),
-                stake=NUMERIC(stored=True),
-            )
+    def __init__(self, add_genesis=True, index=True):
+        schema = Schema(
+            id=ID(stored=True),
+            type=KEYWORD(stored=True),
+            account_id=TEXT(stored=True),
+            stake=NUMERIC(stored=True),
         )
+        if index:
+            self.stake_index = PosModelEngine.get_engine(schema)
+        else:
+            # stakes of throwaway chains must not end up in the node's stake index
+            self.stake_index = PosModelEngine(schema, backend=MemoryBackend.name)
+        # per begin(): stake id -> (public key, stake)
+        self.journal: list[dict[str, tuple[str, int]]] = []
         if add_genesis:
             self.set_genesis_node_stake()
 
     def serialize(self):
         """Serialize the PoS object to json format."""
         stake_state = {}
-        stake_docs = self.stake_index.query(
-            query="STAKE", fields=["type"], highlight=True
-        )
+        stake_docs = self.stake_index.iter_query(Term("type", "STAKE"))
         for doc in stake_docs:
             stake_state[doc["account_id"]] = doc["stake"]
+        for overlay in self.journal:
+            for account_id, stake in overlay.values():
+                stake_state[account_id] = stake
         return stake_state
 
     def _deserialize(
@@ -49,10 +62,33 @@ class ProofOfStake:
     @staticmethod
     def deserialize(serialized_stakers, index=True):
         """Returns a new PoS object from a json serialization."""
-        pos = ProofOfStake(add_genesis=False)
+        pos = ProofOfStake(add_genesis=False, index=index)
         pos._deserialize(serialized_stakers, index)  # pylint: disable=protected-access
         return pos
 
+    def restore(self, serialized_stakers):
+        """Replaces all stakes with the serialized ones."""
+        self.stake_index.replace_documents(
+            "type",
+            "STAKE",
+            [
+                {
+                    "id": ProofOfStake.stake_id(staker),
+                    "type": "STAKE",
+                    "account_id": staker,
+                    "stake": stake,
+                }
+                for staker, stake in serialized_stakers.items()
+            ],
+        )
+
+    @staticmethod
+    def stake_id(public_key_string: PublicKeyString) -> str:
+        """Returns the id of the stake document of the given public key."""
+        return BeezUtils.hash(
+            public_key_string.replace("'", "").replace("\n", "")
+        ).hexdigest()
+
     def set_genesis_node_stake(self):
         """Sets the state of the genesis node."""
         genesis_public_key = GenesisPublicKey()
@@ -62,63 +98,98 @@ class ProofOfStake:
     def stakers(self) -> list[str]:
         """Returns the stakers public keys."""
         staker_public_keys = []
-        stake_docs = self.stake_index.query(
-            query="STAKE", fields=["type"], highlight=True
-        )
+        stake_docs = self.stake_index.iter_query(Term("type", "STAKE"))
         for doc in stake_docs:
             staker_public_keys.append(doc["account_id"])
+        if self.journal:
+            known = set(staker_public_keys)
+            for overlay in self.journal:
+                for account_id, _ in overlay.values():
+                    if account_id not in known:
+                        known.add(account_id)
+                        staker_public_keys.append(account_id)
         return staker_public_keys
 
     def update(
         self, public_key_string: PublicKeyString, stake: Stake
     ):
         """Updates the stake of the given public key by stake."""
-        key_id = BeezUtils.hash(
-            public_key_string.replace("'", "").replace("\n", "")
-        ).hexdigest()
-        if (
-            len(self.stake_index.query(query=key_id, fields=["id"], highlight=True))
-            == 0
-        ):
-            self.stake_index.index_documents(
-                [
-                    {
-                        "id": key_id,
-                        "type": "STAKE",
-                        "account_id": public_key_string,
-                        "stake": stake,
-                    }
-                ]
-            )
-        else:
-            old_stake = self.get(public_key_string)
-            self.stake_index.delete_document("id", key_id)
-            self.stake_index.index_documents(
-                [
-                    {
-                        "id": key_id,
-                        "type": "STAKE",
-                        "account_id": public_key_string,
-                        "stake": old_stake + stake,
-                    }
-                ]
+        if self.journal:
+            self.journal[-1][ProofOfStake.stake_id(public_key_string)] = (
+                public_key_string,
+                self.get(public_key_string) + stake,
             )
+            return
+        key_id = ProofOfStake.stake_id(public_key_string)
+        with self.stake_index.batch():
+            if self.stake_index.count(Term("id", key_id), limit=1) == 0:
+                self.stake_index.index_documents(
+                    [
+                        {
+                            "id": key_id,
+                            "type": "STAKE",
+                            "account_id": public_key_string,
+                            "stake": stake,
+                        }
+                    ]
+                )
+            else:
+                old_stake = self.get(public_key_string)
+                self.stake_index.replace_documents(
+                    "id",
+                    key_id,
+                    [
+                        {
+                            "id": key_id,
+                            "type": "STAKE",
+                            "account_id": public_key_string,
+                            "stake": old_stake + stake,
+                        }
+                    ]
+                )
 
     def get(self, identifier) -> "Stake":
         """Returns the stake of the given public key."""
-        key_id = BeezUtils.hash(
-            identifier.replace("'", "").replace("\n", "")
-        ).hexdigest()
-        if len(self.stake_index.query(query=key_id, fields=["id"], highlight=True)) == 0:
-            self.update(id, 0)
-        return cast(
-            "Stake",
-            int(
-                self.stake_index.query(query=key_id, fields=["id"], highlight=True)[
-                    0
-                ]["stake"]
-            ),
-        )
+        key_id = ProofOfStake.stake_id(identifier)
+        for overlay in reversed(self.journal):
+            if key_id in overlay:
+                return cast("Stake", overlay[key_id][1])
+        for doc in self.stake_index.iter_query(Term("id", key_id), limit=1):
+            return cast("Stake", int(doc["stake"]))
+        if self.journal:
+            self.journal[-1][key_id] = (identifier, 0)
+            return cast("Stake", 0)
+        self.update(identifier, 0)
+        return cast("Stake", 0)
+
+    def begin(self):
+        """Starts collecting stake updates in a new overlay."""
+        self.journal.append({})
+
+    def commit(self):
+        """Keeps the stake updates since the matching begin()."""
+        overlay = self.journal.pop()
+        if self.journal:
+            self.journal[-1].update(overlay)
+            return
+        with self.stake_index.batch():
+            for account_id, stake in overlay.values():
+                self.update(account_id, stake - self.get(account_id))
+
+    def rollback(self):
+        """Drops the stake updates since the matching begin()."""
+        self.journal.pop()
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """Commits the stake writes of the block at once, together with the writes
+        of the other engines sharing the node store."""
+        with self.stake_index.batch():
+            yield
+
+    def flush(self):
+        """Commits the buffered stake updates of the stake index."""
+        self.stake_index.flush()
 
     def validator_lots(self, seed: str) -> List[Lot]:
         "Returns the lots of all validators."
@@ -8,6 +8,8 @@ from beez.wallet.wallet import Wallet
 from beez.block.blockchain import Blockchain
 from beez.keys.genesis_public_key import GenesisPublicKey
 from beez.beez_utils import BeezUtils
+from beez.index.index_engine import PosModelEngine
+from beez.index.node_store import NodeStore
 
 def clear_indices():
     shutil.rmtree("account_indices", ignore_errors=True)
@@ -76,4 +78,54 @@ def test_winner_lot(pos):
 def test_forger(pos):
     blockchain = Blockchain()
     last_block_hash = BeezUtils.hash(blockchain.blocks()[-1].payload()).hexdigest()
-    assert pos.forger(last_block_hash) == GenesisPublicKey().pub_key
\ No newline at end of file
+    assert pos.forger(last_block_hash) == GenesisPublicKey().pub_key
+
+def test_restore(pos):
+    pos.update("alice", 5)
+    pos.restore({"bob": 3})
+    assert pos.serialize() == {"bob": 3}
+    assert pos.get("bob") == 3
+    assert pos.get("alice") == 0
+
+def test_rollback(pos):
+    pos.begin()
+    pos.update("alice", 5)
+    pos.update(GenesisPublicKey().pub_key, 2)
+    assert pos.get("alice") == 5
+    assert pos.get(GenesisPublicKey().pub_key) == 3
+    assert sorted(pos.stakers()) == sorted(["alice", GenesisPublicKey().pub_key])
+    pos.rollback()
+    assert pos.serialize() == {GenesisPublicKey().pub_key: 1}
+
+def test_commit(pos):
+    pos.begin()
+    pos.update("alice", 5)
+    pos.begin()
+    pos.update("alice", 2)
+    pos.commit()
+    assert pos.get("alice") == 7
+    pos.commit()
+    assert pos.journal == []
+    assert pos.serialize() == {GenesisPublicKey().pub_key: 1, "alice": 7}
+    pos.begin()
+    pos.begin()
+    pos.update("alice", 2)
+    pos.commit()
+    pos.rollback()
+    assert pos.get("alice") == 7
+
+def test_commit_writes_once():
+    shutil.rmtree("node_data", ignore_errors=True)
+    pos = ProofOfStake(add_genesis=False)
+    pos.stake_index = PosModelEngine(pos.stake_index.schema, backend="store", buffer_size=0)
+    store = NodeStore.open()
+    commits = store.commits
+    pos.begin()
+    pos.update("alice", 5)
+    pos.update("bob", 3)
+    pos.update("carol", 1)
+    pos.commit()
+    assert store.commits == commits + 1
+    assert pos.serialize() == {"alice": 5, "bob": 3, "carol": 1}
+    clear_indices()
+    shutil.rmtree("node_data", ignore_errors=True)
@@ -0,0 +1,126 @@
+"""Beez blockchain - bloom filters for existence checks."""
+
+from __future__ import annotations
+import os
+import math
+import struct
+import hashlib
+from typing import Optional
+
+# file header: number of layers, then per layer capacity, error rate, count and size
+FILE_HEADER = struct.Struct(">I")
+LAYER_HEADER = struct.Struct(">IdII")
+
+
+class BloomFilter:
+    """
+    Fixed size bloom filter.
+
+    Answers whether a key may have been added: a negative answer is certain,
+    a positive one is wrong with about error_rate probability as long as no
+    more than capacity keys were added.
+    """
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        self.capacity = max(capacity, 1)
+        self.error_rate = error_rate
+        self.size = max(
+            8, math.ceil(-self.capacity * math.log(error_rate) / (math.log(2) ** 2))
+        )
+        self.hash_count = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str) -> list[int]:
+        """Returns the bit positions of key, derived from one digest by double
+        hashing."""
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        first, second = struct.unpack(">QQ", digest)
+        return [(first + i * second) % self.size for i in range(self.hash_count)]
+
+    def add(self, key: str) -> None:
+        """Adds key to the filter."""
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+    def full(self) -> bool:
+        """Returns whether the filter holds as many keys as it was sized for."""
+        return self.count >= self.capacity
+
+
+class ScalableBloomFilter:
+    """
+    Bloom filter growing with the number of keys.
+
+    Once the current layer is full a layer of twice the capacity and half the
+    error rate is added, which keeps the overall false positive rate below twice
+    the initial error rate however many keys are added.
+    """
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.layers = [BloomFilter(capacity, error_rate)]
+
+    def add(self, key: str) -> None:
+        """Adds key to the filter."""
+        if self.layers[-1].full():
+            last = self.layers[-1]
+            self.layers.append(BloomFilter(last.capacity * 2, last.error_rate / 2))
+        self.layers[-1].add(key)
+
+    def __contains__(self, key: str) -> bool:
+        return any(key in layer for layer in self.layers)
+
+    def __len__(self) -> int:
+        return sum(layer.count for layer in self.layers)
+
+    def save(self, path: str) -> None:
+        """Atomically replaces the filter saved at path."""
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "wb") as filter_file:
+            filter_file.write(FILE_HEADER.pack(len(self.layers)))
+            for layer in self.layers:
+                filter_file.write(
+                    LAYER_HEADER.pack(
+                        layer.capacity, layer.error_rate, layer.count, len(layer.bits)
+                    )
+                )
+                filter_file.write(layer.bits)
+        os.replace(temporary_path, path)
+
+    @staticmethod
+    def load(path: str) -> Optional[ScalableBloomFilter]:
+        """Returns the filter saved at path, None if it is missing or damaged."""
+        try:
+            with open(path, "rb") as filter_file:
+                data = filter_file.read()
+            (layer_count,) = FILE_HEADER.unpack_from(data)
+            offset = FILE_HEADER.size
+            layers = []
+            for _ in range(layer_count):
+                capacity, error_rate, count, length = LAYER_HEADER.unpack_from(
+                    data, offset
+                )
+                offset += LAYER_HEADER.size
+                layer = BloomFilter(capacity, error_rate)
+                if length != len(layer.bits) or offset + length > len(data):
+                    return None
+                layer.bits = bytearray(data[offset : offset + length])
+                layer.count = count
+                offset += length
+                layers.append(layer)
+        except (OSError, struct.error):
+            return None
+        if not layers:
+            return None
+        bloom_filter = ScalableBloomFilter(layers[0].capacity, layers[0].error_rate)
+        bloom_filter.layers = layers
+        return bloom_filter
@@ -0,0 +1,136 @@
+"""Beez blockchain - background index compaction."""
+
+import os
+import time
+import threading
+from typing import Callable, Iterable, Optional
+from dotenv import load_dotenv
+from loguru import logger
+
+from beez.index.index_engine import Engine, singleton_engines
+from beez.periodic_worker import PeriodicWorker
+
+load_dotenv()  # load .env
+# seconds between two compaction runs, 0 disables the background compactor
+LOCAL_INDEX_COMPACTION_SECONDS = 60.0
+INDEX_COMPACTION_SECONDS = float(
+    os.getenv("INDEX_COMPACTION_SECONDS", str(LOCAL_INDEX_COMPACTION_SECONDS))
+)
+# number of segments above which an index gets merged
+LOCAL_INDEX_COMPACTION_MAX_SEGMENTS = 10
+INDEX_COMPACTION_MAX_SEGMENTS = int(
+    os.getenv("INDEX_COMPACTION_MAX_SEGMENTS", str(LOCAL_INDEX_COMPACTION_MAX_SEGMENTS))
+)
+# ratio of deleted docs above which an index gets merged
+LOCAL_INDEX_COMPACTION_MAX_DELETED_RATIO = 0.2
+INDEX_COMPACTION_MAX_DELETED_RATIO = float(
+    os.getenv(
+        "INDEX_COMPACTION_MAX_DELETED_RATIO",
+        str(LOCAL_INDEX_COMPACTION_MAX_DELETED_RATIO),
+    )
+)
+
+
+class Compactor(PeriodicWorker):  # pylint: disable=too-many-instance-attributes
+    """
+    Background compaction of the index engines.
+
+    A daemon thread periodically looks at the segment statistics of every engine
+    and merges the ones having too many segments or too many deleted docs. Engines
+    are merged in small steps that give way to writes, so neither reads nor the
+    writes of the consensus path wait for a whole merge.
+    """
+
+    compactor: Optional["Compactor"] = None
+
+    def __init__(
+        self,
+        engines: Callable[[], Iterable[Engine]] = singleton_engines,
+        interval: Optional[float] = None,
+        max_segments: Optional[int] = None,
+        max_deleted_ratio: Optional[float] = None,
+    ) -> None:
+        super().__init__(INDEX_COMPACTION_SECONDS if interval is None else interval)
+        self.engines = engines
+        self.max_segments = (
+            INDEX_COMPACTION_MAX_SEGMENTS if max_segments is None else max_segments
+        )
+        self.max_deleted_ratio = (
+            INDEX_COMPACTION_MAX_DELETED_RATIO
+            if max_deleted_ratio is None
+            else max_deleted_ratio
+        )
+        self.stats_lock = threading.Lock()
+        self.runs = 0
+        self.compactions = 0
+        self.last_run: Optional[float] = None
+        self.engine_stats: dict[str, dict] = {}
+
+    # Singleton
+    @staticmethod
+    def get_compactor() -> "Compactor":
+        """Returns the compactor of the node's singleton engines."""
+        if not Compactor.compactor:
+            Compactor.compactor = Compactor()
+        return Compactor.compactor
+
+    def needs_compaction(self, segment_stats: dict) -> bool:
+        """Returns whether the policy asks for merging an index with these stats."""
+        return (
+            segment_stats["segments"] > self.max_segments
+            or segment_stats["deleted_ratio"] > self.max_deleted_ratio
+        )
+
+    def run_once(self) -> int:
+        """Compacts the engines that need it and returns how many were compacted."""
+        compacted = 0
+        for engine in list(self.engines()):
+            if not engine.exists():
+                continue
+            try:
+                segment_stats = engine.segment_stats()
+                if not self.needs_compaction(segment_stats):
+                    self._record(engine, segment_stats, None)
+                    continue
+                start = time.perf_counter()
+                if engine.compact():
+                    compacted += 1
+                    self._record(
+                        engine, engine.segment_stats(), time.perf_counter() - start
+                    )
+            except Exception as error:  # pylint: disable=broad-except
+                # an index removed or locked meanwhile is retried on the next run
+                logger.warning(f"Compaction of {engine.index_name} failed: {error}")
+        with self.stats_lock:
+            self.runs += 1
+            self.compactions += compacted
+            self.last_run = time.time()
+        return compacted
+
+    def _record(
+        self, engine: Engine, segment_stats: dict, duration: Optional[float]
+    ) -> None:
+        """Stores the latest statistics of engine and the duration of its merge."""
+        with self.stats_lock:
+            previous = self.engine_stats.get(engine.index_name, {})
+            engine_stats = dict(segment_stats)
+            engine_stats["compactions"] = previous.get("compactions", 0)
+            engine_stats["last_duration"] = previous.get("last_duration")
+            if duration is not None:
+                engine_stats["compactions"] += 1
+                engine_stats["last_duration"] = duration
+            self.engine_stats[engine.index_name] = engine_stats
+
+    def stats(self) -> dict:
+        """Returns the compaction statistics."""
+        with self.stats_lock:
+            return {
+                "running": self.running(),
+                "runs": self.runs,
+                "compactions": self.compactions,
+                "last_run": self.last_run,
+                "engines": {
+                    name: dict(engine_stats)
+                    for name, engine_stats in self.engine_stats.items()
+                },
+            }
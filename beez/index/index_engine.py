@@ -1,114 +1,449 @@
 "Beez blockchain - index engines."
 
 import os
-import json
-from typing import Sequence, Optional
-from whoosh import index  # type: ignore
-from whoosh.fields import TEXT  # type: ignore
-from whoosh.qparser import MultifieldParser  # type: ignore
-from whoosh.filedb.filestore import FileStorage  # type: ignore
-
-
-class Engine:
-    """Engine base class."""
+import time
+import atexit
+import itertools
+import threading
+import weakref
+from contextlib import contextmanager
+from typing import Iterator, Sequence, Optional, Union
+from dotenv import load_dotenv
+from loguru import logger
+
+from beez.index.storage_backend import StorageBackend, doc_matches, term_matches
+from beez.index.query import Query, Range
+from beez.index.bloom_filter import ScalableBloomFilter
+from beez.index.whoosh_backend import WhooshBackend
+from beez.index.sqlite_backend import SqliteBackend
+from beez.index.memory_backend import MemoryBackend
+from beez.index.store_backend import StoreBackend
+from beez.index.metrics import EngineMetrics
+
+load_dotenv()  # load .env
+LOCAL_INDEX_BACKEND = "whoosh"
+INDEX_BACKEND = os.getenv("INDEX_BACKEND", LOCAL_INDEX_BACKEND)
+# number of buffered writes that triggers a group commit, 0 commits every write
+LOCAL_INDEX_WRITE_BUFFER_SIZE = 0
+INDEX_WRITE_BUFFER_SIZE = int(
+    os.getenv("INDEX_WRITE_BUFFER_SIZE", str(LOCAL_INDEX_WRITE_BUFFER_SIZE))
+)
+# seconds after the first buffered write at which the buffer gets committed
+LOCAL_INDEX_WRITE_BUFFER_SECONDS = 1.0
+INDEX_WRITE_BUFFER_SECONDS = float(
+    os.getenv("INDEX_WRITE_BUFFER_SECONDS", str(LOCAL_INDEX_WRITE_BUFFER_SECONDS))
+)
+# 1 records latency and volume metrics of every engine operation
+LOCAL_INDEX_METRICS = 0
+INDEX_METRICS = bool(int(os.getenv("INDEX_METRICS", str(LOCAL_INDEX_METRICS))))
+# keys a bloom filter is sized for before it grows, and its false positive rate
+LOCAL_INDEX_FILTER_CAPACITY = 10000
+INDEX_FILTER_CAPACITY = int(
+    os.getenv("INDEX_FILTER_CAPACITY", str(LOCAL_INDEX_FILTER_CAPACITY))
+)
+LOCAL_INDEX_FILTER_ERROR_RATE = 0.01
+INDEX_FILTER_ERROR_RATE = float(
+    os.getenv("INDEX_FILTER_ERROR_RATE", str(LOCAL_INDEX_FILTER_ERROR_RATE))
+)
+
+BACKENDS: dict[str, type[StorageBackend]] = {
+    WhooshBackend.name: WhooshBackend,
+    SqliteBackend.name: SqliteBackend,
+    MemoryBackend.name: MemoryBackend,
+    StoreBackend.name: StoreBackend,
+}
+
+
+def open_backend(name: str, directory: str, index_name: str, schema) -> StorageBackend:
+    """Returns the storage backend registered under name."""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown index backend: {name}")
+    return BACKENDS[name](directory, index_name, schema)
+
+
+class Engine:  # pylint: disable=too-many-instance-attributes
+    """
+    Engine base class.
+
+    With a write buffer size greater than 0 the engine queues added and deleted
+    documents in memory and writes them to the backend with a single commit once
+    the buffer is full, the buffer delay elapsed or flush() is called. Queries see
+    the pending writes through an overlay on top of the committed documents.
+
+    With metrics enabled the engine records the latency and the number of docs of
+    its queries, counts, writes and backend commits.
+
+    Fields with an enabled filter keep a bloom filter over their values, so
+    lookups of values that were never indexed can be answered without a query.
+    """
+
+    directory = ""
+    index_name = ""
+
+    def __init__(
+        self,
+        schema=None,
+        backend: Optional[str] = None,
+        buffer_size: Optional[int] = None,
+        buffer_seconds: Optional[float] = None,
+        metrics: Optional[bool] = None,
+    ):
+        self.schema = schema
+        self.backend: Optional[StorageBackend] = None
+        if schema is not None:
+            self.backend = open_backend(
+                backend or INDEX_BACKEND, self.directory, self.index_name, schema
+            )
+        self.buffer_size = INDEX_WRITE_BUFFER_SIZE if buffer_size is None else buffer_size
+        self.buffer_seconds = (
+            INDEX_WRITE_BUFFER_SECONDS if buffer_seconds is None else buffer_seconds
+        )
+        self.write_lock = threading.RLock()
+        self.pending_deletes: list[tuple[str, str]] = []
+        self.pending_docs: list[dict] = []
+        self.flush_timer: Optional[threading.Timer] = None
+        self.filters: dict[str, ScalableBloomFilter] = {}
+        self.metrics: Optional[EngineMetrics] = None
+        if INDEX_METRICS if metrics is None else metrics:
+            self.metrics = EngineMetrics()
+        if self.buffered and self.backend is not None and self.backend.persistent:
+            # a weak reference lets engines that are dropped be collected
+            atexit.register(Engine._flush_at_exit, weakref.ref(self))
 
-    def __init__(self):
-        self.index = None
-        self.schema = None
+    @staticmethod
+    def _flush_at_exit(engine_ref: weakref.ref) -> None:
+        """Commits the buffered writes of the engine if it is still alive."""
+        engine = engine_ref()
+        if engine is not None:
+            engine.flush()
+
+    @property
+    def buffered(self) -> bool:
+        """Returns whether writes are buffered and group committed."""
+        return self.buffer_size > 0
+
+    def pending_writes(self) -> int:
+        """Returns the number of buffered writes that are not committed yet."""
+        return len(self.pending_deletes) + len(self.pending_docs)
+
+    def exists(self) -> bool:
+        """Returns whether the backing store of the engine still exists."""
+        return self.backend is not None and self.backend.exists()
+
+    @property
+    def generation(self) -> int:
+        """Returns the number of commits done through this engine."""
+        return self.backend.generation if self.backend is not None else 0
+
+    def close(self) -> None:
+        """Commits pending writes and releases the readers and connections held by
+        the engine."""
+        self.flush()
+        self.save_filters()
+        if self.backend is not None:
+            self.backend.close()
+
+    def flush(self) -> None:
+        """Commits all buffered writes with a single commit."""
+        with self.write_lock:
+            if self.flush_timer is not None:
+                self.flush_timer.cancel()
+                self.flush_timer = None
+            if self.pending_writes() == 0:
+                return
+            # a removed store is stale, get_engine replaces the engine in that case
+            if self.exists():
+                self._commit(self.pending_deletes, self.pending_docs)
+            else:
+                logger.warning(
+                    f"Dropped {self.pending_writes()} pending writes of "
+                    f"{self.index_name}, its store was removed"
+                )
+            self.pending_deletes = []
+            self.pending_docs = []
+
+    def _filter_path(self, field: str) -> Optional[str]:
+        """Returns the file the filter of field is saved to, None for backends that
+        do not persist anything."""
+        if not self.backend.persistent:
+            return None
+        # whoosh removes files named like its segments, <index name>_<id>.<ext>
+        return os.path.join(self.directory, f"{self.index_name}-{field}.bloom")
+
+    def enable_filter(
+        self,
+        field: str,
+        capacity: Optional[int] = None,
+        error_rate: Optional[float] = None,
+    ) -> None:
+        """Keeps a bloom filter over the values of field. The filter is saved with
+        every commit; a saved filter is reused if it covers as many docs as the
+        index holds, otherwise it is rebuilt from the indexed docs."""
+        with self.write_lock:
+            if field in self.filters:
+                return
+            self.flush()
+            path = self._filter_path(field)
+            bloom_filter = ScalableBloomFilter.load(path) if path else None
+            if bloom_filter is None or len(bloom_filter) != self.backend.count(
+                Range(field)
+            ):
+                bloom_filter = ScalableBloomFilter(
+                    INDEX_FILTER_CAPACITY if capacity is None else capacity,
+                    INDEX_FILTER_ERROR_RATE if error_rate is None else error_rate,
+                )
+                for doc in self.backend.iter_search(Range(field)):
+                    bloom_filter.add(str(doc[field]))
+            self.filters[field] = bloom_filter
+            self.save_filters()
+
+    def save_filters(self) -> None:
+        """Saves the filters of the engine next to its index."""
+        if not self.filters or not self.exists():
+            return
+        for field, bloom_filter in self.filters.items():
+            path = self._filter_path(field)
+            if path is not None:
+                os.makedirs(self.directory, exist_ok=True)
+                bloom_filter.save(path)
+
+    def may_contain(self, field: str, value) -> bool:
+        """Returns False if no doc whose field equals value was ever indexed, True
+        if there may be one. Fields without a filter always may contain value."""
+        bloom_filter = self.filters.get(field)
+        return bloom_filter is None or str(value) in bloom_filter
+
+    def _add_to_filters(self, docs: Sequence) -> None:
+        """Adds the values of the filtered fields of docs to their filters."""
+        for field, bloom_filter in self.filters.items():
+            for doc in docs:
+                if doc.get(field) is not None:
+                    bloom_filter.add(str(doc[field]))
+
+    def _commit(self, deletes: Sequence[tuple[str, str]], docs: Sequence) -> None:
+        """Writes deletes and docs to the backend with one commit and saves the
+        filters, so a saved filter never misses a committed value."""
+        if self.metrics is None:
+            self.backend.write_batch(deletes, docs)
+        else:
+            with self.metrics.timer("commit", len(docs)):
+                self.backend.write_batch(deletes, docs)
+        if docs:
+            self.save_filters()
+
+    @contextmanager
+    def _measure(self, operation: str, docs: int = 0) -> Iterator[None]:
+        """Records the block as one operation if metrics are enabled."""
+        if self.metrics is None:
+            yield
+            return
+        with self.metrics.timer(operation, docs):
+            yield
+
+    def _schedule_flush(self) -> None:
+        """Flushes a full buffer or arms the timer committing it after the delay.
+        Must be called while holding the write lock."""
+        if self.pending_writes() >= self.buffer_size:
+            self.flush()
+        elif self.flush_timer is None:
+            self.flush_timer = threading.Timer(self.buffer_seconds, self.flush)
+            self.flush_timer.daemon = True
+            self.flush_timer.start()
 
     def index_documents(self, docs: Sequence) -> None:
         """Adds docs to index."""
-        writer = self.index.writer()
-        for doc in docs:
-            data = {
-                key: value
-                for key, value in doc.items()
-                if key in self.schema.stored_names()
-            }
-            data["raw"] = json.dumps(doc)  # raw version of all of doc
-            writer.add_document(**data)
-        writer.commit()
+        with self._measure("index", len(docs)):
+            if self.filters:
+                self._add_to_filters(docs)
+            if not self.buffered:
+                self._commit([], docs)
+                return
+            with self.write_lock:
+                self.pending_docs.extend(docs)
+                self._schedule_flush()
+
+    def replace_documents(self, field: str, term: str, docs: Sequence) -> None:
+        """Deletes the docs whose field equals term and adds docs with one commit."""
+        with self._measure("replace", len(docs)):
+            if self.filters:
+                self._add_to_filters(docs)
+            if not self.buffered:
+                self._commit([(field, term)], docs)
+                return
+            with self.write_lock:
+                self.pending_docs = [
+                    doc
+                    for doc in self.pending_docs
+                    if not term_matches(doc, field, term)
+                ]
+                self.pending_deletes.append((field, term))
+                self.pending_docs.extend(docs)
+                self._schedule_flush()
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """Commits the writes of the block at once. With the node store backend this
+        covers the writes of every engine sharing the store."""
+        with self.backend.batch():
+            yield
 
     def get_index_size(self) -> int:
         """Returns number of docs in index."""
-        return self.index.doc_count_all()
+        self.flush()
+        return self.backend.doc_count()
 
-    def delete_document(self, field: str, term: str) -> None:
-        """Deletes a document from index."""
-        writer = self.index.writer()
-        writer.delete_by_term(field, term)
-        writer.commit()
-
-    def query(self, query: str, fields: Sequence, highlight: bool = True) -> list[dict]:
-        """Query index and returns docs matching query."""
-        search_results = []
-        with self.index.searcher() as searcher:
-            results = searcher.search(
-                MultifieldParser(fields, schema=self.schema).parse(query), limit=10000000
-            )
-            for result in results:
-                raw_data = json.loads(result["raw"])
-                if highlight:
-                    for field in fields:
-                        if result[field] and isinstance(result[field], str):
-                            raw_data[field] = result.highlights(field) or result[field]
+    def segment_stats(self) -> dict:
+        """Returns the segment statistics of the backend."""
+        return self.backend.segment_stats()
 
-                search_results.append(raw_data)
+    def compact(self) -> bool:
+        """Merges the segments of the backend and purges deleted docs, returns
+        whether the backend compacted anything."""
+        if not self.exists():
+            return False
+        return self.backend.compact()
 
-        return search_results
+    def delete_document(self, field: str, term: str) -> None:
+        """Deletes a document from index."""
+        with self._measure("delete"):
+            if not self.buffered:
+                self._commit([(field, term)], [])
+                return
+            with self.write_lock:
+                # pending docs are not visible to the backend's delete, drop them here
+                self.pending_docs = [
+                    doc
+                    for doc in self.pending_docs
+                    if not term_matches(doc, field, term)
+                ]
+                self.pending_deletes.append((field, term))
+                self._schedule_flush()
+
+    def query(
+        self, query: Union[str, Query], fields: Sequence = (), highlight: bool = True
+    ) -> list[dict]:
+        """Query index and returns docs matching query. Structured queries skip the
+        query parser and, like queries while writes are pending, highlighting."""
+        if isinstance(query, Query):
+            return list(self.iter_query(query))
+        if self.metrics is None:
+            return self._search(query, fields, highlight)
+        start = time.perf_counter()
+        docs = self._search(query, fields, highlight)
+        self.metrics.record("query", time.perf_counter() - start, len(docs))
+        return docs
+
+    def _search(self, query: str, fields: Sequence, highlight: bool) -> list[dict]:
+        """Returns the docs matching the query string, including pending writes."""
+        if not self.buffered:
+            return self.backend.search(query, fields, highlight)
+        with self.write_lock:
+            if self.pending_writes() == 0:
+                return self.backend.search(query, fields, highlight)
+            return list(self._overlay(query, fields))
+
+    def iter_query(
+        self,
+        query: Union[str, Query],
+        fields: Sequence = (),
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> Iterator[dict]:
+        """Returns an iterator over the docs matching query, skipping the first offset
+        docs and stopping after limit docs. Docs are decoded while iterating."""
+        docs = self._iter_search(query, fields, offset, limit)
+        if self.metrics is None:
+            return docs
+        return self.metrics.iterate("query", docs)
+
+    def _iter_search(
+        self,
+        query: Union[str, Query],
+        fields: Sequence,
+        offset: int,
+        limit: Optional[int],
+    ) -> Iterator[dict]:
+        """Returns an iterator over the matching docs, including pending writes."""
+        if self.buffered:
+            with self.write_lock:
+                if self.pending_writes() > 0:
+                    stop = None if limit is None else offset + limit
+                    return iter(
+                        list(itertools.islice(self._overlay(query, fields), offset, stop))
+                    )
+        return iter(self.backend.iter_search(query, fields, offset, limit))
+
+    def count(
+        self, query: Union[str, Query], fields: Sequence = (), limit: Optional[int] = None
+    ) -> int:
+        """Returns the number of docs matching query, counting at most limit docs."""
+        with self._measure("count"):
+            return self._count(query, fields, limit)
+
+    def _count(
+        self, query: Union[str, Query], fields: Sequence, limit: Optional[int]
+    ) -> int:
+        """Returns the number of matching docs, including pending writes."""
+        if self.buffered:
+            with self.write_lock:
+                if self.pending_writes() > 0:
+                    return sum(
+                        1 for _ in itertools.islice(self._overlay(query, fields), limit)
+                    )
+        return self.backend.count(query, fields, limit)
+
+    def _overlay(self, query: Union[str, Query], fields: Sequence) -> Iterator[dict]:
+        """Yields the committed docs matching query that are not deleted by a pending
+        write, followed by the matching pending docs. Must be consumed while holding
+        the write lock."""
+        for doc in self.backend.iter_search(query, fields):
+            if not any(
+                term_matches(doc, field, term) for field, term in self.pending_deletes
+            ):
+                yield doc
+        for doc in self.pending_docs:
+            if doc_matches(doc, query, fields):
+                yield doc
 
     def query_at(
-        self, query: str, fields: Sequence, highlight: bool = True, idx: int = 0
+        self,
+        query: Union[str, Query],
+        fields: Sequence = (),
+        highlight: bool = False,
+        idx: int = 0,
     ) -> dict:
-        """Returns the document at index from all docs matching the query."""
-        return self.query(query, fields, highlight)[idx]
+        """Returns the document at index from all docs matching the query. Only
+        highlighting and negative indices collect all matching docs, otherwise the
+        docs are streamed up to the one at index."""
+        if idx < 0 or (highlight and not isinstance(query, Query)):
+            return self.query(query, fields, highlight)[idx]
+        for doc in self.iter_query(query, fields, offset=idx, limit=1):
+            return doc
+        raise IndexError("query result index out of range")
 
 
 class TxIndexEngine(Engine):
     """Transaction index engine."""
 
-    engine = None
-
-    def __init__(self, schema):
-        super().__init__()
-        self.schema = schema
-        schema.add("raw", TEXT(stored=True))
-        if not os.path.isdir("indices"):
-            os.makedirs("indices", exist_ok=True)
-            self.index = FileStorage("indices").create_index(
-                self.schema, indexname="transactions_index"
-            )
-        else:
-            self.index = FileStorage("indices").open_index("transactions_index")
-        TxIndexEngine.engine = self
+    engine: Optional[Engine] = None
+    directory = "indices"
+    index_name = "transactions_index"
 
     # Singleton
     @staticmethod
     def get_engine(schema, force_new: bool = False):
         """Returns an engine for the given schema."""
-        if not TxIndexEngine.engine or force_new or not index.exists_in("indices"):
-            new_engine = TxIndexEngine(schema)
-            TxIndexEngine.engine = new_engine
+        if not TxIndexEngine.engine or force_new or not TxIndexEngine.engine.exists():
+            TxIndexEngine.engine = TxIndexEngine(schema)
         return TxIndexEngine.engine
 
 
 class BlockIndexEngine(Engine):
     """Index engine for block index."""
 
-    engine = None
-
-    def __init__(self, schema):
-        super().__init__()
-        self.schema = schema
-        schema.add("raw", TEXT(stored=True))
-        if not os.path.isdir("blocks_indices"):
-            os.makedirs("blocks_indices", exist_ok=True)
-            self.index = FileStorage("blocks_indices").create_index(
-                self.schema, indexname="blocks_index"
-            )
-        else:
-            self.index = FileStorage("blocks_indices").open_index("blocks_index")
-        BlockIndexEngine.engine = self
+    engine: Optional[Engine] = None
+    directory = "blocks_indices"
+    index_name = "blocks_index"
 
     # Singleton
     @staticmethod
@@ -117,58 +452,34 @@ class BlockIndexEngine(Engine):
         if (
             not BlockIndexEngine.engine
             or force_new
-            or not index.exists_in("blocks_indices")
+            or not BlockIndexEngine.engine.exists()
         ):
-            new_engine = BlockIndexEngine(schema)
-            BlockIndexEngine.engine = new_engine
+            BlockIndexEngine.engine = BlockIndexEngine(schema)
         return BlockIndexEngine.engine
 
 
 class TxpIndexEngine(Engine):
     """Index engine for transaction pool model."""
 
-    engine = None
-
-    def __init__(self, schema):
-        super().__init__()
-        self.schema = schema
-        schema.add("raw", TEXT(stored=True))
-        if not os.path.isdir("txp_indices"):
-            os.makedirs("txp_indices", exist_ok=True)
-            self.index = FileStorage("txp_indices").create_index(
-                self.schema, indexname="txp_index"
-            )
-        else:
-            self.index = FileStorage("txp_indices").open_index("txp_index")
-        TxpIndexEngine.engine = self
+    engine: Optional[Engine] = None
+    directory = "txp_indices"
+    index_name = "txp_index"
 
     # Singleton
     @staticmethod
     def get_engine(schema, force_new: bool = False):
         """Returns an engine for the given schema."""
-        if not TxpIndexEngine.engine or force_new or not index.exists_in("txp_indices"):
-            new_engine = TxpIndexEngine(schema)
-            TxpIndexEngine.engine = new_engine
+        if not TxpIndexEngine.engine or force_new or not TxpIndexEngine.engine.exists():
+            TxpIndexEngine.engine = TxpIndexEngine(schema)
         return TxpIndexEngine.engine
 
 
 class AccountModelEngine(Engine):
     """Index engine for account model."""
 
-    engine = None
-
-    def __init__(self, schema):
-        super().__init__()
-        self.schema = schema
-        schema.add("raw", TEXT(stored=True))
-        if not os.path.isdir("account_indices"):
-            os.makedirs("account_indices", exist_ok=True)
-            self.index = FileStorage("account_indices").create_index(
-                self.schema, indexname="account_index"
-            )
-        else:
-            self.index = FileStorage("account_indices").open_index("account_index")
-        AccountModelEngine.engine = self
+    engine: Optional[Engine] = None
+    directory = "account_indices"
+    index_name = "account_index"
 
     # Singleton
     @staticmethod
@@ -177,30 +488,18 @@ class AccountModelEngine(Engine):
         if (
             not AccountModelEngine.engine
             or force_new
-            or not index.exists_in("account_indices")
+            or not AccountModelEngine.engine.exists()
         ):
-            new_engine = AccountModelEngine(schema)
-            AccountModelEngine.engine = new_engine
+            AccountModelEngine.engine = AccountModelEngine(schema)
         return AccountModelEngine.engine
 
 
 class BalancesModelEngine(Engine):
     """Index engine for balance model."""
 
-    engine = None
-
-    def __init__(self, schema):
-        super().__init__()
-        self.schema = schema
-        schema.add("raw", TEXT(stored=True))
-        if not os.path.isdir("balance_indices"):
-            os.makedirs("balance_indices", exist_ok=True)
-            self.index = FileStorage("balance_indices").create_index(
-                self.schema, indexname="balance_index"
-            )
-        else:
-            self.index = FileStorage("balance_indices").open_index("balance_index")
-        BalancesModelEngine.engine = self
+    engine: Optional[Engine] = None
+    directory = "balance_indices"
+    index_name = "balance_index"
 
     # Singleton
     @staticmethod
@@ -209,10 +508,9 @@ class BalancesModelEngine(Engine):
         if (
             not BalancesModelEngine.engine
             or force_new
-            or not index.exists_in("balance_indices")
+            or not BalancesModelEngine.engine.exists()
         ):
-            new_engine = BalancesModelEngine(schema)
-            BalancesModelEngine.engine = new_engine
+            BalancesModelEngine.engine = BalancesModelEngine(schema)
         return BalancesModelEngine.engine
 
 
@@ -220,47 +518,24 @@ class PosModelEngine(Engine):
     """Index engine for PoS model."""
 
     engine: Optional[Engine] = None
-
-    def __init__(self, schema):
-        super().__init__()
-        self.schema = schema
-        schema.add("raw", TEXT(stored=True))
-        if not os.path.isdir("pos_indices"):
-            os.makedirs("pos_indices", exist_ok=True)
-            self.index = FileStorage("pos_indices").create_index(
-                self.schema, indexname="pos_index"
-            )
-        else:
-            self.index = FileStorage("pos_indices").open_index("pos_index")
-        PosModelEngine.engine = self
+    directory = "pos_indices"
+    index_name = "pos_index"
 
     # Singleton
     @staticmethod
-    def get_engine(schema, force_new=False):
+    def get_engine(schema, force_new: bool = False):
         """Returns an engine for the given schema."""
-        if not PosModelEngine.engine or force_new or not index.exists_in("pos_indices"):
-            new_engine = PosModelEngine(schema)
-            PosModelEngine.engine = new_engine
+        if not PosModelEngine.engine or force_new or not PosModelEngine.engine.exists():
+            PosModelEngine.engine = PosModelEngine(schema)
         return PosModelEngine.engine
 
 
 class ChallengeModelEngine(Engine):
     """Index engine for challenge model."""
 
-    engine = None
-
-    def __init__(self, schema):
-        super().__init__()
-        self.schema = schema
-        schema.add("raw", TEXT(stored=True))
-        if not os.path.isdir("challenge_indices"):
-            os.makedirs("challenge_indices", exist_ok=True)
-            self.index = FileStorage("challenge_indices").create_index(
-                self.schema, indexname="challenge_index"
-            )
-        else:
-            self.index = FileStorage("challenge_indices").open_index("challenge_index")
-        ChallengeModelEngine.engine = self
+    engine: Optional[Engine] = None
+    directory = "challenge_indices"
+    index_name = "challenge_index"
 
     # Singleton
     @staticmethod
@@ -269,30 +544,18 @@ class ChallengeModelEngine(Engine):
         if (
             not ChallengeModelEngine.engine
             or force_new
-            or not index.exists_in("challenge_indices")
+            or not ChallengeModelEngine.engine.exists()
         ):
-            new_engine = ChallengeModelEngine(schema)
-            ChallengeModelEngine.engine = new_engine
+            ChallengeModelEngine.engine = ChallengeModelEngine(schema)
         return ChallengeModelEngine.engine
 
 
 class AddressIndexEngine(Engine):
     """Index engine for address to public-key mapping."""
 
-    engine = None
-
-    def __init__(self, schema):
-        super().__init__()
-        self.schema = schema
-        schema.add("raw", TEXT(stored=True))
-        if not os.path.isdir("address_indices"):
-            os.makedirs("address_indices", exist_ok=True)
-            self.index = FileStorage("address_indices").create_index(
-                self.schema, indexname="address_index"
-            )
-        else:
-            self.index = FileStorage("address_indices").open_index("address_index")
-        AddressIndexEngine.engine = self
+    engine: Optional[Engine] = None
+    directory = "address_indices"
+    index_name = "address_index"
 
     # Singleton
     @staticmethod
@@ -301,9 +564,33 @@ class AddressIndexEngine(Engine):
         if (
             not AddressIndexEngine.engine
             or force_new
-            or not index.exists_in("address_indices")
+            or not AddressIndexEngine.engine.exists()
         ):
-            new_engine = AddressIndexEngine(schema)
-            AddressIndexEngine.engine = new_engine
+            AddressIndexEngine.engine = AddressIndexEngine(schema)
         return AddressIndexEngine.engine
-        
\ No newline at end of file
+
+
+ENGINE_CLASSES = [
+    TxIndexEngine,
+    BlockIndexEngine,
+    TxpIndexEngine,
+    AccountModelEngine,
+    BalancesModelEngine,
+    PosModelEngine,
+    ChallengeModelEngine,
+    AddressIndexEngine,
+]
+
+
+def singleton_engines() -> list[Engine]:
+    """Returns the singleton engines created so far."""
+    return [cls.engine for cls in ENGINE_CLASSES if cls.engine is not None]
+
+
+def index_metrics() -> dict:
+    """Returns the metrics of the singleton engines recording them."""
+    return {
+        engine.index_name: engine.metrics.snapshot()
+        for engine in singleton_engines()
+        if engine.metrics is not None
+    }
@@ -0,0 +1,128 @@
+"""Beez blockchain - in-memory index storage backend."""
+
+import json
+import itertools
+import threading
+from typing import Iterable, Iterator, Optional, Sequence, Union
+
+from beez.index.storage_backend import StorageBackend, doc_matches
+from beez.index.query import Query, Term
+
+
+class MemoryBackend(StorageBackend):
+    """
+    RAM-backed storage backend.
+
+    Nothing is written to disk, the docs live as long as the engine does. Every
+    stored field keeps a value to docs mapping, so exact lookups are dict lookups.
+    Used for throwaway structures such as chains received from peers and tests.
+    """
+
+    name = "memory"
+    persistent = False
+
+    def __init__(self, directory: str, index_name: str, schema) -> None:
+        super().__init__(directory, index_name, schema)
+        self.fields = [name for name in schema.stored_names() if name != "raw"]
+        self.lock = threading.Lock()
+        self.closed = False
+        self.next_docid = 0
+        self.documents: dict[int, dict] = {}
+        # field -> value -> docids, the inner dicts are insertion ordered sets
+        self.postings: dict[str, dict[str, dict[int, None]]] = {
+            field: {} for field in self.fields
+        }
+
+    def exists(self) -> bool:
+        """Returns whether the backend was not closed yet."""
+        return not self.closed
+
+    def write_batch(
+        self, deletes: Sequence[tuple[str, str]], docs: Sequence[dict]
+    ) -> None:
+        """Applies the deletes and then adds the docs."""
+        with self.lock:
+            for field, term in deletes:
+                for docid in list(self.postings.get(field, {}).get(str(term), {})):
+                    self._remove(docid)
+            for doc in docs:
+                # same decoded form the persistent backends return
+                stored_doc = json.loads(json.dumps(doc))
+                docid = self.next_docid
+                self.next_docid += 1
+                self.documents[docid] = stored_doc
+                for field in self.fields:
+                    if stored_doc.get(field) is not None:
+                        self.postings[field].setdefault(str(stored_doc[field]), {})[
+                            docid
+                        ] = None
+            self.generation += 1
+
+    def _remove(self, docid: int) -> None:
+        """Removes a doc and its postings. Must be called while holding the lock."""
+        doc = self.documents.pop(docid)
+        for field in self.fields:
+            if doc.get(field) is None:
+                continue
+            docids = self.postings[field][str(doc[field])]
+            docids.pop(docid, None)
+            if not docids:
+                del self.postings[field][str(doc[field])]
+
+    def _candidates(self, query: Union[str, Query], fields: Sequence) -> Iterable[int]:
+        """Returns the ids of the docs matching query in insertion order. Must be
+        called while holding the lock."""
+        if isinstance(query, Term) and query.field in self.postings:
+            return list(self.postings[query.field].get(str(query.value), {}))
+        if isinstance(query, str) and not query.endswith("*"):
+            docids: set[int] = set()
+            for field in fields:
+                docids.update(self.postings.get(field, {}).get(query, {}))
+            return sorted(docids)
+        return [
+            docid
+            for docid, doc in self.documents.items()
+            if doc_matches(doc, query, fields)
+        ]
+
+    def search(self, query: str, fields: Sequence, highlight: bool = True) -> list[dict]:
+        """Returns the docs where any of fields equals (or starts with) query."""
+        return list(self.iter_search(query, fields))
+
+    def iter_search(
+        self,
+        query: Union[str, Query],
+        fields: Sequence = (),
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> Iterator[dict]:
+        """Yields copies of the docs inside the window."""
+        stop = None if limit is None else offset + limit
+        with self.lock:
+            window = [
+                dict(self.documents[docid])
+                for docid in itertools.islice(
+                    self._candidates(query, fields), offset, stop
+                )
+            ]
+        yield from window
+
+    def count(
+        self, query: Union[str, Query], fields: Sequence = (), limit: Optional[int] = None
+    ) -> int:
+        """Returns the number of matching docs, counting at most limit docs."""
+        with self.lock:
+            return sum(
+                1 for _ in itertools.islice(self._candidates(query, fields), limit)
+            )
+
+    def doc_count(self) -> int:
+        """Returns number of docs in memory."""
+        return len(self.documents)
+
+    def close(self) -> None:
+        """Drops all docs."""
+        with self.lock:
+            self.closed = True
+            self.documents = {}
+            self.postings = {field: {} for field in self.fields}
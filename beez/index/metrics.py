@@ -0,0 +1,107 @@
+"""Beez blockchain - index engine instrumentation."""
+
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+# upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+class OperationMetrics:
+    """Counters and latency histogram of one kind of engine operation."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.docs = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        # one bucket per bound plus the overflow bucket
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def record(self, seconds: float, docs: int) -> None:
+        """Adds one operation that took seconds and touched docs documents."""
+        self.count += 1
+        self.docs += docs
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def snapshot(self) -> dict:
+        """Returns the counters and the histogram keyed by bucket upper bound."""
+        histogram = {
+            f"le_{bound}": count for bound, count in zip(LATENCY_BUCKETS, self.buckets)
+        }
+        histogram["le_inf"] = self.buckets[-1]
+        return {
+            "count": self.count,
+            "docs": self.docs,
+            "total_seconds": self.total_seconds,
+            "mean_seconds": self.total_seconds / self.count if self.count else 0.0,
+            "max_seconds": self.max_seconds,
+            "histogram": histogram,
+        }
+
+
+class EngineMetrics:
+    """
+    Per operation metrics of an index engine.
+
+    Operations are free-form names such as query, count, index, delete and
+    commit. For queries the docs counter holds the number of decoded docs, for
+    writes the number of written docs.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.operations: dict[str, OperationMetrics] = {}
+
+    def record(self, operation: str, seconds: float, docs: int = 0) -> None:
+        """Adds one operation to the metrics."""
+        with self.lock:
+            if operation not in self.operations:
+                self.operations[operation] = OperationMetrics()
+            self.operations[operation].record(seconds, docs)
+
+    @contextmanager
+    def timer(self, operation: str, docs: int = 0) -> Iterator[None]:
+        """Records the time spent inside the block as one operation."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(operation, time.perf_counter() - start, docs)
+
+    def iterate(self, operation: str, docs: Iterator[dict]) -> Iterator[dict]:
+        """Yields docs and records the time spent producing them, excluding the
+        caller's time between two docs, once the iteration ends."""
+        seconds = 0.0
+        decoded = 0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    doc = next(docs)
+                except StopIteration:
+                    seconds += time.perf_counter() - start
+                    return
+                seconds += time.perf_counter() - start
+                decoded += 1
+                yield doc
+        finally:
+            self.record(operation, seconds, decoded)
+
+    def snapshot(self) -> dict:
+        """Returns the metrics of every recorded operation."""
+        with self.lock:
+            return {
+                operation: metrics.snapshot()
+                for operation, metrics in sorted(self.operations.items())
+            }
+
+    def reset(self) -> None:
+        """Drops all recorded metrics."""
+        with self.lock:
+            self.operations = {}
@@ -0,0 +1,98 @@
+"""Beez blockchain - consolidated node data store."""
+
+import os
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+from dotenv import load_dotenv
+
+from beez.index.sqlite_backend import connect
+
+load_dotenv()  # load .env
+# directory holding the node data store
+LOCAL_NODE_DATA_ROOT = "node_data"
+NODE_DATA_ROOT = os.getenv("NODE_DATA_ROOT", LOCAL_NODE_DATA_ROOT)
+
+
+class NodeStore:
+    """
+    Single sqlite database holding the data of every index engine of a node.
+
+    Each engine is a column family, i.e. its own table in the shared database. All
+    families use one connection and one lock, so writes done inside batch() are
+    committed atomically and with a single fsync, whichever families they touch.
+    """
+
+    stores: dict[str, "NodeStore"] = {}
+    stores_lock = threading.Lock()
+
+    def __init__(self, data_root: str) -> None:
+        os.makedirs(data_root, exist_ok=True)
+        self.data_root = os.path.abspath(data_root)
+        self.path = os.path.join(data_root, "node.sqlite3")
+        self.lock = threading.RLock()
+        self.connection = connect(self.path)
+        with self.lock, self.connection:
+            # fsync on every commit, commits are grouped by batch()
+            self.connection.execute("PRAGMA synchronous=FULL")
+        self.batch_depth = 0
+        self.commits = 0
+
+    @staticmethod
+    def open(data_root: Optional[str] = None) -> "NodeStore":
+        """Returns the store under data_root, reopening it if it was removed."""
+        path = os.path.abspath(data_root or NODE_DATA_ROOT)
+        with NodeStore.stores_lock:
+            store = NodeStore.stores.get(path)
+            if store is None or not store.is_current():
+                store = NodeStore(path)
+                NodeStore.stores[path] = store
+            return store
+
+    def exists(self) -> bool:
+        """Returns whether the database file still exists."""
+        return os.path.isfile(self.path)
+
+    def is_current(self) -> bool:
+        """Returns whether the store still exists and was not reopened since."""
+        return self.exists() and NodeStore.stores.get(self.data_root) is self
+
+    def has_family(self, family: str) -> bool:
+        """Returns whether the table of the given family exists."""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                (family,),
+            ).fetchone()
+        return row is not None
+
+    def families(self) -> list[str]:
+        """Returns the names of all families in the store."""
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """Holds the store lock and commits the writes done inside the outermost
+        batch at once, rolling them back if the block raises."""
+        with self.lock:
+            self.batch_depth += 1
+            try:
+                yield
+            except BaseException:
+                self.batch_depth -= 1
+                if self.batch_depth == 0:
+                    self.connection.rollback()
+                raise
+            self.batch_depth -= 1
+            if self.batch_depth == 0:
+                self.connection.commit()
+                self.commits += 1
+
+    def close(self) -> None:
+        """Closes the database connection."""
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,232 @@
+"""Beez blockchain - structured index queries."""
+
+from __future__ import annotations
+from typing import Any, Optional
+from whoosh import query as whoosh_query  # type: ignore
+from whoosh.fields import ID, NUMERIC  # type: ignore
+
+
+def number(value: Any) -> Optional[float]:
+    """Returns value as a float, None if it is not a number."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class Query:
+    """
+    Structured query base class.
+
+    Structured queries are built by the caller instead of being parsed from a
+    query string. They translate to whoosh query objects, to sqlite where clauses
+    or are matched against plain docs, and are combined with & and |.
+
+    Every backend returns the docs for which matches() is true. Whoosh can only
+    compare the analysed terms of a field, so where that differs from comparing
+    the whole values, to_whoosh() returns a superset of the docs and exact() is
+    False; the whoosh backend then keeps the docs matches() accepts.
+    """
+
+    def __and__(self, other: Query) -> Query:
+        return And(self, other)
+
+    def __or__(self, other: Query) -> Query:
+        return Or(self, other)
+
+    def to_whoosh(self, schema):
+        """Returns the corresponding whoosh query object."""
+        raise NotImplementedError
+
+    def exact(self, schema) -> bool:
+        """Returns whether the whoosh query matches exactly the docs of the query."""
+        raise NotImplementedError
+
+    def to_sql(self, columns: list[str]) -> tuple[str, list[Any]]:
+        """Returns the corresponding where clause and its parameters."""
+        raise NotImplementedError
+
+    def matches(self, doc: dict) -> bool:
+        """Returns whether doc matches the query."""
+        raise NotImplementedError
+
+
+class Term(Query):
+    """Matches docs whose field equals value."""
+
+    def __init__(self, field: str, value: Any) -> None:
+        self.field = field
+        self.value = value
+
+    def __repr__(self) -> str:
+        return f"Term({self.field!r}, {self.value!r})"
+
+    def to_whoosh(self, schema):
+        """Returns a whoosh term query, analysing the value like the indexed field."""
+        if self.field not in schema:
+            return whoosh_query.NullQuery
+        field = schema[self.field]
+        if isinstance(field, NUMERIC):
+            if isinstance(self.value, (int, float)):
+                return whoosh_query.Term(self.field, self.value)
+            return whoosh_query.Every()
+        terms = [
+            whoosh_query.Term(self.field, text)
+            for text in field.process_text(str(self.value), mode="query")
+        ]
+        if len(terms) == 1:
+            return terms[0]
+        # analysers drop some values entirely, e.g. short words or stop words
+        return whoosh_query.And(terms) if terms else whoosh_query.Every()
+
+    def exact(self, schema) -> bool:
+        """Returns whether the field indexes whole values and the value as one
+        unchanged term."""
+        if self.field not in schema:
+            return True
+        field = schema[self.field]
+        if isinstance(field, NUMERIC):
+            return isinstance(self.value, (int, float))
+        return isinstance(field, ID) and list(
+            field.process_text(str(self.value), mode="query")
+        ) == [str(self.value)]
+
+    def to_sql(self, columns: list[str]) -> tuple[str, list[Any]]:
+        """Returns an equality clause on the field's column."""
+        if self.field not in columns:
+            return "0", []
+        return f'"{self.field}" = ?', [str(self.value)]
+
+    def matches(self, doc: dict) -> bool:
+        """Returns whether the field of doc equals the value."""
+        return doc.get(self.field) is not None and str(doc[self.field]) == str(self.value)
+
+
+class Range(Query):
+    """Matches docs whose field lies between low and high, both inclusive. A bound
+    of None leaves that side of the range open."""
+
+    def __init__(self, field: str, low: Any = None, high: Any = None) -> None:
+        self.field = field
+        self.low = low
+        self.high = high
+
+    def __repr__(self) -> str:
+        return f"Range({self.field!r}, {self.low!r}, {self.high!r})"
+
+    def numeric(self) -> bool:
+        """Returns whether the bounds are numbers."""
+        return any(isinstance(bound, (int, float)) for bound in (self.low, self.high))
+
+    def bounds(self) -> tuple[Any, Any]:
+        """Returns the bounds as numbers or strings, depending on the range kind."""
+        if self.numeric():
+            return self.low, self.high
+        return (
+            None if self.low is None else str(self.low),
+            None if self.high is None else str(self.high),
+        )
+
+    def to_whoosh(self, schema):
+        """Returns a whoosh numeric or term range query, or every doc when the field
+        is not indexed the way the range compares."""
+        if self.field not in schema:
+            return whoosh_query.NullQuery
+        if not self.exact(schema):
+            return whoosh_query.Every()
+        if self.numeric():
+            return whoosh_query.NumericRange(self.field, self.low, self.high)
+        return whoosh_query.TermRange(self.field, *self.bounds())
+
+    def exact(self, schema) -> bool:
+        """Returns whether numeric bounds meet a numeric field or string bounds a
+        field indexing whole values."""
+        if self.field not in schema:
+            return True
+        field = schema[self.field]
+        if self.numeric():
+            return isinstance(field, NUMERIC)
+        return isinstance(field, ID)
+
+    def to_sql(self, columns: list[str]) -> tuple[str, list[Any]]:
+        """Returns a range clause, comparing numerically for numeric bounds. Needs
+        the number function registered by the sqlite backend."""
+        if self.field not in columns:
+            return "0", []
+        column = f'number("{self.field}")' if self.numeric() else f'"{self.field}"'
+        conditions = [f"{column} IS NOT NULL"]
+        params: list[Any] = []
+        low, high = self.bounds()
+        if low is not None:
+            conditions.append(f"{column} >= ?")
+            params.append(low)
+        if high is not None:
+            conditions.append(f"{column} <= ?")
+            params.append(high)
+        return f"({' AND '.join(conditions)})", params
+
+    def matches(self, doc: dict) -> bool:
+        """Returns whether the field of doc lies inside the range."""
+        if doc.get(self.field) is None:
+            return False
+        value = number(doc[self.field]) if self.numeric() else str(doc[self.field])
+        if value is None:
+            return False
+        low, high = self.bounds()
+        return (low is None or value >= low) and (high is None or value <= high)
+
+
+class And(Query):
+    """Matches docs matching all of the given queries."""
+
+    def __init__(self, *queries: Query) -> None:
+        self.queries = queries
+
+    def __repr__(self) -> str:
+        return f"And{self.queries!r}"
+
+    def to_whoosh(self, schema):
+        """Returns a whoosh and query."""
+        return whoosh_query.And([query.to_whoosh(schema) for query in self.queries])
+
+    def exact(self, schema) -> bool:
+        """Returns whether all queries are exact."""
+        return all(query.exact(schema) for query in self.queries)
+
+    def to_sql(self, columns: list[str]) -> tuple[str, list[Any]]:
+        """Returns the clauses of the queries joined with AND."""
+        clauses = [query.to_sql(columns) for query in self.queries]
+        params = [param for _, clause_params in clauses for param in clause_params]
+        return f"({' AND '.join(clause for clause, _ in clauses) or '1'})", params
+
+    def matches(self, doc: dict) -> bool:
+        """Returns whether doc matches all queries."""
+        return all(query.matches(doc) for query in self.queries)
+
+
+class Or(Query):
+    """Matches docs matching any of the given queries."""
+
+    def __init__(self, *queries: Query) -> None:
+        self.queries = queries
+
+    def __repr__(self) -> str:
+        return f"Or{self.queries!r}"
+
+    def to_whoosh(self, schema):
+        """Returns a whoosh or query."""
+        return whoosh_query.Or([query.to_whoosh(schema) for query in self.queries])
+
+    def exact(self, schema) -> bool:
+        """Returns whether all queries are exact."""
+        return all(query.exact(schema) for query in self.queries)
+
+    def to_sql(self, columns: list[str]) -> tuple[str, list[Any]]:
+        """Returns the clauses of the queries joined with OR."""
+        clauses = [query.to_sql(columns) for query in self.queries]
+        params = [param for _, clause_params in clauses for param in clause_params]
+        return f"({' OR '.join(clause for clause, _ in clauses) or '0'})", params
+
+    def matches(self, doc: dict) -> bool:
+        """Returns whether doc matches any query."""
+        return any(query.matches(doc) for query in self.queries)
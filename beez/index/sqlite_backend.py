@@ -0,0 +1,215 @@
+"""Beez blockchain - sqlite index storage backend."""
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional, Sequence, Union
+
+from beez.index.storage_backend import StorageBackend, decode_doc, encode_doc
+from beez.index.query import Query, number
+
+# upper bound used to turn a prefix lookup into a b-tree range scan
+PREFIX_UPPER_BOUND = "\U0010ffff"
+# free pages released by one compaction step, readers wait at most for one step
+COMPACTION_STEP_PAGES = 256
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """Opens the database at path in WAL mode, with incremental vacuuming and the
+    functions used by the where clauses of structured queries."""
+    connection = sqlite3.connect(path, check_same_thread=False)
+    connection.create_function("number", 1, number, deterministic=True)
+    with connection:
+        # only takes effect on new databases, before the first table is created
+        connection.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        connection.execute("PRAGMA journal_mode=WAL")
+    return connection
+
+
+class SqliteBackend(StorageBackend):
+    """
+    Exact-key storage backend based on an embedded sqlite database.
+
+    Every stored field of the schema becomes an indexed column, so lookups by
+    key or by key prefix are b-tree searches instead of parsed and scored
+    full-text queries. A query ending with '*' is treated as a prefix lookup.
+    The backend opens a database of its own unless given a shared connection, in
+    which case its docs go into a table named after the index.
+    """
+
+    name = "sqlite"
+
+    def __init__(
+        self,
+        directory: str,
+        index_name: str,
+        schema,
+        connection: Optional[sqlite3.Connection] = None,
+    ) -> None:
+        super().__init__(directory, index_name, schema)
+        self.fields = [name for name in schema.stored_names() if name != "raw"]
+        self.table = "documents" if connection is None else index_name
+        if connection is None:
+            os.makedirs(directory, exist_ok=True)
+            self.path = os.path.join(directory, f"{index_name}.sqlite3")
+            connection = connect(self.path)
+        self.lock: Any = threading.Lock()
+        self.connection = connection
+        with self._transaction():
+            self._create_table()
+
+    def _create_table(self) -> None:
+        """Creates the documents table and its field indexes if missing. Must be
+        called while holding the lock."""
+        columns = "".join(f'"{field}" TEXT, ' for field in self.fields)
+        self.connection.execute(
+            f'CREATE TABLE IF NOT EXISTS "{self.table}" '
+            f"(docid INTEGER PRIMARY KEY, {columns}raw BLOB)"
+        )
+        for field in self.fields:
+            self.connection.execute(
+                f'CREATE INDEX IF NOT EXISTS "ix_{self.table}_{field}" '
+                f'ON "{self.table}" ("{field}")'
+            )
+
+    def exists(self) -> bool:
+        """Returns whether the sqlite database still exists."""
+        return os.path.isfile(self.path)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        """Holds the lock and commits the statements executed inside the block,
+        rolling them back if it raises."""
+        with self.lock, self.connection:
+            yield
+
+    def write_batch(
+        self, deletes: Sequence[tuple[str, str]], docs: Sequence[dict]
+    ) -> None:
+        """Applies the deletes and then adds the docs within a single transaction."""
+        with self._transaction():
+            self._apply_batch(deletes, docs)
+            self.generation += 1
+
+    def _apply_batch(
+        self, deletes: Sequence[tuple[str, str]], docs: Sequence[dict]
+    ) -> None:
+        """Executes the deletes and inserts without committing them. Must be called
+        while holding the lock."""
+        columns = "".join(f'"{field}", ' for field in self.fields)
+        placeholders = "?, " * len(self.fields)
+        statement = f'INSERT INTO "{self.table}" ({columns}raw) VALUES ({placeholders}?)'
+        rows = [
+            [
+                str(doc[field]) if doc.get(field) is not None else None
+                for field in self.fields
+            ]
+            + [encode_doc(doc)]
+            for doc in docs
+        ]
+        for field, term in deletes:
+            if field in self.fields:
+                self.connection.execute(
+                    f'DELETE FROM "{self.table}" WHERE "{field}" = ?', (str(term),)
+                )
+        self.connection.executemany(statement, rows)
+
+    def _where(self, query: Union[str, Query], fields: Sequence) -> tuple[str, list[Any]]:
+        """Returns the where clause and its parameters matching query on fields."""
+        if isinstance(query, Query):
+            return query.to_sql(self.fields)
+        conditions = []
+        params: list[Any] = []
+        for field in fields:
+            if field not in self.fields:
+                continue
+            if query.endswith("*"):
+                prefix = query[:-1]
+                conditions.append(f'("{field}" >= ? AND "{field}" < ?)')
+                params.extend([prefix, prefix + PREFIX_UPPER_BOUND])
+            else:
+                conditions.append(f'"{field}" = ?')
+                params.append(query)
+        return " OR ".join(conditions) or "0", params
+
+    def search(self, query: str, fields: Sequence, highlight: bool = True) -> list[dict]:
+        """Returns the docs where any of fields equals (or starts with) query."""
+        return list(self.iter_search(query, fields))
+
+    def iter_search(
+        self,
+        query: Union[str, Query],
+        fields: Sequence = (),
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> Iterator[dict]:
+        """Yields the docs inside the window, decoding each one when reached."""
+        where, params = self._where(query, fields)
+        statement = f'SELECT raw FROM "{self.table}" WHERE {where} ORDER BY docid LIMIT ? OFFSET ?'
+        with self.lock:
+            rows = self.connection.execute(
+                statement, params + [-1 if limit is None else limit, offset]
+            ).fetchall()
+        for row in rows:
+            yield decode_doc(row[0])
+
+    def count(
+        self, query: Union[str, Query], fields: Sequence = (), limit: Optional[int] = None
+    ) -> int:
+        """Returns the number of matching docs, counting at most limit docs."""
+        where, params = self._where(query, fields)
+        statement = (
+            f'SELECT COUNT(*) FROM (SELECT 1 FROM "{self.table}" WHERE {where} LIMIT ?)'
+        )
+        with self.lock:
+            return int(
+                self.connection.execute(
+                    statement, params + [-1 if limit is None else limit]
+                ).fetchone()[0]
+            )
+
+    def doc_count(self) -> int:
+        """Returns number of docs in the database."""
+        with self.lock:
+            return int(
+                self.connection.execute(
+                    f'SELECT COUNT(*) FROM "{self.table}"'
+                ).fetchone()[0]
+            )
+
+    def segment_stats(self) -> dict:
+        """Returns the number of docs and the ratio of free pages in the database."""
+        with self.lock:
+            pages = self.connection.execute("PRAGMA page_count").fetchone()[0]
+            free_pages = self.connection.execute("PRAGMA freelist_count").fetchone()[0]
+        return {
+            "segments": 1,
+            "docs": self.doc_count(),
+            "deleted_ratio": free_pages / pages if pages else 0.0,
+        }
+
+    def compact(self) -> bool:
+        """Releases the free pages of the database in steps of a few pages, taking
+        the lock only for one step at a time. Databases created before incremental
+        vacuuming keep their free pages. Returns whether any page was released."""
+        compacted = False
+        while True:
+            with self.lock:
+                if self.connection.in_transaction:
+                    return compacted
+                free_pages = self.connection.execute("PRAGMA freelist_count").fetchone()[0]
+                if not free_pages:
+                    return compacted
+                self.connection.execute(
+                    f"PRAGMA incremental_vacuum({COMPACTION_STEP_PAGES})"
+                ).fetchall()
+                if self.connection.execute("PRAGMA freelist_count").fetchone()[0] == free_pages:
+                    # auto_vacuum is off, only a blocking VACUUM could release them
+                    return compacted
+            compacted = True
+
+    def close(self) -> None:
+        """Closes the database connection."""
+        with self.lock:
+            self.connection.close()
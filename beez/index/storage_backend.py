@@ -0,0 +1,130 @@
+"""Beez blockchain - index storage backend."""
+
+import json
+import zlib
+import itertools
+from contextlib import contextmanager
+from typing import Iterator, Optional, Sequence, Union
+
+from beez.index.query import Query
+
+# zlib level of the stored docs, block bodies compress well already at low levels
+DOC_COMPRESSION_LEVEL = 6
+
+
+class StorageBackend:
+    """
+    Storage backend base class.
+
+    A backend persists the documents of a single index engine and answers the
+    lookups issued by the engine. The schema is the whoosh schema the engine was
+    created with and is used to find out which fields are stored.
+    """
+
+    name = ""
+    # whether the docs outlive the process
+    persistent = True
+
+    def __init__(self, directory: str, index_name: str, schema) -> None:
+        self.directory = directory
+        self.index_name = index_name
+        self.schema = schema
+        # incremented on every commit, readers compare it to know when to reopen
+        self.generation = 0
+
+    def exists(self) -> bool:
+        """Returns whether the backing store of the index still exists."""
+        raise NotImplementedError
+
+    def add_documents(self, docs: Sequence[dict]) -> None:
+        """Adds docs to the store."""
+        self.write_batch([], docs)
+
+    def delete_documents(self, field: str, term: str) -> None:
+        """Deletes all docs whose field equals term."""
+        self.write_batch([(field, term)], [])
+
+    def write_batch(
+        self, deletes: Sequence[tuple[str, str]], docs: Sequence[dict]
+    ) -> None:
+        """Applies the deletes and then adds the docs within a single commit."""
+        raise NotImplementedError
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """Groups the writes done inside the block into one commit. Backends without
+        a shared store commit every write batch on its own."""
+        yield
+
+    def search(self, query: str, fields: Sequence, highlight: bool = True) -> list[dict]:
+        """Returns the docs where any of fields matches query."""
+        raise NotImplementedError
+
+    def iter_search(
+        self,
+        query: Union[str, Query],
+        fields: Sequence = (),
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> Iterator[dict]:
+        """Yields the docs where any of fields matches query, skipping the first
+        offset docs and stopping after limit docs."""
+        stop = None if limit is None else offset + limit
+        yield from itertools.islice(self.search(query, fields, False), offset, stop)
+
+    def count(
+        self, query: Union[str, Query], fields: Sequence = (), limit: Optional[int] = None
+    ) -> int:
+        """Returns the number of docs where any of fields matches query, counting at
+        most limit docs."""
+        return sum(1 for _ in self.iter_search(query, fields, limit=limit))
+
+    def doc_count(self) -> int:
+        """Returns number of docs in the store."""
+        raise NotImplementedError
+
+    def segment_stats(self) -> dict:
+        """Returns the number of segments, of docs and the ratio of deleted docs."""
+        return {"segments": 1, "docs": self.doc_count(), "deleted_ratio": 0.0}
+
+    def compact(self) -> bool:
+        """Merges segments and purges deleted docs, returns whether it did so."""
+        return False
+
+    def close(self) -> None:
+        """Releases the resources held by the backend."""
+
+
+def term_matches(doc: dict, field: str, term: str) -> bool:
+    """Returns whether the field of doc equals term."""
+    return doc.get(field) is not None and str(doc[field]) == str(term)
+
+
+def doc_matches(doc: dict, query: Union[str, Query], fields: Sequence) -> bool:
+    """Returns whether doc matches the structured query, or whether any of fields of
+    doc equals the query string, or starts with it when the query ends with '*'."""
+    if isinstance(query, Query):
+        return query.matches(doc)
+    for field in fields:
+        if doc.get(field) is None:
+            continue
+        value = str(doc[field])
+        if query.endswith("*"):
+            if value.startswith(query[:-1]):
+                return True
+        elif value == query:
+            return True
+    return False
+
+
+def encode_doc(doc: dict) -> bytes:
+    """Returns the compressed json encoding of doc."""
+    return zlib.compress(json.dumps(doc).encode("utf-8"), DOC_COMPRESSION_LEVEL)
+
+
+def decode_doc(data: Union[str, bytes]) -> dict:
+    """Returns the doc encoded by encode_doc, or stored as plain json by older
+    versions of the backends."""
+    if isinstance(data, str):
+        return json.loads(data)
+    return json.loads(zlib.decompress(data).decode("utf-8"))
@@ -0,0 +1,40 @@
+"""Beez blockchain - node data store backend."""
+
+from contextlib import contextmanager
+from typing import Iterator
+
+from beez.index.node_store import NodeStore
+from beez.index.sqlite_backend import SqliteBackend
+
+
+class StoreBackend(SqliteBackend):
+    """
+    Storage backend keeping the docs of an engine as a family of the node store.
+
+    Lookups work like in the sqlite backend, but every engine shares the database,
+    connection and lock of the node store instead of owning a directory of its own.
+    """
+
+    name = "store"
+
+    def __init__(self, directory: str, index_name: str, schema) -> None:
+        self.store = NodeStore.open()
+        super().__init__(directory, index_name, schema, connection=self.store.connection)
+        self.path = self.store.path
+        self.lock = self.store.lock
+
+    def exists(self) -> bool:
+        """Returns whether the store and the family of the engine still exist."""
+        return self.store.is_current() and self.store.has_family(self.table)
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """Groups the writes of all families done inside the block into one commit."""
+        with self.store.batch():
+            yield
+
+    # writes join the enclosing store batch instead of committing on their own
+    _transaction = batch
+
+    def close(self) -> None:
+        """Leaves the shared connection open for the other families."""
@@ -0,0 +1,108 @@
+# pylint: skip-file
+import os
+import shutil
+from whoosh.fields import Schema, TEXT, KEYWORD, ID
+from beez.index.bloom_filter import BloomFilter, ScalableBloomFilter
+from beez.index.index_engine import AddressIndexEngine
+
+
+def clear_indices():
+    shutil.rmtree("address_indices", ignore_errors=True)
+
+
+def address_schema():
+    return Schema(
+        id=ID(stored=True),
+        type=KEYWORD(stored=True),
+        public_key_pem=TEXT(stored=True),
+        address=TEXT(stored=True),
+    )
+
+
+def address_doc(number):
+    return {
+        "id": f"key{number}",
+        "type": "ADDR",
+        "public_key_pem": f"key{number}",
+        "address": f"bzx{number}",
+    }
+
+
+def test_no_false_negatives():
+    bloom_filter = BloomFilter(1000, 0.01)
+    for number in range(1000):
+        bloom_filter.add(f"key{number}")
+    assert all(f"key{number}" in bloom_filter for number in range(1000))
+    false_positives = sum(f"other{number}" in bloom_filter for number in range(10000))
+    assert false_positives < 300
+
+
+def test_scalable_filter_grows():
+    bloom_filter = ScalableBloomFilter(10, 0.01)
+    for number in range(100):
+        bloom_filter.add(f"key{number}")
+    assert len(bloom_filter.layers) > 1
+    assert len(bloom_filter) == 100
+    assert all(f"key{number}" in bloom_filter for number in range(100))
+
+
+def test_save_and_load():
+    os.makedirs("address_indices", exist_ok=True)
+    bloom_filter = ScalableBloomFilter(10, 0.01)
+    for number in range(30):
+        bloom_filter.add(f"key{number}")
+    bloom_filter.save("address_indices/test.bloom")
+    loaded = ScalableBloomFilter.load("address_indices/test.bloom")
+    assert len(loaded) == 30
+    assert all(f"key{number}" in loaded for number in range(30))
+    assert ScalableBloomFilter.load("address_indices/missing.bloom") is None
+    clear_indices()
+
+
+def test_engine_filter():
+    clear_indices()
+    engine = AddressIndexEngine(address_schema(), buffer_size=0)
+    engine.index_documents([address_doc(1)])
+    engine.enable_filter("address")
+    engine.index_documents([address_doc(2)])
+    assert engine.may_contain("address", "bzx1")
+    assert engine.may_contain("address", "bzx2")
+    assert not engine.may_contain("address", "bzx3")
+    assert engine.may_contain("public_key_pem", "anything")
+    engine.close()
+
+    reopened = AddressIndexEngine(address_schema(), buffer_size=0)
+    reopened.enable_filter("address")
+    assert reopened.may_contain("address", "bzx2")
+    assert len(reopened.filters["address"]) == 2
+    clear_indices()
+
+
+def test_stale_saved_filter_is_rebuilt():
+    clear_indices()
+    engine = AddressIndexEngine(address_schema(), buffer_size=0)
+    engine.enable_filter("address")
+    engine.close()
+    # written without the filter, e.g. before a crash
+    AddressIndexEngine(address_schema(), buffer_size=0).index_documents([address_doc(4)])
+    reopened = AddressIndexEngine(address_schema(), buffer_size=0)
+    reopened.enable_filter("address")
+    assert reopened.may_contain("address", "bzx4")
+    clear_indices()
+
+
+def test_filter_saved_with_every_commit():
+    clear_indices()
+    engine = AddressIndexEngine(address_schema(), buffer_size=0)
+    engine.index_documents([address_doc(5)])
+    engine.enable_filter("address")
+    engine.close()
+    engine = AddressIndexEngine(address_schema(), buffer_size=0)
+    engine.enable_filter("address")
+    # same doc count as before, the saved filter must still know the new value
+    engine.replace_documents("id", "key5", [address_doc(6)])
+    # reopened without closing, as after a crash
+    reopened = AddressIndexEngine(address_schema(), buffer_size=0)
+    reopened.enable_filter("address")
+    assert reopened.may_contain("address", "bzx6")
+    clear_indices()
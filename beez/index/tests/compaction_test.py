@@ -0,0 +1,127 @@
+# pylint: skip-file
+import pytest
+import shutil
+from whoosh.fields import Schema, TEXT, KEYWORD, ID, NUMERIC
+from beez.index.index_engine import PosModelEngine
+from beez.index.compaction import Compactor
+from beez.index.query import Term
+
+
+def clear_indices():
+    shutil.rmtree("pos_indices", ignore_errors=True)
+    shutil.rmtree("node_data", ignore_errors=True)
+
+
+def pos_schema():
+    return Schema(
+        id=ID(stored=True),
+        type=KEYWORD(stored=True),
+        account_id=TEXT(stored=True),
+        stake=NUMERIC(stored=True),
+    )
+
+
+@pytest.fixture(params=["whoosh", "sqlite", "store"])
+def engine(request):
+    clear_indices()
+    engine = PosModelEngine(pos_schema(), backend=request.param, buffer_size=0)
+    yield engine
+    engine.close()
+    clear_indices()
+
+
+def update_stakes(engine, updates):
+    for stake in range(updates):
+        engine.replace_documents(
+            "id",
+            "abc",
+            [{"id": "abc", "type": "STAKE", "account_id": "alice", "stake": stake}],
+        )
+
+
+def test_compaction_purges_deleted_docs(engine):
+    engine.index_documents(
+        [
+            {"id": f"bulk-{number}", "type": "BULK", "account_id": "x" * 200, "stake": number}
+            for number in range(500)
+        ]
+    )
+    engine.delete_document("type", "BULK")
+    update_stakes(engine, 30)
+    compactor = Compactor(lambda: [engine], max_segments=0, max_deleted_ratio=0.0)
+    assert compactor.run_once() == 1
+    stats = engine.segment_stats()
+    assert stats["segments"] == 1
+    assert stats["docs"] == 1
+    assert stats["deleted_ratio"] == 0.0
+    assert [doc["stake"] for doc in engine.query(Term("id", "abc"))] == [29]
+
+
+def test_policy_skips_compact_indices(engine):
+    engine.index_documents(
+        [{"id": "abc", "type": "STAKE", "account_id": "alice", "stake": 1}]
+    )
+    compactor = Compactor(lambda: [engine], max_segments=10, max_deleted_ratio=0.5)
+    assert compactor.run_once() == 0
+    stats = compactor.stats()
+    assert stats["runs"] == 1
+    assert stats["compactions"] == 0
+    assert stats["engines"]["pos_index"]["compactions"] == 0
+
+
+def test_compaction_policy():
+    compactor = Compactor(lambda: [], max_segments=4, max_deleted_ratio=0.25)
+    assert not compactor.needs_compaction(
+        {"segments": 4, "docs": 10, "deleted_ratio": 0.25}
+    )
+    assert compactor.needs_compaction({"segments": 5, "docs": 10, "deleted_ratio": 0.0})
+    assert compactor.needs_compaction({"segments": 1, "docs": 10, "deleted_ratio": 0.5})
+
+
+def test_whoosh_deletes_are_purged():
+    clear_indices()
+    engine = PosModelEngine(pos_schema(), backend="whoosh", buffer_size=0)
+    update_stakes(engine, 12)
+    assert engine.segment_stats()["deleted_ratio"] > 0
+    compactor = Compactor(lambda: [engine], max_segments=10, max_deleted_ratio=0.1)
+    assert compactor.run_once() == 1
+    engine_stats = compactor.stats()["engines"]["pos_index"]
+    assert engine_stats["segments"] == 1
+    assert engine_stats["compactions"] == 1
+    assert engine_stats["last_duration"] is not None
+    engine.close()
+    clear_indices()
+
+
+def test_removed_indices_are_skipped():
+    clear_indices()
+    engine = PosModelEngine(pos_schema(), backend="whoosh", buffer_size=0)
+    clear_indices()
+    compactor = Compactor(lambda: [engine], max_segments=0, max_deleted_ratio=0.0)
+    assert compactor.run_once() == 0
+
+
+def test_background_thread_start_stop():
+    compactor = Compactor(lambda: [], interval=0.01)
+    compactor.start()
+    assert compactor.running()
+    compactor.stop()
+    assert not compactor.running()
+    assert not Compactor(lambda: [], interval=0).running()
+
+
+def test_compaction_gives_way_to_writes():
+    clear_indices()
+    engine = PosModelEngine(pos_schema(), backend="whoosh", buffer_size=0)
+    update_stakes(engine, 30)
+    segments = engine.segment_stats()["segments"]
+    with engine.backend.writer_lock:
+        # a write in progress, the compaction step is given up
+        assert engine.compact() is False
+    assert engine.segment_stats()["segments"] == segments
+    # steps of at most 10 docs still end up merging the small segments
+    assert engine.backend.compact(merge_docs=10)
+    assert engine.segment_stats()["deleted_ratio"] == 0.0
+    assert [doc["stake"] for doc in engine.query(Term("id", "abc"))] == [29]
+    engine.close()
+    clear_indices()
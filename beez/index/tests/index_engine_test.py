@@ -0,0 +1,361 @@
+# pylint: skip-file
+import pytest
+import shutil
+import time
+import gc
+import weakref
+from whoosh.fields import Schema, TEXT, KEYWORD, ID, NUMERIC
+from beez.index.index_engine import Engine, PosModelEngine, open_backend
+from beez.index.query import Term, Range
+
+
+def clear_indices():
+    shutil.rmtree("pos_indices", ignore_errors=True)
+    shutil.rmtree("node_data", ignore_errors=True)
+
+
+def pos_schema():
+    return Schema(
+        id=ID(stored=True),
+        type=KEYWORD(stored=True),
+        account_id=TEXT(stored=True),
+        stake=NUMERIC(stored=True),
+    )
+
+
+@pytest.fixture(params=["whoosh", "sqlite", "memory", "store"])
+def engine(request):
+    clear_indices()
+    yield PosModelEngine(pos_schema(), backend=request.param, buffer_size=0)
+    clear_indices()
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        open_backend("unknown", "pos_indices", "pos_index", pos_schema())
+
+
+def test_index_and_query(engine):
+    engine.index_documents(
+        [
+            {"id": "abc", "type": "STAKE", "account_id": "alice", "stake": 3},
+            {"id": "abd", "type": "STAKE", "account_id": "bob", "stake": 5},
+        ]
+    )
+    assert engine.get_index_size() == 2
+    assert len(engine.query("STAKE", ["type"], highlight=False)) == 2
+    doc = engine.query_at("abd", ["id"], highlight=False)
+    assert doc == {"id": "abd", "type": "STAKE", "account_id": "bob", "stake": 5}
+    assert engine.query("xyz", ["id"], highlight=False) == []
+
+
+def test_prefix_query(engine):
+    engine.index_documents(
+        [
+            {"id": "abc", "type": "STAKE", "account_id": "alice", "stake": 3},
+            {"id": "xbd", "type": "STAKE", "account_id": "bob", "stake": 5},
+        ]
+    )
+    docs = engine.query("ab*", ["id"], highlight=False)
+    assert [doc["account_id"] for doc in docs] == ["alice"]
+
+
+def test_delete_document(engine):
+    engine.index_documents(
+        [{"id": "abc", "type": "STAKE", "account_id": "alice", "stake": 3}]
+    )
+    engine.delete_document("id", "abc")
+    assert engine.query("abc", ["id"], highlight=False) == []
+
+
+def test_replace_documents(engine):
+    engine.index_documents(
+        [{"id": "abc", "type": "STAKE", "account_id": "alice", "stake": 3}]
+    )
+    generation = engine.generation
+    engine.replace_documents(
+        "id", "abc", [{"id": "abc", "type": "STAKE", "account_id": "alice", "stake": 4}]
+    )
+    assert engine.generation == generation + 1
+    assert [doc["stake"] for doc in engine.query(Term("id", "abc"))] == [4]
+
+
+def test_whoosh_stores_one_compressed_copy():
+    clear_indices()
+    engine = PosModelEngine(pos_schema(), backend="whoosh", buffer_size=0)
+    doc = {"id": "abc", "type": "STAKE", "account_id": "alice", "stake": 3}
+    engine.index_documents([doc])
+    with engine.backend.index.searcher() as searcher:
+        stored = searcher.stored_fields(0)
+    assert list(stored) == ["raw"]
+    assert isinstance(stored["raw"], bytes)
+    assert engine.query_at("alice", ["account_id"]) == doc
+    assert "<b" in engine.query_at("alice", ["account_id"], highlight=True)["account_id"]
+    assert engine.query(Term("account_id", "alice")) == [doc]
+    engine.close()
+    clear_indices()
+
+
+def test_get_engine_recreates_removed_index():
+    clear_indices()
+    engine = PosModelEngine.get_engine(pos_schema())
+    assert PosModelEngine.get_engine(pos_schema()) is engine
+    clear_indices()
+    assert not engine.exists()
+    assert PosModelEngine.get_engine(pos_schema()) is not engine
+    clear_indices()
+
+
+def test_engine_without_schema():
+    assert not Engine().exists()
+
+
+def test_generation_counts_commits(engine):
+    assert engine.generation == 0
+    engine.index_documents(
+        [{"id": "abc", "type": "STAKE", "account_id": "alice", "stake": 3}]
+    )
+    assert engine.generation == 1
+    engine.delete_document("id", "abc")
+    assert engine.generation == 2
+    engine.close()
+
+
+def test_cached_searcher_sees_commits():
+    clear_indices()
+    engine = PosModelEngine(pos_schema(), backend="whoosh", buffer_size=0)
+    engine.index_documents(
+        [{"id": "abc", "type": "STAKE", "account_id": "alice", "stake": 3}]
+    )
+    assert len(engine.query("STAKE", ["type"], highlight=False)) == 1
+    searcher = engine.backend.searcher
+    assert len(engine.query("STAKE", ["type"], highlight=False)) == 1
+    assert engine.backend.searcher is searcher
+    engine.index_documents(
+        [{"id": "abd", "type": "STAKE", "account_id": "bob", "stake": 5}]
+    )
+    assert len(engine.query("STAKE", ["type"], highlight=False)) == 2
+    assert engine.backend.searcher is not searcher
+    engine.close()
+    clear_indices()
+
+
+@pytest.fixture(params=["whoosh", "sqlite", "memory", "store"])
+def buffered_engine(request):
+    clear_indices()
+    engine = PosModelEngine(
+        pos_schema(), backend=request.param, buffer_size=10, buffer_seconds=60
+    )
+    yield engine
+    engine.close()
+    clear_indices()
+
+
+def test_buffered_writes_are_group_committed(buffered_engine):
+    buffered_engine.index_documents(
+        [{"id": "abc", "type": "STAKE", "account_id": "alice", "stake": 3}]
+    )
+    buffered_engine.delete_document("id", "abc")
+    buffered_engine.index_documents(
+        [{"id": "abc", "type": "STAKE", "account_id": "alice", "stake": 4}]
+    )
+    assert buffered_engine.generation == 0
+    assert buffered_engine.pending_writes() == 2
+    buffered_engine.flush()
+    assert buffered_engine.generation == 1
+    assert buffered_engine.pending_writes() == 0
+    assert buffered_engine.query("abc", ["id"], highlight=False) == [
+        {"id": "abc", "type": "STAKE", "account_id": "alice", "stake": 4}
+    ]
+
+
+def test_buffered_reads_see_pending_writes(buffered_engine):
+    buffered_engine.index_documents(
+        [{"id": "abc", "type": "STAKE", "account_id": "alice", "stake": 3}]
+    )
+    buffered_engine.flush()
+    buffered_engine.delete_document("id", "abc")
+    assert buffered_engine.query("abc", ["id"]) == []
+    buffered_engine.index_documents(
+        [{"id": "abc", "type": "STAKE", "account_id": "alice", "stake": 5}]
+    )
+    assert buffered_engine.query_at("abc", ["id"])["stake"] == 5
+    assert len(buffered_engine.query("STAKE", ["type"])) == 1
+    assert buffered_engine.generation == 1
+
+
+def test_buffer_size_triggers_commit():
+    clear_indices()
+    engine = PosModelEngine(pos_schema(), buffer_size=2, buffer_seconds=60)
+    engine.index_documents(
+        [{"id": "abc", "type": "STAKE", "account_id": "alice", "stake": 3}]
+    )
+    assert engine.generation == 0
+    engine.index_documents(
+        [{"id": "abd", "type": "STAKE", "account_id": "bob", "stake": 3}]
+    )
+    assert engine.generation == 1
+    assert engine.get_index_size() == 2
+    engine.close()
+    clear_indices()
+
+
+def test_buffer_delay_triggers_commit():
+    clear_indices()
+    engine = PosModelEngine(pos_schema(), buffer_size=100, buffer_seconds=0.05)
+    engine.index_documents(
+        [{"id": "abc", "type": "STAKE", "account_id": "alice", "stake": 3}]
+    )
+    time.sleep(0.5)
+    assert engine.pending_writes() == 0
+    assert engine.generation == 1
+    engine.close()
+    clear_indices()
+
+
+def test_buffered_engines_are_not_kept_alive():
+    clear_indices()
+    engine = PosModelEngine(pos_schema(), backend="memory", buffer_size=10)
+    engine_ref = weakref.ref(engine)
+    del engine
+    gc.collect()
+    assert engine_ref() is None
+    clear_indices()
+
+
+def test_flush_drops_writes_of_removed_store():
+    clear_indices()
+    engine = PosModelEngine(pos_schema(), buffer_size=10, buffer_seconds=60)
+    engine.index_documents(
+        [{"id": "abc", "type": "STAKE", "account_id": "alice", "stake": 3}]
+    )
+    clear_indices()
+    engine.flush()
+    assert engine.pending_writes() == 0
+    assert engine.generation == 0
+
+
+def test_iter_query_window(engine):
+    engine.index_documents(
+        [
+            {"id": f"id{idx}", "type": "STAKE", "account_id": f"acc{idx}", "stake": idx}
+            for idx in range(5)
+        ]
+    )
+    engine.delete_document("id", "id0")
+    docs = list(engine.iter_query("STAKE", ["type"], offset=1, limit=2))
+    assert [doc["stake"] for doc in docs] == [2, 3]
+    assert len(list(engine.iter_query("STAKE", ["type"]))) == 4
+    assert engine.query_at("STAKE", ["type"], highlight=False, idx=3)["stake"] == 4
+    with pytest.raises(IndexError):
+        engine.query_at("STAKE", ["type"], highlight=False, idx=4)
+
+
+def test_count(engine):
+    engine.index_documents(
+        [
+            {"id": f"id{idx}", "type": "STAKE", "account_id": f"acc{idx}", "stake": idx}
+            for idx in range(5)
+        ]
+    )
+    engine.delete_document("id", "id4")
+    assert engine.count("STAKE", ["type"]) == 4
+    assert engine.count("STAKE", ["type"], limit=1) == 1
+    assert engine.count("id3", ["id"]) == 1
+    assert engine.count("id4", ["id"]) == 0
+
+
+def test_buffered_iter_query_and_count(buffered_engine):
+    buffered_engine.index_documents(
+        [{"id": "abc", "type": "STAKE", "account_id": "alice", "stake": 3}]
+    )
+    buffered_engine.flush()
+    buffered_engine.delete_document("id", "abc")
+    buffered_engine.index_documents(
+        [{"id": "abd", "type": "STAKE", "account_id": "bob", "stake": 4}]
+    )
+    assert buffered_engine.count("STAKE", ["type"]) == 1
+    assert [doc["id"] for doc in buffered_engine.iter_query("STAKE", ["type"])] == [
+        "abd"
+    ]
+
+
+def test_structured_queries(engine):
+    engine.index_documents(
+        [
+            {"id": f"id{idx}", "type": "STAKE", "account_id": f"acc{idx}", "stake": idx}
+            for idx in range(5)
+        ]
+        + [{"id": "other", "type": "OTHER", "account_id": "acc9", "stake": 9}]
+    )
+    assert engine.query_at(Term("id", "id2"))["stake"] == 2
+    assert engine.count(Term("type", "STAKE")) == 5
+    docs = engine.query(Term("type", "STAKE") & Range("stake", 1, 3))
+    assert sorted(doc["stake"] for doc in docs) == [1, 2, 3]
+    docs = engine.query(Term("id", "id0") | Term("type", "OTHER"))
+    assert sorted(doc["id"] for doc in docs) == ["id0", "other"]
+    assert engine.count(Range("stake", low=4)) == 2
+    assert engine.count(Term("unknown", "x")) == 0
+
+
+def test_structured_queries_match_whole_values(engine):
+    engine.index_documents(
+        [
+            {"id": "a1", "type": "STAKE", "account_id": "alice", "stake": 1},
+            {"id": "a2", "type": "STAKE", "account_id": "Alice Smith", "stake": 2},
+            {"id": "a3", "type": "STAKE", "account_id": "10", "stake": 3},
+            {"id": "a4", "type": "STAKE", "account_id": "9", "stake": 4},
+        ]
+    )
+    # same results on every backend, text fields are not matched by their words
+    assert [doc["id"] for doc in engine.query(Term("account_id", "alice"))] == ["a1"]
+    assert engine.count(Term("account_id", "Alice Smith")) == 1
+    assert engine.count(Term("account_id", "smith")) == 0
+    # numeric bounds compare numerically, string bounds as strings
+    docs = engine.query(Range("account_id", 5, 20))
+    assert sorted(doc["id"] for doc in docs) == ["a3", "a4"]
+    docs = engine.query(Range("account_id", "1", "5"))
+    assert [doc["id"] for doc in docs] == ["a3"]
+    assert engine.count(Range("id", "a2", "a3")) == 2
+
+
+def test_structured_queries_see_pending_writes(buffered_engine):
+    buffered_engine.index_documents(
+        [{"id": "abc", "type": "STAKE", "account_id": "alice", "stake": 3}]
+    )
+    assert buffered_engine.query(Term("id", "abc") & Range("stake", 2, 4)) == [
+        {"id": "abc", "type": "STAKE", "account_id": "alice", "stake": 3}
+    ]
+
+
+def test_metrics_disabled():
+    clear_indices()
+    engine = PosModelEngine(pos_schema(), backend="memory", metrics=False)
+    assert engine.metrics is None
+
+
+def test_metrics_record_operations():
+    clear_indices()
+    engine = PosModelEngine(pos_schema(), backend="whoosh", buffer_size=0, metrics=True)
+    engine.index_documents(
+        [
+            {"id": "abc", "type": "STAKE", "account_id": "alice", "stake": 3},
+            {"id": "abd", "type": "STAKE", "account_id": "bob", "stake": 5},
+        ]
+    )
+    engine.delete_document("id", "abd")
+    assert len(list(engine.iter_query(Term("type", "STAKE")))) == 1
+    assert engine.count(Term("type", "STAKE")) == 1
+    assert len(engine.query("STAKE", ["type"])) == 1
+    metrics = engine.metrics.snapshot()
+    assert sorted(metrics) == ["commit", "count", "delete", "index", "query"]
+    assert metrics["index"]["count"] == 1
+    assert metrics["index"]["docs"] == 2
+    assert metrics["commit"]["count"] == 2
+    assert metrics["query"]["count"] == 2
+    assert metrics["query"]["docs"] == 2
+    assert sum(metrics["query"]["histogram"].values()) == 2
+    engine.metrics.reset()
+    assert engine.metrics.snapshot() == {}
+    engine.close()
+    clear_indices()
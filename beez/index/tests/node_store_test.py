@@ -0,0 +1,84 @@
+# pylint: skip-file
+import os
+import pytest
+import shutil
+from whoosh.fields import Schema, KEYWORD, ID, NUMERIC, TEXT
+from beez.index.index_engine import BlockIndexEngine, PosModelEngine
+from beez.index.node_store import NodeStore
+from beez.index.query import Term
+
+
+def clear_store():
+    shutil.rmtree("node_data", ignore_errors=True)
+
+
+def pos_schema():
+    return Schema(
+        id=ID(stored=True),
+        type=KEYWORD(stored=True),
+        account_id=TEXT(stored=True),
+        stake=NUMERIC(stored=True),
+    )
+
+
+def block_schema():
+    return Schema(
+        id=ID(stored=True),
+        type=KEYWORD(stored=True),
+        block_serialized=TEXT(stored=True),
+    )
+
+
+@pytest.fixture
+def engines():
+    clear_store()
+    yield (
+        BlockIndexEngine(block_schema(), backend="store", buffer_size=0),
+        PosModelEngine(pos_schema(), backend="store", buffer_size=0),
+    )
+    clear_store()
+
+
+def test_families_share_one_store(engines):
+    blocks, pos = engines
+    assert blocks.backend.store is pos.backend.store
+    assert "node.sqlite3" in os.listdir("node_data")
+    assert not os.path.exists("blocks_indices")
+    assert not os.path.exists("pos_indices")
+    assert blocks.backend.store.families() == ["blocks_index", "pos_index"]
+
+
+def test_batch_commits_families_at_once(engines):
+    blocks, pos = engines
+    store = blocks.backend.store
+    commits = store.commits
+    with blocks.batch():
+        blocks.index_documents([{"id": "0", "type": "BL", "block_serialized": "{}"}])
+        pos.index_documents(
+            [{"id": "abc", "type": "STAKE", "account_id": "alice", "stake": 1}]
+        )
+        assert pos.count(Term("type", "STAKE")) == 1
+    assert store.commits == commits + 1
+    assert blocks.count(Term("type", "BL")) == 1
+    assert pos.count(Term("type", "STAKE")) == 1
+
+
+def test_batch_rolls_back_families_on_error(engines):
+    blocks, pos = engines
+    with pytest.raises(RuntimeError):
+        with pos.batch():
+            blocks.index_documents([{"id": "0", "type": "BL", "block_serialized": "{}"}])
+            pos.index_documents(
+                [{"id": "abc", "type": "STAKE", "account_id": "alice", "stake": 1}]
+            )
+            raise RuntimeError("abort")
+    assert blocks.get_index_size() == 0
+    assert pos.get_index_size() == 0
+
+
+def test_removed_store_is_reopened(engines):
+    blocks, _ = engines
+    store = NodeStore.open()
+    clear_store()
+    assert not blocks.exists()
+    assert NodeStore.open() is not store
@@ -0,0 +1,267 @@
+"""Beez blockchain - whoosh index storage backend."""
+
+import os
+import copy
+import json
+import itertools
+import threading
+from typing import Iterator, Optional, Sequence, Union
+from dotenv import load_dotenv
+from whoosh import index  # type: ignore
+from whoosh.fields import STORED, Schema  # type: ignore
+from whoosh.qparser import MultifieldParser  # type: ignore
+from whoosh.filedb.filestore import FileStorage  # type: ignore
+from whoosh.reading import SegmentReader  # type: ignore
+
+from beez.index.storage_backend import StorageBackend, decode_doc, encode_doc
+from beez.index.query import Query
+
+load_dotenv()  # load .env
+# docs merged by one compaction step, writers wait at most for one step
+LOCAL_INDEX_COMPACTION_MERGE_DOCS = 10000
+INDEX_COMPACTION_MERGE_DOCS = int(
+    os.getenv("INDEX_COMPACTION_MERGE_DOCS", str(LOCAL_INDEX_COMPACTION_MERGE_DOCS))
+)
+
+
+class WhooshBackend(StorageBackend):
+    """Full-text storage backend based on a whoosh file index."""
+
+    name = "whoosh"
+
+    def __init__(self, directory: str, index_name: str, schema) -> None:
+        super().__init__(directory, index_name, schema)
+        if not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+            self.index = FileStorage(directory).create_index(
+                self._storage_schema(schema), indexname=index_name
+            )
+        else:
+            self.index = FileStorage(directory).open_index(index_name)
+        self.schema = self.index.schema
+        # long-lived searcher, only reopened after a writer committed
+        self.searcher_lock = threading.Lock()
+        self.searcher = None
+        self.searcher_generation = -1
+        # whoosh allows one writer at a time, compaction and writes take turns
+        self.writer_lock = threading.Lock()
+
+    @property
+    def compressed(self) -> bool:
+        """Returns whether docs are stored as compressed bytes; indexes created
+        before the compressed layout keep raw as json text."""
+        return isinstance(self.schema["raw"], STORED)
+
+    @staticmethod
+    def _storage_schema(schema) -> Schema:
+        """Returns a copy of schema whose fields are indexed only, the whole doc is
+        stored once as compressed bytes in the untokenized raw field."""
+        fields = {}
+        for name, field in schema.items():
+            if name == "raw":
+                continue
+            field = copy.copy(field)
+            field.stored = False
+            fields[name] = field
+        return Schema(raw=STORED(), **fields)
+
+    def exists(self) -> bool:
+        """Returns whether the whoosh index still exists."""
+        return bool(index.exists_in(self.directory, indexname=self.index_name))
+
+    def write_batch(
+        self, deletes: Sequence[tuple[str, str]], docs: Sequence[dict]
+    ) -> None:
+        """Applies the deletes and then adds the docs with a single writer commit."""
+        with self.writer_lock:
+            writer = self.index.writer()
+            for field, term in deletes:
+                writer.delete_by_term(field, term)
+            for doc in docs:
+                data = {
+                    key: value
+                    for key, value in doc.items()
+                    if key in self.schema and key != "raw"
+                }
+                # the one stored copy of doc
+                data["raw"] = encode_doc(doc) if self.compressed else json.dumps(doc)
+                writer.add_document(**data)
+            self._commit(writer)
+
+    def _commit(self, writer, **kwargs) -> None:
+        """Commits the writer and moves the index to the next generation."""
+        writer.commit(**kwargs)
+        self.generation += 1
+
+    def _current_searcher(self):
+        """Returns the cached searcher, refreshing it if the index was committed since.
+        Must be called while holding the searcher lock."""
+        generation = self.generation
+        if self.searcher is None:
+            self.searcher = self.index.searcher()
+        elif self.searcher_generation != generation:
+            # refresh re-uses the readers of segments that did not change
+            self.searcher = self.searcher.refresh()
+        self.searcher_generation = generation
+        return self.searcher
+
+    def search(self, query: str, fields: Sequence, highlight: bool = True) -> list[dict]:
+        """Query index and returns docs matching query."""
+        search_results = []
+        with self.searcher_lock:
+            results = self._current_searcher().search(
+                MultifieldParser(fields, schema=self.schema).parse(query), limit=None
+            )
+            for result in results:
+                raw_data = decode_doc(result["raw"])
+                if highlight:
+                    for field in fields:
+                        text = raw_data.get(field)
+                        if text and isinstance(text, str):
+                            raw_data[field] = result.highlights(field, text=text) or text
+
+                search_results.append(raw_data)
+
+        return search_results
+
+    def _parse(self, query: Union[str, Query], fields: Sequence):
+        """Returns the whoosh query object, parsing query strings only."""
+        if isinstance(query, Query):
+            return query.to_whoosh(self.schema)
+        return MultifieldParser(fields, schema=self.schema).parse(query)
+
+    def iter_search(
+        self,
+        query: Union[str, Query],
+        fields: Sequence = (),
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> Iterator[dict]:
+        """Yields the docs matching query in index order without scoring them. Only
+        the docs inside the window are loaded and each one is decoded when reached."""
+        parsed_query = self._parse(query, fields)
+        stop = None if limit is None else offset + limit
+        if isinstance(query, Query) and not query.exact(self.schema):
+            yield from itertools.islice(self._filtered(query, parsed_query), offset, stop)
+            return
+        with self.searcher_lock:
+            searcher = self._current_searcher()
+            raw_docs = [
+                searcher.stored_fields(docnum)["raw"]
+                for docnum in itertools.islice(
+                    searcher.docs_for_query(parsed_query), offset, stop
+                )
+            ]
+        for raw_doc in raw_docs:
+            yield decode_doc(raw_doc)
+
+    def count(
+        self, query: Union[str, Query], fields: Sequence = (), limit: Optional[int] = None
+    ) -> int:
+        """Returns the number of docs matching query without loading any of them,
+        unless the docs have to be compared with the query."""
+        parsed_query = self._parse(query, fields)
+        if isinstance(query, Query) and not query.exact(self.schema):
+            return sum(1 for _ in itertools.islice(self._filtered(query, parsed_query), limit))
+        with self.searcher_lock:
+            searcher = self._current_searcher()
+            return sum(
+                1 for _ in itertools.islice(searcher.docs_for_query(parsed_query), limit)
+            )
+
+    def _filtered(self, query: Query, parsed_query) -> Iterator[dict]:
+        """Yields the docs matching the whoosh query that also match query."""
+        with self.searcher_lock:
+            searcher = self._current_searcher()
+            raw_docs = [
+                searcher.stored_fields(docnum)["raw"]
+                for docnum in searcher.docs_for_query(parsed_query)
+            ]
+        for raw_doc in raw_docs:
+            doc = decode_doc(raw_doc)
+            if query.matches(doc):
+                yield doc
+
+    def doc_count(self) -> int:
+        """Returns number of docs in index."""
+        with self.searcher_lock:
+            return int(self._current_searcher().doc_count_all())
+
+    def segment_stats(self) -> dict:
+        """Returns the number of segments, of docs and the ratio of deleted docs."""
+        # whoosh has no public accessor for the segments of the latest generation
+        segments = self.index._segments()  # pylint: disable=protected-access
+        docs = sum(segment.doc_count_all() for segment in segments)
+        deleted = sum(segment.deleted_count() for segment in segments)
+        return {
+            "segments": len(segments),
+            "docs": docs - deleted,
+            "deleted_ratio": deleted / docs if docs else 0.0,
+        }
+
+    def compact(self, merge_docs: Optional[int] = None) -> bool:
+        """Merges the smallest segments, dropping their deleted docs, in steps of
+        at most merge_docs docs. The writer lock is released between steps and a
+        step is given up while a write holds it, so writes never wait for more
+        than one step. Readers keep using their searcher until the next refresh
+        picks up the merged segments. Returns whether anything was merged."""
+        merge_docs = INDEX_COMPACTION_MERGE_DOCS if merge_docs is None else merge_docs
+        merged = False
+        # a non-blocking acquire gives way to writes, which a with block can't express
+        # pylint: disable-next=consider-using-with
+        while self.writer_lock.acquire(blocking=False):
+            try:
+                segment_ids = self._merge_candidates(merge_docs)
+                if not segment_ids:
+                    return merged
+                self._commit(
+                    self.index.writer(), mergetype=self._merge_segments(segment_ids)
+                )
+                merged = True
+            finally:
+                self.writer_lock.release()
+        return merged
+
+    @staticmethod
+    def _merge_segments(segment_ids: set[str]):
+        """Returns the whoosh merge policy that merges the segments with the given
+        ids into the new segment and keeps the other segments as they are."""
+
+        def merge_policy(writer, segments):
+            for segment in segments:
+                if segment.segment_id() in segment_ids:
+                    reader = SegmentReader(writer.storage, writer.schema, segment)
+                    writer.add_reader(reader)
+                    reader.close()
+            return [
+                segment for segment in segments if segment.segment_id() not in segment_ids
+            ]
+
+        return merge_policy
+
+    def _merge_candidates(self, merge_docs: int) -> set[str]:
+        """Returns the ids of the smallest segments holding at most merge_docs docs
+        together, empty if merging them would not reduce the segments or drop
+        deleted docs."""
+        # see segment_stats, the segments are only reachable through a private call
+        segments = sorted(
+            self.index._segments(),  # pylint: disable=protected-access
+            key=lambda segment: segment.doc_count_all(),
+        )
+        candidates = []
+        docs = 0
+        for segment in segments:
+            if docs + segment.doc_count_all() > merge_docs:
+                break
+            docs += segment.doc_count_all()
+            candidates.append(segment)
+        if len(candidates) == 1 and not candidates[0].has_deletions():
+            return set()
+        return {segment.segment_id() for segment in candidates}
+
+    def close(self) -> None:
+        """Closes the cached searcher."""
+        with self.searcher_lock:
+            if self.searcher is not None:
+                self.searcher.close()
+                self.searcher = None
@@ -24,11 +24,14 @@ from beez.socket.messages.message_challenge_transaction import MessageChallengeT
 from beez.socket.messages.message_challenge import MessageChallenge
 from beez.socket.messages.message_address_registration import MessageAddressRegistration
 from beez.block.blockchain import Blockchain
+from beez.block.pruner import Pruner
 from beez.socket.messages.message_block import MessageBlock
 from beez.socket.messages.message_blockchain import MessageBlockchain
 from beez.socket.messages.message import Message
 from beez.beez_utils import BeezUtils
 from beez.index.index_engine import AddressIndexEngine
+from beez.index.compaction import Compactor
+from beez.index.query import Term
 
 if TYPE_CHECKING:
     from beez.transaction.transaction import Transaction
@@ -63,6 +66,8 @@ class BeezNode(BasicNode):  # pylint: disable=too-many-instance-attributes
         self.gpus = GPUtil.getGPUs()
         self.cpus = os.cpu_count()
         self.blockchain = Blockchain()
+        # drops old block bodies when PRUNE_KEEP_BLOCKS or PRUNE_KEEP_DAYS is set
+        self.pruner = Pruner(self.blockchain)
         self.pending_blockchain_request = False
         self.pending_block_handling = False
         self.node_health = 0
@@ -76,9 +81,12 @@ class BeezNode(BasicNode):  # pylint: disable=too-many-instance-attributes
                 address=TEXT(stored=True),
             )
         )
+        # most looked up addresses are unknown, answer those without a query
+        self.address_index.enable_filter("address")
         self.address_buffer = {}
 
         self.start_health_monitoring()
+        Compactor.get_compactor().start()
         self.handle_address_registration(self.wallet.public_key_string())
 
     def start_api(self, port=None):
@@ -90,16 +98,8 @@ class BeezNode(BasicNode):  # pylint: disable=too-many-instance-attributes
 
     def start_p2p(self):
         """Starts the p2p communication thread."""
-        self.blockchain.in_memory_blocks = self.blockchain.blocks_from_index()
-        if (
-            len(self.blockchain.blocks()) > 0
-            and self.blockchain.blocks()[-1].header is not None
-        ):
-            self.blockchain.account_state_model = self.blockchain.blocks()[
-                -1
-            ].header.account_state_model
-            self.blockchain.block_count = self.blockchain.blocks()[-1].block_count
-            self.blockchain.beez_keeper = self.blockchain.blocks()[-1].header.beez_keeper
+        self.blockchain.load_from_index()
+        self.pruner.start()
         self.p2p.start_socket_communication(self)
 
     def start_health_monitoring(self):
@@ -135,42 +135,49 @@ class BeezNode(BasicNode):  # pylint: disable=too-many-instance-attributes
 
     def get_registered_addresses(self) -> list[dict[str, str]]:
         """Returns a dict of address to public-key-hex mappings."""
-        registrations = self.address_index.query(
-            "ADDR", ["type", "public_key_pem", "address"], highlight=True
-        )
+        registrations = self.address_index.query(Term("type", "ADDR"))
         return registrations
 
     def get_public_key_from_address(self, address: str) -> Optional[str]:
         """Returns the corresponding public_key_pem for a given address or None"""
-        registrations = self.address_index.query(
-            "ADDR", ["type", "public_key_pem", "address"], highlight=True
-        )
         public_key = None
-        for doc in registrations:
-            if doc["address"] == address:
-                public_key = doc["public_key_pem"]
+        if not self.address_index.may_contain("address", address):
+            return public_key
+        for doc in self.address_index.iter_query(Term("address", address), limit=1):
+            public_key = doc["public_key_pem"]
         return public_key
 
+    def block_signature_valid(self, block: Block) -> bool:
+        """Returns whether the block is signed by its registered forger."""
+        forger_public_key = self.get_public_key_from_address(block.forger_address)
+        if forger_public_key is None:
+            return False
+        return Wallet.signature_valid(block.payload(), block.signature, forger_public_key)
+
     # TODO: address request
 
     def handle_address_registration(self, public_key_pem: str, broadcast=True) -> str:
         """Handles an incomming address to public-key registration."""
         beez_address = BeezUtils.address_from_public_key(public_key_pem)
-        # 1. check if mapping already in index
-        public_key = self.get_public_key_from_address(beez_address)
-        # 2. add to index if not already exists
-        if not public_key and beez_address not in self.address_buffer:
-            self.address_buffer[beez_address] = public_key_pem
-            self.address_index.index_documents(
-                [
-                    {
-                        "id": public_key_pem,
-                        "type": "ADDR",
-                        "public_key_pem": public_key_pem,
-                        "address": beez_address,
-                    }
-                ]
-            )
+        # check and write within one commit
+        with self.address_index.batch():
+            # 1. check if mapping already in index
+            public_key = self.get_public_key_from_address(beez_address)
+            # 2. add to index if not already exists
+            registered = not public_key and beez_address not in self.address_buffer
+            if registered:
+                self.address_buffer[beez_address] = public_key_pem
+                self.address_index.index_documents(
+                    [
+                        {
+                            "id": public_key_pem,
+                            "type": "ADDR",
+                            "public_key_pem": public_key_pem,
+                            "address": beez_address,
+                        }
+                    ]
+                )
+        if registered:
             # 3. broadcast between nodes
             if broadcast:
                 address_registration_message = MessageAddressRegistration(
@@ -263,7 +270,7 @@ class BeezNode(BasicNode):  # pylint: disable=too-many-instance-attributes
 
             if (
                 not block_count_valid
-                and self.blockchain.blocks()[-1].block_count < block.block_count - 1
+                and self.blockchain.block_store.height() < block.block_count - 1
             ):
                 # ask to peers their state of the blockchain
                 self.request_chain()
@@ -277,16 +284,15 @@ class BeezNode(BasicNode):  # pylint: disable=too-many-instance-attributes
                 logger.info("About to add new block")
 
                 # Add the block to the Blockchain
-                self.blockchain.add_block(block)
-
-                self.transaction_pool.remove_from_pool(block.transactions)
+                if self.blockchain.add_block(block):
+                    self.transaction_pool.remove_from_pool(block.transactions)
 
-                # broadcast the block message
-                message = MessageBlock(
-                    self.p2p.socket_connector, MessageType.BLOCK, block.serialize()
-                )
-                encoded_message = BeezUtils.encode(message)
-                self.p2p.broadcast(encoded_message)
+                    # broadcast the block message
+                    message = MessageBlock(
+                        self.p2p.socket_connector, MessageType.BLOCK, block.serialize()
+                    )
+                    encoded_message = BeezUtils.encode(message)
+                    self.p2p.broadcast(encoded_message)
 
             self.pending_block_handling = False
 
@@ -367,11 +373,6 @@ class BeezNode(BasicNode):  # pylint: disable=too-many-instance-attributes
             # clean the transaction pool
             self.transaction_pool.remove_from_pool(block.transactions)
 
-            # Update the current version of the in-memory AccountStateModel and BeezKeeper
-            logger.info("GO!!!!!!")
-            self.blockchain.account_state_model = block.header.account_state_model
-            self.blockchain.beez_keeper = block.header.beez_keeper
-
             # broadcast the block to the network and the current state of the ChallengeKeeper!!!!
             message = MessageBlock(
                 self.p2p.socket_connector, MessageType.BLOCK, block.serialize()
@@ -399,29 +400,27 @@ class BeezNode(BasicNode):  # pylint: disable=too-many-instance-attributes
                 "Iterate on the blockchain until to sync the local blockchain with the received one"
             )
 
-            local_block_count = self.blockchain.blocks()[-1].block_count
-            received_chain_block_count = blockchain.blocks()[-1].block_count
+            local_block_count = self.blockchain.block_store.height()
+            received_chain_block_count = blockchain.block_store.height()
 
             if local_block_count < received_chain_block_count:
-                for _, block in enumerate(blockchain.blocks()):
-                    # we are interested only on blocks that are not in our blockchain
-                    if block.block_count > local_block_count:
-                        self.blockchain._append_block(  # pylint: disable=protected-access
-                            block
+                # we are interested only on blocks that are not in our blockchain,
+                # the state is rebuilt from them instead of taken from the peer
+                new_blocks = [
+                    block
+                    for block in blockchain.blocks()
+                    if block.block_count > local_block_count
+                ]
+                if not all(self.block_signature_valid(block) for block in new_blocks):
+                    logger.warning("Received blockchain rejected, a block signature is invalid")
+                elif self.blockchain.append_blocks(new_blocks):
+                    for block in new_blocks:
+                        # we have to clean up txpool, by id to keep the block undecoded
+                        self.transaction_pool.remove_ids_from_pool(
+                            block.transaction_ids()
                         )
-                        logger.warning("Here is the problem?")
-                        # Update the current version of the in-memory AccountStateModel
-                        # and BeezKeeper
-                        if block.header:
-                            self.blockchain.account_state_model = (
-                                block.header.account_state_model
-                            )
-                            self.blockchain.beez_keeper = block.header.beez_keeper
-
-                        self.transaction_pool.remove_from_pool(block.transactions)
-                    else:
-                        # we have to clean up txpool
-                        self.transaction_pool.remove_from_pool(block.transactions)
+                else:
+                    logger.warning("Received blockchain rejected, its state does not match")
             self.pending_blockchain_request = False
 
     def stop(self):
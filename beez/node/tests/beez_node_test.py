@@ -8,6 +8,8 @@ from beez.beez_utils import BeezUtils
 from beez.wallet.wallet import Wallet
 from beez.block.block import Block
 from beez.block.blockchain import Blockchain
+from beez.block.block_store import BlockStore
+from beez.block.header import Header
 from beez.transaction.challenge_tx import ChallengeTX
 from beez.socket.messages.message_type import MessageType
 from beez.challenge.challenge import Challenge
@@ -24,6 +26,8 @@ def clear_indices():
     shutil.rmtree("pos_indices", ignore_errors=True)
     shutil.rmtree("txp_indices", ignore_errors=True)
     shutil.rmtree("address_indices", ignore_errors=True)
+    shutil.rmtree("state_indices", ignore_errors=True)
+    shutil.rmtree("snapshots_indices", ignore_errors=True)
 
 def shared_func(a: int, b: int):
     return a+b
@@ -249,19 +253,18 @@ def test_handle_blockchain():
     )
     node.handle_address_registration(genesis_wallet.public_key_string())
     node.handle_address_registration(alice_wallet.public_key_string())
-    node.handle_transaction(exchange_tx)
 
-    local_blockchain = Blockchain()
-    local_blockchain.in_memory_blocks = local_blockchain.blocks_from_index()
-    block = Block(
-        None,
-        [exchange_tx],
-        BeezUtils.hash(local_blockchain.blocks()[-1].payload()).hexdigest(),
-        BeezUtils.address_from_public_key(genesis_wallet.public_key_string()),
-        1,
-    )
-    local_blockchain.add_block(block)
-    
+    local_blockchain = Blockchain(index=False)
+    block = local_blockchain.mint_block([exchange_tx], genesis_wallet)
+
+    # a block whose header was rewritten in transit breaks its signature
+    forged_blockchain = Blockchain(index=False)
+    forged_block = Block.deserialize(block.serialize())
+    forged_block.header = Header(block.header.state_root, {"mallory": 10**6})
+    forged_blockchain.block_store = BlockStore(forged_blockchain.blocks() + [forged_block])
+    node.pending_blockchain_request = True
+    node.handle_blockchain(forged_blockchain)
+    assert len(node.blockchain.blocks()) == 1
 
     # should be added to the node's blockchain
     node.pending_blockchain_request = True
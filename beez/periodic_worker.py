@@ -0,0 +1,50 @@
+"""Beez blockchain - background workers running at a fixed interval."""
+
+import threading
+from typing import Optional
+
+
+class PeriodicWorker:
+    """
+    Runs run_once on a daemon thread every interval seconds until stopped.
+
+    Subclasses implement run_once and may override enabled to keep the thread
+    from starting; an interval of 0 or less disables the thread as well.
+    """
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def enabled(self) -> bool:
+        """Returns whether the worker has anything to do."""
+        return True
+
+    def run_once(self) -> int:
+        """Does one round of work."""
+        raise NotImplementedError
+
+    def running(self) -> bool:
+        """Returns whether the background thread is running."""
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self) -> None:
+        """Starts the background thread unless disabled or already running."""
+        if not self.enabled() or self.interval <= 0 or self.running():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        """Stops the background thread."""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def _run(self) -> None:
+        """Calls run_once every interval seconds until stopped."""
+        while not self.stop_event.wait(self.interval):
+            self.run_once()
@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 from typing import TYPE_CHECKING, Any
+from array import array
 import threading
 from loguru import logger
 
@@ -14,11 +15,27 @@ class AccountStateModel:
     The account state model keeps the states of the balances of the wallets in the Blockchain.
     Every time that a block is added to the Blockchain, the ASM will update the wallet balances
     based on the transactions accured.
+
+    Accounts are numbered in order of appearance: slots maps an address to its
+    number and the balance of the account is stored at that position of an array
+    of 64 bit integers, so reading and updating a balance takes constant time.
+
+    Between begin() and commit() or rollback() the previous balance of every
+    changed slot is journaled, so a rollback costs the number of changed
+    accounts. Journals nest.
     """
 
     def __init__(self):
-        self.accounts_index = []
-        self.balance_index = {}
+        # address -> slot
+        self.slots: dict[str, int] = {}
+        # slot -> address
+        self.accounts_index: list[str] = []
+        # slot -> balance
+        self.balance_slots = array("q")
+        # balance changes since the last take_deltas
+        self.balance_deltas: dict[str, int] = {}
+        # per begin(): account count, previous balances by slot, previous deltas
+        self.journal: list[tuple[int, dict[int, int], dict[str, int]]] = []
 
     def start(self):
         """Start status thread."""
@@ -28,7 +45,6 @@ class AccountStateModel:
 
     def serialize(self) -> dict[str,Any]:
         """Serializes account state model to json."""
-        logger.info(f"accounts: {self.accounts()}")
         return {"accounts": self.accounts(), "balances": self.balances()}
 
     @staticmethod
@@ -40,15 +56,17 @@ class AccountStateModel:
 
     def _deserialize(self, serialized_balances, index=True):  # pylint: disable=unused-argument
         """Private deserialize helper."""
+        self.slots = {}
         self.accounts_index = []
-        self.balance_index = {}
+        self.balance_slots = array("q")
         for acc_id, bal in serialized_balances.items():
-            self.update_balance(acc_id, bal)
+            self.balance_slots[self.slot(acc_id)] += bal
+        self.balance_deltas = {}
         return self
 
     def balances(self) -> dict[str, int]:
         """Returns a dict containing a mapping from account to balance."""
-        return self.balance_index
+        return dict(zip(self.accounts_index, self.balance_slots))
 
     def accounts(self) -> list[str]:
         """Returns a list of all account ids."""
@@ -58,24 +76,75 @@ class AccountStateModel:
         """Logs the current status of the account state model."""
         logger.info("Not yet implemented")
 
+    def slot(self, address: str) -> int:
+        """Returns the slot of the account, adding it with a zero balance."""
+        slot = self.slots.get(address)
+        if slot is None:
+            slot = len(self.accounts_index)
+            self.slots[address] = slot
+            self.accounts_index.append(address)
+            self.balance_slots.append(0)
+        return slot
+
     def add_account(self, address: str):
         """Adds a new account to the account state model and initializes the balance to 0."""
-        logger.info("Adding account: %s", address)
-        if address not in self.accounts_index:
-            self.accounts_index.append(address)
-            self.balance_index[address] = 0
+        self.slot(address)
 
     def get_balance(self, address: str):
         """Returns the balance of the given account."""
-        if address not in self.accounts_index:
-            self.add_account(address)
-        return self.balance_index[address]
+        return self.balance_slots[self.slot(address)]
 
     def update_balance(self, address: str, amount: int):
         """Updates the balance of account by amount."""
-        logger.info("Update balance: %s, amount: %s", address, str(amount))
-        if address not in self.accounts_index:
-            self.add_account(address)
-
-        old_balance = self.get_balance(address)
-        self.balance_index[address] = old_balance + amount
+        slot = self.slot(address)
+        if self.journal:
+            account_count, previous_balances, previous_deltas = self.journal[-1]
+            if slot < account_count and slot not in previous_balances:
+                previous_balances[slot] = self.balance_slots[slot]
+            if address not in previous_deltas:
+                previous_deltas[address] = self.balance_deltas.get(address, 0)
+        self.balance_slots[slot] += amount
+        self.balance_deltas[address] = self.balance_deltas.get(address, 0) + amount
+
+    def begin(self):
+        """Starts journaling the balance changes."""
+        self.journal.append((len(self.accounts_index), {}, {}))
+
+    def commit(self):
+        """Keeps the changes since the matching begin()."""
+        _, previous_balances, previous_deltas = self.journal.pop()
+        if self.journal:
+            # the outer journal keeps its own older values
+            outer_count, outer_balances, outer_deltas = self.journal[-1]
+            for slot, balance in previous_balances.items():
+                if slot < outer_count:
+                    outer_balances.setdefault(slot, balance)
+            for address, delta in previous_deltas.items():
+                outer_deltas.setdefault(address, delta)
+
+    def rollback(self):
+        """Undoes the changes since the matching begin()."""
+        account_count, previous_balances, previous_deltas = self.journal.pop()
+        for address in self.accounts_index[account_count:]:
+            del self.slots[address]
+        del self.accounts_index[account_count:]
+        del self.balance_slots[account_count:]
+        for slot, balance in previous_balances.items():
+            self.balance_slots[slot] = balance
+        for address, delta in previous_deltas.items():
+            if delta:
+                self.balance_deltas[address] = delta
+            else:
+                self.balance_deltas.pop(address, None)
+
+    def take_deltas(self) -> dict[str, int]:
+        """Returns the non-zero balance changes since the last call and resets them."""
+        if self.journal:
+            previous_deltas = self.journal[-1][2]
+            for address, delta in self.balance_deltas.items():
+                previous_deltas.setdefault(address, delta)
+        deltas = {
+            address: amount for address, amount in self.balance_deltas.items() if amount
+        }
+        self.balance_deltas = {}
+        return deltas
@@ -0,0 +1,80 @@
+"""Beez blockchain - balance history."""
+
+from __future__ import annotations
+from typing import TYPE_CHECKING, Iterable, Union
+from array import array
+from bisect import bisect_right
+
+if TYPE_CHECKING:
+    from beez.block.block import Block
+
+
+class BalanceHistory:
+    """
+    Balances of every account at every height of the chain.
+
+    Only the heights at which the balance of an account changed are kept, each
+    with the balance reached at that height, as two arrays of 64 bit integers
+    per account. The balance at any height is found by bisecting the heights,
+    in O(log versions) and without decoding a block.
+
+    Blocks loaded from the block log are deferred: their headers, verified when
+    the blocks were appended, are only decoded on the first lookup.
+    """
+
+    def __init__(self):
+        # address -> heights at which the balance changed
+        self.heights: dict[str, array] = {}
+        # address -> balance reached at each of those heights
+        self.balances: dict[str, array] = {}
+        # (height, balance deltas or block whose header holds them) not recorded yet
+        self.deferred: list[tuple[int, Union[dict[str, int], Block]]] = []
+
+    def record(self, height: int, balance_deltas: dict[str, int]) -> None:
+        """Adds the balance changes made by the block at height, which must not
+        be below the heights recorded so far."""
+        if self.deferred:
+            self.deferred.append((height, balance_deltas))
+            return
+        self._apply(height, balance_deltas)
+
+    def defer(self, blocks: Iterable[Block]) -> None:
+        """Adds the balance changes in the headers of blocks on the first lookup."""
+        self.deferred.extend((block.block_count, block) for block in blocks)
+
+    def _apply(self, height: int, balance_deltas: dict[str, int]) -> None:
+        for address, amount in balance_deltas.items():
+            heights = self.heights.get(address)
+            if heights is None:
+                heights = self.heights[address] = array("q")
+                self.balances[address] = array("q")
+            balances = self.balances[address]
+            if heights and heights[-1] == height:
+                balances[-1] += amount
+                continue
+            heights.append(height)
+            balances.append((balances[-1] if balances else 0) + amount)
+
+    def _catch_up(self) -> None:
+        """Records the deferred balance changes."""
+        deferred, self.deferred = self.deferred, []
+        for height, source in deferred:
+            if isinstance(source, dict):
+                self._apply(height, source)
+            elif source.header is not None:
+                self._apply(height, source.header.balance_deltas)
+
+    def balance(self, address: str, height: int) -> int:
+        """Returns the balance of address after the block at height."""
+        self._catch_up()
+        heights = self.heights.get(address)
+        if heights is None:
+            return 0
+        position = bisect_right(heights, height)
+        return self.balances[address][position - 1] if position else 0
+
+    def versions(self, address: str) -> list[tuple[int, int]]:
+        """Returns the heights at which the balance of address changed, each with
+        the balance reached."""
+        self._catch_up()
+        return list(zip(self.heights.get(address, []), self.balances.get(address, [])))
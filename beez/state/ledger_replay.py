@@ -0,0 +1,154 @@
+"""Beez blockchain - bulk ledger replay."""
+
+from __future__ import annotations
+from typing import TYPE_CHECKING, Iterable
+from array import array
+import numpy as np
+
+from beez.transaction.transaction_type import TransactionType
+
+if TYPE_CHECKING:
+    from beez.block.block import Block
+    from beez.state.account_state_model import AccountStateModel
+
+# values of the type column
+EXCHANGE = 0
+TRANSFER = 1
+STAKE = 2
+CHALLENGE = 3
+
+# typecodes of the transaction columns, numpy reads them as the same dtypes
+COLUMNS = {"senders": "q", "receivers": "q", "amounts": "q", "types": "b"}
+
+TYPE_CODES = {
+    TransactionType.EXCHANGE.name: EXCHANGE,
+    TransactionType.STAKE.name: STAKE,
+    TransactionType.CHALLENGE.name: CHALLENGE,
+}
+
+
+class LedgerReplay:
+    """
+    Replays the balance changes of a range of blocks on columnar arrays.
+
+    The transactions are loaded once into arrays of sender slot, receiver slot,
+    amount and type, then every block is applied with a single scatter-add
+    instead of executing its transactions one by one. The balance changes are
+    the ones of Blockchain.execute_transaction; stakes and new challenges are
+    collected for the caller to apply to the proof of stake and the keeper.
+    """
+
+    def __init__(self, account_state_model: AccountStateModel) -> None:
+        self.account_state_model = account_state_model
+        self.block_counts: list[int] = []
+        # block i owns the transactions offsets[i]:offsets[i + 1]
+        self.offsets = array("q", [0])
+        self.columns = {name: array(typecode) for name, typecode in COLUMNS.items()}
+        # (public key, stake) of the stake transactions
+        self.stakes: list[tuple[str, int]] = []
+        # serialized challenges of the challenge transactions
+        self.challenges: list[dict] = []
+
+    def load(self, blocks: Iterable[Block]) -> LedgerReplay:
+        """Appends the transactions of blocks to the columns."""
+        slot = self.account_state_model.slot
+        for block in blocks:
+            for tx_json in block.transactions_json():
+                sender = tx_json["senderAddress"]
+                receiver = tx_json["receiverAddress"]
+                transaction_type = TYPE_CODES.get(tx_json["type"], TRANSFER)
+                self.columns["senders"].append(slot(sender))
+                self.columns["receivers"].append(slot(receiver))
+                self.columns["amounts"].append(tx_json["amount"])
+                self.columns["types"].append(transaction_type)
+                if sender == receiver and transaction_type == STAKE:
+                    self.stakes.append((sender, tx_json["amount"]))
+                elif sender == receiver and transaction_type == CHALLENGE:
+                    if "challenge" in tx_json:
+                        self.challenges.append(tx_json["challenge"])
+            self.block_counts.append(block.block_count)
+            self.offsets.append(len(self.columns["senders"]))
+        return self
+
+    def run(self) -> list[tuple[int, int]]:
+        """Applies the loaded blocks to the account state model and returns the
+        block count and position of every transaction its sender could not
+        cover at that point of its block."""
+        columns = {
+            name: np.frombuffer(column, dtype=column.typecode)
+            for name, column in self.columns.items()
+        }
+        slots, deltas = LedgerReplay._events(columns)
+        # exchanges are minted, every other transaction needs a covering balance
+        needs_cover = columns["types"] != EXCHANGE
+
+        balances = np.array(self.account_state_model.balance_slots, dtype=np.int64)
+        uncovered: list[tuple[int, int]] = []
+        for block_position, block_count in enumerate(self.block_counts):
+            start = self.offsets[block_position]
+            end = self.offsets[block_position + 1]
+            if start == end:
+                continue
+            block_slots = slots[2 * start : 2 * end]
+            block_deltas = deltas[2 * start : 2 * end]
+            short = needs_cover[start:end] & (
+                self._balances_before(balances, block_slots, block_deltas)[0::2]
+                < columns["amounts"][start:end]
+            )
+            uncovered.extend(
+                (block_count, int(position)) for position in np.flatnonzero(short)
+            )
+            np.add.at(balances, block_slots, block_deltas)
+        self._apply(balances)
+        return uncovered
+
+    def _apply(self, balances: np.ndarray) -> None:
+        """Moves the account state model to the replayed balances through
+        update_balance, so an open journal can roll the replay back."""
+        initial_balances = np.frombuffer(
+            self.account_state_model.balance_slots, dtype=np.int64
+        ).copy()
+        accounts = self.account_state_model.accounts_index
+        for changed_slot in np.flatnonzero(balances != initial_balances):
+            self.account_state_model.update_balance(
+                accounts[changed_slot],
+                int(balances[changed_slot] - initial_balances[changed_slot]),
+            )
+
+    @staticmethod
+    def _events(columns: dict[str, np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the slot and the balance change of one debit and one credit
+        event per transaction, in transaction order."""
+        senders = columns["senders"]
+        amounts = columns["amounts"]
+        # stakes and challenges only debit, and only when sent to oneself
+        moves = (columns["types"] == EXCHANGE) | (columns["types"] == TRANSFER)
+        debited = np.where(moves | (senders == columns["receivers"]), amounts, 0)
+        credited = np.where(moves, amounts, 0)
+        slots = np.empty(2 * len(senders), dtype=np.int64)
+        slots[0::2] = senders
+        slots[1::2] = columns["receivers"]
+        deltas = np.empty(2 * len(senders), dtype=np.int64)
+        deltas[0::2] = -debited
+        deltas[1::2] = credited
+        return slots, deltas
+
+    @staticmethod
+    def _balances_before(
+        balances: np.ndarray, slots: np.ndarray, deltas: np.ndarray
+    ) -> np.ndarray:
+        """Returns the balance of the slot of every event right before it, given
+        the balances before the first event."""
+        order = np.argsort(slots, kind="stable")
+        sorted_slots = slots[order]
+        sorted_deltas = deltas[order]
+        # sum of the events before each event, over all slots
+        preceding = np.cumsum(sorted_deltas) - sorted_deltas
+        group_starts = np.flatnonzero(
+            np.concatenate(([True], sorted_slots[1:] != sorted_slots[:-1]))
+        )
+        group_lengths = np.diff(np.append(group_starts, len(sorted_slots)))
+        preceding -= np.repeat(preceding[group_starts], group_lengths)
+        before = np.empty_like(preceding)
+        before[order] = balances[sorted_slots] + preceding
+        return before
@@ -0,0 +1,117 @@
+"""Beez blockchain - periodic state snapshots."""
+
+from __future__ import annotations
+from typing import Iterator, Optional
+import os
+import json
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()  # load .env
+LOCAL_SNAPSHOT_DIRECTORY = "snapshots_indices"
+SNAPSHOT_DIRECTORY = os.getenv("SNAPSHOT_DIRECTORY", LOCAL_SNAPSHOT_DIRECTORY)
+# blocks between two snapshots, 0 disables snapshots
+LOCAL_SNAPSHOT_INTERVAL = 100
+SNAPSHOT_INTERVAL = int(os.getenv("SNAPSHOT_INTERVAL", str(LOCAL_SNAPSHOT_INTERVAL)))
+# number of snapshots kept, older ones are removed
+LOCAL_SNAPSHOT_RETENTION = 2
+SNAPSHOT_RETENTION = int(os.getenv("SNAPSHOT_RETENTION", str(LOCAL_SNAPSHOT_RETENTION)))
+
+SNAPSHOT_PREFIX = "snapshot-"
+SNAPSHOT_SUFFIX = ".json"
+
+
+class SnapshotStore:
+    """
+    Snapshots of the chain state taken every interval blocks.
+
+    A snapshot holds the balances, the stakes, the challenges and the height,
+    hash and state root of the tip it was taken at. A restarting node loads the
+    newest snapshot matching its block log and replays only the later blocks.
+    Only the newest retention snapshots are kept.
+    """
+
+    stores: dict[str, SnapshotStore] = {}
+    stores_lock = threading.Lock()
+
+    def __init__(
+        self,
+        directory: str,
+        interval: Optional[int] = None,
+        retention: Optional[int] = None,
+    ) -> None:
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.interval = SNAPSHOT_INTERVAL if interval is None else interval
+        self.retention = max(1, SNAPSHOT_RETENTION if retention is None else retention)
+        self.lock = threading.Lock()
+
+    # Singleton
+    @staticmethod
+    def open(directory: Optional[str] = None) -> SnapshotStore:
+        """Returns the store of directory, reopening it if it was removed."""
+        path = os.path.abspath(directory or SNAPSHOT_DIRECTORY)
+        with SnapshotStore.stores_lock:
+            store = SnapshotStore.stores.get(path)
+            if store is None or not store.exists():
+                store = SnapshotStore(path)
+                SnapshotStore.stores[path] = store
+            return store
+
+    def exists(self) -> bool:
+        """Returns whether the directory of the store still exists."""
+        return os.path.isdir(self.directory)
+
+    def _snapshot_path(self, height: int) -> str:
+        return os.path.join(
+            self.directory, f"{SNAPSHOT_PREFIX}{height:012d}{SNAPSHOT_SUFFIX}"
+        )
+
+    def heights(self) -> list[int]:
+        """Returns the heights of the stored snapshots in ascending order."""
+        return sorted(
+            int(name[len(SNAPSHOT_PREFIX) : -len(SNAPSHOT_SUFFIX)])
+            for name in os.listdir(self.directory)
+            if name.startswith(SNAPSHOT_PREFIX) and name.endswith(SNAPSHOT_SUFFIX)
+        )
+
+    def due(self, height: int) -> bool:
+        """Returns whether a snapshot should be taken at height."""
+        if self.interval <= 0:
+            return False
+        heights = self.heights()
+        return not heights or height - heights[-1] >= self.interval
+
+    def save(self, snapshot: dict) -> None:
+        """Stores the snapshot and removes the ones beyond the retention."""
+        path = self._snapshot_path(snapshot["height"])
+        temporary_path = f"{path}.tmp"
+        with self.lock:
+            with open(temporary_path, "w", encoding="utf-8") as snapshot_file:
+                json.dump(snapshot, snapshot_file)
+                snapshot_file.flush()
+                os.fsync(snapshot_file.fileno())
+            os.replace(temporary_path, path)
+            for height in self.heights()[: -self.retention]:
+                os.remove(self._snapshot_path(height))
+
+    def load(self, height: int) -> Optional[dict]:
+        """Returns the snapshot taken at height, None if it is missing or damaged."""
+        try:
+            with open(self._snapshot_path(height), "r", encoding="utf-8") as snapshot_file:
+                return json.load(snapshot_file)
+        except (OSError, ValueError):
+            return None
+
+    def newest_first(self) -> Iterator[dict]:
+        """Yields the readable snapshots from the newest to the oldest."""
+        for height in reversed(self.heights()):
+            snapshot = self.load(height)
+            if snapshot is not None:
+                yield snapshot
+
+    def clear(self) -> None:
+        """Removes all snapshots."""
+        with self.lock:
+            for height in self.heights():
+                os.remove(self._snapshot_path(height))
@@ -0,0 +1,191 @@
+"""Beez blockchain - state store."""
+
+from __future__ import annotations
+from typing import Optional
+import os
+import json
+import threading
+from dotenv import load_dotenv
+
+from beez.beez_utils import BeezUtils
+from beez.state.account_state_model import AccountStateModel
+from beez.challenge.beez_keeper import BeezKeeper
+
+load_dotenv()  # load .env
+LOCAL_STATE_STORE_DIRECTORY = "state_indices"
+STATE_STORE_DIRECTORY = os.getenv("STATE_STORE_DIRECTORY", LOCAL_STATE_STORE_DIRECTORY)
+
+STATE_FILE = "state.json"
+DELTAS_FILE = "state.deltas"
+# deltas appended before the full state is written again
+LOCAL_STATE_STORE_MAX_DELTAS = 100
+STATE_STORE_MAX_DELTAS = int(
+    os.getenv("STATE_STORE_MAX_DELTAS", str(LOCAL_STATE_STORE_MAX_DELTAS))
+)
+
+
+def state_root(
+    account_state_model: AccountStateModel, beez_keeper: BeezKeeper
+) -> str:
+    """Returns the hex digest committing to the non-zero balances and the ids of
+    the kept challenges."""
+    # accounts only read so far have a zero balance and may differ between peers
+    balances = {
+        address: balance
+        for address, balance in sorted(account_state_model.balances().items())
+        if balance
+    }
+    challenges = sorted(beez_keeper.challanges())
+    return BeezUtils.hash({"balances": balances, "challenges": challenges}).hexdigest()
+
+
+class StateStore:
+    """
+    Full account state and challenges at the chain tip.
+
+    Block headers only carry the state root and the balance deltas of their
+    block, the state itself is kept once here. The full state file is replaced
+    atomically, so a crash leaves either the previous or the new state behind.
+    In between full writes every block only appends its balance deltas, and the
+    challenges when they changed, to a delta file replayed on load; a torn last
+    record is ignored.
+    """
+
+    stores: dict[str, StateStore] = {}
+    stores_lock = threading.Lock()
+
+    def __init__(self, directory: str, max_deltas: Optional[int] = None) -> None:
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.path = os.path.join(directory, STATE_FILE)
+        self.max_deltas = STATE_STORE_MAX_DELTAS if max_deltas is None else max_deltas
+        self.lock = threading.Lock()
+        # height, challenges and delta count of the last write of this process
+        self.height: Optional[int] = None
+        self.challenges: Optional[dict] = None
+        self.delta_count = 0
+
+    @property
+    def deltas_path(self) -> str:
+        """Returns the path of the delta file."""
+        return os.path.join(self.directory, DELTAS_FILE)
+
+    # Singleton
+    @staticmethod
+    def open(directory: Optional[str] = None) -> StateStore:
+        """Returns the store of directory, reopening it if it was removed."""
+        path = os.path.abspath(directory or STATE_STORE_DIRECTORY)
+        with StateStore.stores_lock:
+            store = StateStore.stores.get(path)
+            if store is None or not store.exists():
+                store = StateStore(path)
+                StateStore.stores[path] = store
+            return store
+
+    def exists(self) -> bool:
+        """Returns whether the directory of the store still exists."""
+        return os.path.isdir(self.directory)
+
+    def save(
+        self,
+        height: int,
+        account_state_model: AccountStateModel,
+        beez_keeper: BeezKeeper,
+        root: Optional[str] = None,
+    ) -> str:
+        """Replaces the stored state with the full state at height and returns its
+        root, which is computed unless given."""
+        root = root or state_root(account_state_model, beez_keeper)
+        serialized_state = {
+            "height": height,
+            "stateRoot": root,
+            "balances": account_state_model.balances(),
+            "beezKeeper": beez_keeper.serialize(),
+        }
+        temporary_path = f"{self.path}.tmp"
+        with self.lock:
+            with open(temporary_path, "w", encoding="utf-8") as state_file:
+                json.dump(serialized_state, state_file)
+                state_file.flush()
+                os.fsync(state_file.fileno())
+            os.replace(temporary_path, self.path)
+            # the deltas are part of the new state now
+            if os.path.exists(self.deltas_path):
+                os.remove(self.deltas_path)
+            self.height = height
+            self.challenges = serialized_state["beezKeeper"]
+            self.delta_count = 0
+        return root
+
+    def append(
+        self,
+        height: int,
+        balance_deltas: dict[str, int],
+        account_state_model: AccountStateModel,
+        beez_keeper: BeezKeeper,
+        root: Optional[str] = None,
+    ) -> str:
+        """Stores the state at height as the balance deltas of its block on top of
+        the stored state at height - 1 and returns its root. Writes the full state
+        instead when the stored state is not the one at height - 1 or the delta
+        file is full."""
+        if self.height != height - 1 or self.delta_count >= self.max_deltas:
+            return self.save(height, account_state_model, beez_keeper, root)
+        root = root or state_root(account_state_model, beez_keeper)
+        delta = {"height": height, "stateRoot": root, "balanceDeltas": balance_deltas}
+        challenges = beez_keeper.serialize()
+        if challenges != self.challenges:
+            delta["beezKeeper"] = challenges
+        with self.lock:
+            with open(self.deltas_path, "a", encoding="utf-8") as deltas_file:
+                deltas_file.write(json.dumps(delta) + "\n")
+                deltas_file.flush()
+                os.fsync(deltas_file.fileno())
+            self.height = height
+            self.challenges = challenges
+            self.delta_count += 1
+        return root
+
+    def load(self) -> Optional[dict]:
+        """Returns the stored state with its deltas applied, None if nothing was
+        saved yet."""
+        with self.lock:
+            try:
+                with open(self.path, "r", encoding="utf-8") as state_file:
+                    saved_state = json.load(state_file)
+            except (OSError, ValueError):
+                return None
+            try:
+                with open(self.deltas_path, "r", encoding="utf-8") as deltas_file:
+                    lines = deltas_file.readlines()
+            except OSError:
+                lines = []
+        balances = saved_state["balances"]
+        for line in lines:
+            try:
+                delta = json.loads(line)
+            except ValueError:
+                # torn write of the last delta
+                break
+            if delta["height"] <= saved_state["height"]:
+                # written before the full state was replaced
+                continue
+            if delta["height"] != saved_state["height"] + 1:
+                break
+            for address, amount in delta["balanceDeltas"].items():
+                balances[address] = balances.get(address, 0) + amount
+            saved_state["height"] = delta["height"]
+            saved_state["stateRoot"] = delta["stateRoot"]
+            if "beezKeeper" in delta:
+                saved_state["beezKeeper"] = delta["beezKeeper"]
+        return saved_state
+
+    def clear(self) -> None:
+        """Removes the stored state."""
+        with self.lock:
+            for path in (self.path, self.deltas_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self.height = None
+            self.challenges = None
+            self.delta_count = 0
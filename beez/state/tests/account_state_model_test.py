@@ -54,4 +54,62 @@ def test_get_balance(account_state_model):
 def test_update_balance(account_state_model):
     account_state_model.update_balance("public_key", 23)
     assert len(account_state_model.accounts()) == 1
-    assert account_state_model.get_balance("public_key") == 23
\ No newline at end of file
+    assert account_state_model.get_balance("public_key") == 23
+
+def test_take_deltas(account_state_model):
+    account_state_model.update_balance("alice", 10)
+    account_state_model.update_balance("bob", 5)
+    account_state_model.update_balance("bob", -5)
+    assert account_state_model.take_deltas() == {"alice": 10}
+    assert account_state_model.take_deltas() == {}
+
+
+def test_slots(account_state_model):
+    account_state_model.update_balance("alice", 10)
+    account_state_model.update_balance("bob", 5)
+    account_state_model.update_balance("alice", -3)
+    assert account_state_model.slots == {"alice": 0, "bob": 1}
+    assert list(account_state_model.balance_slots) == [7, 5]
+    assert account_state_model.balances() == {"alice": 7, "bob": 5}
+    assert account_state_model.accounts() == ["alice", "bob"]
+
+
+def test_deserialize_keeps_order():
+    local_account_state_model = AccountStateModel.deserialize({"bob": 2, "alice": 1})
+    assert local_account_state_model.accounts() == ["bob", "alice"]
+    assert local_account_state_model.get_balance("alice") == 1
+    assert local_account_state_model.take_deltas() == {}
+
+
+def test_rollback(account_state_model):
+    account_state_model.update_balance("alice", 10)
+    account_state_model.begin()
+    account_state_model.update_balance("alice", -4)
+    account_state_model.update_balance("bob", 4)
+    assert account_state_model.get_balance("alice") == 6
+    account_state_model.rollback()
+    assert account_state_model.balances() == {"alice": 10}
+    assert account_state_model.take_deltas() == {"alice": 10}
+
+
+def test_nested_commit_and_rollback(account_state_model):
+    account_state_model.update_balance("alice", 10)
+    account_state_model.begin()
+    account_state_model.update_balance("alice", -4)
+    account_state_model.begin()
+    account_state_model.update_balance("alice", -1)
+    account_state_model.update_balance("bob", 5)
+    account_state_model.commit()
+    assert account_state_model.balances() == {"alice": 5, "bob": 5}
+    account_state_model.rollback()
+    assert account_state_model.balances() == {"alice": 10}
+    assert account_state_model.journal == []
+
+
+def test_take_deltas_in_journal(account_state_model):
+    account_state_model.update_balance("alice", 10)
+    account_state_model.begin()
+    account_state_model.update_balance("bob", 3)
+    assert account_state_model.take_deltas() == {"alice": 10, "bob": 3}
+    account_state_model.rollback()
+    assert account_state_model.take_deltas() == {"alice": 10}
@@ -0,0 +1,44 @@
+# pylint: skip-file
+import pytest
+from beez.state.balance_history import BalanceHistory
+from beez.block.block import Block
+from beez.block.header import Header
+
+
+@pytest.fixture
+def balance_history():
+    history = BalanceHistory()
+    history.record(1, {"alice": 100})
+    history.record(3, {"alice": -40, "bob": 40})
+    history.record(3, {"bob": 5})
+    history.record(7, {"alice": 10})
+    yield history
+
+
+def test_balance(balance_history):
+    assert balance_history.balance("alice", 0) == 0
+    assert balance_history.balance("alice", 1) == 100
+    assert balance_history.balance("alice", 2) == 100
+    assert balance_history.balance("alice", 3) == 60
+    assert balance_history.balance("alice", 100) == 70
+    assert balance_history.balance("bob", 3) == 45
+    assert balance_history.balance("carol", 3) == 0
+
+
+def test_versions(balance_history):
+    assert balance_history.versions("alice") == [(1, 100), (3, 60), (7, 70)]
+    assert balance_history.versions("bob") == [(3, 45)]
+    assert balance_history.versions("carol") == []
+
+
+def test_deferred_blocks():
+    history = BalanceHistory()
+    block = Block(Header("root", {"alice": 100}), [], "last", "forger", 1)
+    decoded = Block.deserialize(block.serialize())
+    history.defer([decoded])
+    history.record(2, {"alice": -30})
+    # the header is decoded on the first lookup only
+    assert decoded.raw_header is not None
+    assert history.balance("alice", 1) == 100
+    assert history.balance("alice", 2) == 70
+    assert decoded.raw_header is None
@@ -0,0 +1,85 @@
+# pylint: skip-file
+import random
+from beez.block.block import Block
+from beez.transaction.transaction import Transaction
+from beez.transaction.transaction_type import TransactionType
+from beez.state.account_state_model import AccountStateModel
+from beez.state.ledger_replay import LedgerReplay
+
+
+def block(block_count, transactions):
+    return Block(None, transactions, "last hash", "forger", block_count)
+
+
+def transaction(sender, receiver, amount, transaction_type=TransactionType.TRANSFER):
+    return Transaction(sender, receiver, amount, transaction_type.name)
+
+
+def test_run():
+    account_state_model = AccountStateModel()
+    blocks = [
+        block(1, [transaction("genesis", "alice", 100, TransactionType.EXCHANGE)]),
+        block(2, []),
+        block(
+            3,
+            [
+                transaction("alice", "bob", 60),
+                transaction("alice", "carol", 60),
+                transaction("bob", "alice", 20),
+                transaction("alice", "alice", 10, TransactionType.STAKE),
+                transaction("bob", "carol", 5, TransactionType.STAKE),
+            ],
+        ),
+    ]
+
+    replay = LedgerReplay(account_state_model).load(blocks)
+    assert replay.run() == [(3, 1), (3, 3)]
+    assert account_state_model.balances() == {
+        "genesis": -100,
+        "alice": -10,
+        "bob": 40,
+        "carol": 60,
+    }
+    assert replay.stakes == [("alice", 10)]
+    assert account_state_model.take_deltas() == account_state_model.balances()
+
+
+def test_run_matches_sequential_execution():
+    rng = random.Random(7)
+    accounts = [f"account-{number}" for number in range(20)]
+    blocks = []
+    for block_count in range(1, 30):
+        transactions = [transaction("genesis", rng.choice(accounts), 50, TransactionType.EXCHANGE)]
+        for _ in range(rng.randrange(30)):
+            transactions.append(
+                transaction(rng.choice(accounts), rng.choice(accounts), rng.randrange(1, 40))
+            )
+        blocks.append(block(block_count, transactions))
+
+    balances = {}
+    expected_uncovered = []
+    for replayed_block in blocks:
+        for position, tx in enumerate(replayed_block.transactions):
+            if (
+                tx.transaction_type != TransactionType.EXCHANGE.name
+                and balances.get(tx.sender_address, 0) < tx.amount
+            ):
+                expected_uncovered.append((replayed_block.block_count, position))
+            balances[tx.sender_address] = balances.get(tx.sender_address, 0) - tx.amount
+            balances[tx.receiver_address] = balances.get(tx.receiver_address, 0) + tx.amount
+
+    account_state_model = AccountStateModel()
+    assert LedgerReplay(account_state_model).load(blocks).run() == expected_uncovered
+    assert account_state_model.balances() == balances
+
+
+def test_run_in_journal():
+    account_state_model = AccountStateModel()
+    account_state_model.update_balance("alice", 10)
+    account_state_model.begin()
+    LedgerReplay(account_state_model).load(
+        [block(1, [transaction("alice", "bob", 10)])]
+    ).run()
+    assert account_state_model.balances() == {"alice": 0, "bob": 10}
+    account_state_model.rollback()
+    assert account_state_model.balances() == {"alice": 10}
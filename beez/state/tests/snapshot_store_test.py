@@ -0,0 +1,56 @@
+# pylint: skip-file
+import os
+import pytest
+import shutil
+from beez.state.snapshot_store import SnapshotStore
+
+
+def clear_indices():
+    shutil.rmtree("snapshots_indices", ignore_errors=True)
+
+
+@pytest.fixture
+def snapshot_store():
+    clear_indices()
+    yield SnapshotStore("snapshots_indices", interval=10, retention=2)
+    clear_indices()
+
+
+def snapshot(height):
+    return {"height": height, "tipHash": f"hash-{height}", "balances": {"alice": height}}
+
+
+def test_due(snapshot_store):
+    assert snapshot_store.due(0)
+    snapshot_store.save(snapshot(0))
+    assert not snapshot_store.due(9)
+    assert snapshot_store.due(10)
+    assert not SnapshotStore("snapshots_indices", interval=0).due(10)
+
+
+def test_save_and_load(snapshot_store):
+    snapshot_store.save(snapshot(10))
+    assert snapshot_store.heights() == [10]
+    assert snapshot_store.load(10) == snapshot(10)
+    assert snapshot_store.load(20) is None
+
+
+def test_retention(snapshot_store):
+    for height in (0, 10, 20, 30):
+        snapshot_store.save(snapshot(height))
+    assert snapshot_store.heights() == [20, 30]
+    assert len(os.listdir("snapshots_indices")) == 2
+
+
+def test_newest_first_skips_damaged(snapshot_store):
+    snapshot_store.save(snapshot(10))
+    snapshot_store.save(snapshot(20))
+    with open(snapshot_store._snapshot_path(20), "w") as snapshot_file:
+        snapshot_file.write("{")
+    assert [item["height"] for item in snapshot_store.newest_first()] == [10]
+
+
+def test_clear(snapshot_store):
+    snapshot_store.save(snapshot(10))
+    snapshot_store.clear()
+    assert snapshot_store.heights() == []
@@ -0,0 +1,90 @@
+# pylint: skip-file
+import os
+import pytest
+import shutil
+from beez.state.state_store import StateStore, state_root
+from beez.state.account_state_model import AccountStateModel
+from beez.challenge.beez_keeper import BeezKeeper
+
+
+def clear_indices():
+    shutil.rmtree("state_indices", ignore_errors=True)
+
+
+@pytest.fixture
+def state_store():
+    clear_indices()
+    yield StateStore.open()
+    clear_indices()
+
+
+def test_load_empty(state_store):
+    assert state_store.load() is None
+
+
+def test_save_and_load(state_store):
+    account_state_model = AccountStateModel()
+    account_state_model.update_balance("alice", 10)
+    root = state_store.save(3, account_state_model, BeezKeeper())
+    assert root == state_root(account_state_model, BeezKeeper())
+    saved_state = state_store.load()
+    assert saved_state["height"] == 3
+    assert saved_state["stateRoot"] == root
+    assert saved_state["balances"] == {"alice": 10}
+    assert saved_state["beezKeeper"] == {}
+
+
+def test_save_replaces_state(state_store):
+    account_state_model = AccountStateModel()
+    state_store.save(0, account_state_model, BeezKeeper())
+    account_state_model.update_balance("bob", 4)
+    state_store.save(1, account_state_model, BeezKeeper())
+    assert state_store.load()["height"] == 1
+    assert os.listdir("state_indices") == ["state.json"]
+
+
+def test_open_after_removal(state_store):
+    state_store.save(0, AccountStateModel(), BeezKeeper())
+    clear_indices()
+    reopened = StateStore.open()
+    assert reopened is not state_store
+    assert reopened.load() is None
+
+
+def test_clear(state_store):
+    state_store.save(0, AccountStateModel(), BeezKeeper())
+    state_store.clear()
+    assert state_store.load() is None
+
+
+def test_append_deltas(state_store):
+    account_state_model = AccountStateModel()
+    account_state_model.update_balance("alice", 10)
+    state_store.save(0, account_state_model, BeezKeeper())
+    account_state_model.update_balance("alice", -4)
+    account_state_model.update_balance("bob", 4)
+    root = state_store.append(1, {"alice": -4, "bob": 4}, account_state_model, BeezKeeper())
+    assert sorted(os.listdir("state_indices")) == ["state.deltas", "state.json"]
+    saved_state = state_store.load()
+    assert saved_state["height"] == 1
+    assert saved_state["stateRoot"] == root
+    assert saved_state["balances"] == {"alice": 6, "bob": 4}
+
+    # a torn last delta is ignored
+    with open(state_store.deltas_path, "a", encoding="utf-8") as deltas_file:
+        deltas_file.write('{"height": 2, "stat')
+    assert state_store.load()["height"] == 1
+
+
+def test_append_writes_full_state(state_store):
+    state_store.max_deltas = 1
+    account_state_model = AccountStateModel()
+    # nothing stored at the previous height yet
+    state_store.append(0, {}, account_state_model, BeezKeeper())
+    assert os.listdir("state_indices") == ["state.json"]
+    account_state_model.update_balance("alice", 1)
+    state_store.append(1, {"alice": 1}, account_state_model, BeezKeeper())
+    account_state_model.update_balance("alice", 1)
+    state_store.append(2, {"alice": 1}, account_state_model, BeezKeeper())
+    assert os.listdir("state_indices") == ["state.json"]
+    assert state_store.load()["balances"] == {"alice": 2}
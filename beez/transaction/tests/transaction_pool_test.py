@@ -128,6 +128,10 @@ def test_remove_from_pool(transaction_pool):
     assert len(transaction_pool.transactions()) == 1
     assert transaction_pool.transactions()[0].identifier == exchange_tx_2.identifier
 
+    transaction_pool.remove_ids_from_pool([exchange_tx_2.identifier])
+    assert transaction_pool.transactions() == []
+    assert not transaction_pool.transaction_exists(exchange_tx_2)
+
 def test_forger_required(transaction_pool):
     currentPath = pathlib.Path().resolve()
 
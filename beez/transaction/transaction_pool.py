@@ -1,7 +1,7 @@
 """Beez blockchain - transaction pool."""
 
 from __future__ import annotations
-from typing import List
+from typing import Iterable, List
 from beez.transaction.transaction import Transaction
 from beez.transaction.challenge_tx import ChallengeTX
 
@@ -12,6 +12,8 @@ class TransactionPool:
 
     def __init__(self):
         self.transactions_in_pool = []
+        # ids of the pooled transactions for constant time existence checks
+        self.transaction_ids = set()
 
     def transactions(self):
         """Returns the transactions in the transaction pool."""
@@ -20,32 +22,29 @@ class TransactionPool:
     def add_transaction(self, transaction: Transaction):
         """Adds a new transaction to the transaction pool."""
         self.transactions_in_pool.append(transaction)
+        self.transaction_ids.add(transaction.identifier)
 
     def challenge_exists(self, challenge_tx: ChallengeTX):
         """Checks if a challenge exists."""
-        for transaction in self.transactions():
-            if transaction.identifier == challenge_tx.identifier:
-                return True
-        return False
+        return challenge_tx.identifier in self.transaction_ids
 
     def transaction_exists(self, transaction: Transaction):
         """Checks if a transaction exists."""
-        for pool_transaction in self.transactions():
-            if transaction.equals(pool_transaction):
-                return True
-        return False
+        return transaction.identifier in self.transaction_ids
 
     def remove_from_pool(self, transactions: List[Transaction]):
         """Removes the given list of transactions from the pool."""
+        self.remove_ids_from_pool(transaction.identifier for transaction in transactions)
+
+    def remove_ids_from_pool(self, transaction_ids: Iterable[str]):
+        """Removes the transactions with the given ids from the pool."""
+        removed_ids = set(transaction_ids)
         new_pool_transactions: List[Transaction] = []
         for pooltransaction in self.transactions():
-            insert = True
-            for transaction in transactions:
-                if pooltransaction.equals(transaction):
-                    insert = False
-            if insert is True:
+            if pooltransaction.identifier not in removed_ids:
                 new_pool_transactions.append(pooltransaction)
         self.transactions_in_pool = new_pool_transactions
+        self.transaction_ids -= removed_ids
 
     def forger_required(self) -> bool:
         """
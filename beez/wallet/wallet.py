@@ -139,4 +139,4 @@ class Wallet:
 
         block.sign(signature)  # sign the Block
 
-        return block
+        return block.seal()
@@ -0,0 +1 @@
+pytest beez/index/
\ No newline at end of file
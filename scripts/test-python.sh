@@ -2,6 +2,7 @@ pytest beez/block/
 pytest beez/wallet/
 pytest beez/challenge/
 pytest beez/consensus/
+pytest beez/index/
 pytest beez/socket/
 pytest beez/state/
 pytest beez/socket/